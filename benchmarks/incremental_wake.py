@@ -0,0 +1,84 @@
+# Benchmark of incremental FLORIS solves in the FLORIS standin
+#
+# Compares FlorisIncrementalSolver with full FLORIS solves for a farm on a
+# square grid, with the wind condition held and the yaw angles of a few random
+# turbines changed each step, as in a wake steering study.
+#
+# Usage: python benchmarks/incremental_wake.py [n_rows] [n_changed] [n_steps]
+
+import sys
+import time
+
+import numpy as np
+from floris import FlorisModel
+from hercules.floris_solvers import FlorisIncrementalSolver
+
+
+def make_fmodel(n_rows, transverse_velocities):
+    floris_dict = FlorisModel.get_defaults()
+    floris_dict["wake"]["enable_secondary_steering"] = transverse_velocities
+    floris_dict["wake"]["enable_yaw_added_recovery"] = transverse_velocities
+    floris_dict["wake"]["enable_transverse_velocities"] = transverse_velocities
+    fmodel = FlorisModel(floris_dict)
+    x, y = np.meshgrid(np.arange(n_rows) * 630.0, np.arange(n_rows) * 630.0)
+    fmodel.set(
+        layout_x=x.ravel(),
+        layout_y=y.ravel(),
+        wind_speeds=[8.0],
+        wind_directions=[275.0],
+        turbulence_intensities=[0.06],
+    )
+    return fmodel
+
+
+def run(n_rows, n_changed, n_steps, transverse_velocities):
+    fmodel = make_fmodel(n_rows, transverse_velocities)
+    n_turbines = fmodel.n_turbines
+    solver = FlorisIncrementalSolver(fmodel)
+    rng = np.random.default_rng(0)
+
+    yaw = np.zeros((1, n_turbines))
+    setpoints = np.full((1, n_turbines), 1e12)
+    solver.solve(8.0, 275.0, yaw, setpoints)
+
+    time_full = 0.0
+    time_incremental = 0.0
+    max_error = 0.0
+    for _ in range(n_steps):
+        changed = rng.choice(n_turbines, n_changed, replace=False)
+        yaw[0, changed] = rng.uniform(-20.0, 20.0, n_changed)
+
+        t0 = time.perf_counter()
+        powers = solver.solve(8.0, 275.0, yaw, setpoints)
+        time_incremental += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        fmodel.set(yaw_angles=yaw, power_setpoints=setpoints)
+        fmodel.run()
+        powers_full = fmodel.get_turbine_powers().ravel() / 1000
+        time_full += time.perf_counter() - t0
+
+        max_error = max(max_error, np.max(np.abs(powers - powers_full)) / np.max(powers_full))
+
+    print(
+        "{0} turbines, transverse velocities {1}: full {2:.3f} s/step, "
+        "incremental {3:.3f} s/step (speedup {4:.2f}x), "
+        "{5} incremental and {6} full solves, max error {7:.2e} of max power".format(
+            n_turbines,
+            "on" if transverse_velocities else "off",
+            time_full / n_steps,
+            time_incremental / n_steps,
+            time_full / time_incremental,
+            solver.n_incremental,
+            solver.n_full - 1,
+            max_error,
+        )
+    )
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    n_changed = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    n_steps = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    for transverse_velocities in [False, True]:
+        run(n_rows, n_changed, n_steps, transverse_velocities)
@@ -0,0 +1,67 @@
+# Scaling benchmark of parallel FLORIS solves in the FLORIS standin
+#
+# Times the FLORIS solve per time step for farms on a square grid, solving the
+# steps one at a time (as the standin does without look-ahead) and in batches
+# of look-ahead steps with FlorisBatchSolver, in this process and split across
+# increasing numbers of worker processes with ParFlorisModel.
+#
+# Usage: python benchmarks/parallel_floris.py [n_steps] [max_workers]
+
+import os
+import sys
+import time
+
+import numpy as np
+from floris import FlorisModel
+from hercules.floris_solvers import FlorisBatchSolver
+
+
+def make_fmodel(n_rows):
+    fmodel = FlorisModel(FlorisModel.get_defaults())
+    x, y = np.meshgrid(np.arange(n_rows) * 630.0, np.arange(n_rows) * 630.0)
+    fmodel.set(
+        layout_x=x.ravel(),
+        layout_y=y.ravel(),
+        wind_speeds=[8.0],
+        wind_directions=[270.0],
+        turbulence_intensities=[0.06],
+    )
+    return fmodel
+
+
+def run(n_rows, n_steps, worker_counts):
+    fmodel = make_fmodel(n_rows)
+    rng = np.random.default_rng(0)
+    wind_speeds = rng.uniform(6.0, 12.0, n_steps)
+    wind_directions = rng.uniform(250.0, 290.0, n_steps)
+
+    # One step per run
+    n_single = min(n_steps, 20)
+    t0 = time.perf_counter()
+    for ws, wd in zip(wind_speeds[:n_single], wind_directions[:n_single]):
+        fmodel.set(wind_speeds=[ws], wind_directions=[wd], turbulence_intensities=[0.06])
+        fmodel.run()
+    times = {"single": (time.perf_counter() - t0) / n_single}
+
+    # All steps in one batch, in this process and in parallel
+    for n_workers in [0] + worker_counts:
+        parallel = None if n_workers == 0 else {"max_workers": n_workers, "min_batch_size": 1}
+        solver = FlorisBatchSolver(fmodel, parallel)
+        t0 = time.perf_counter()
+        solver.solve(wind_speeds, wind_directions, 0.06)
+        times["batch" if n_workers == 0 else "{} workers".format(n_workers)] = (
+            time.perf_counter() - t0
+        ) / n_steps
+
+    print(
+        "{0:>5} turbines: ".format(n_rows**2)
+        + ", ".join("{} {:.2f} ms/step".format(k, v * 1000) for k, v in times.items())
+    )
+
+
+if __name__ == "__main__":
+    n_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    worker_counts = [2**k for k in range(int(np.log2(max_workers)) + 1)]
+    for n_rows in [5, 10, 18]:
+        run(n_rows, n_steps, worker_counts)
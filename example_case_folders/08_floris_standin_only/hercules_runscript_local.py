@@ -0,0 +1,25 @@
+import sys
+
+from hercules.controller_standin import ControllerStandin
+from hercules.emulator import Emulator
+from hercules.py_sims import PySims
+from hercules.utilities import load_yaml
+
+# Check that command line arguments are provided
+if len(sys.argv) != 2:
+    raise Exception("Usage: python hercules_runscript_local.py <hercules_input_file>")
+
+input_dict = load_yaml(sys.argv[1])
+
+# Run the FLORIS standin inside this process rather than over HELICS
+for amr_wind_name in input_dict["hercules_comms"]["amr_wind"]:
+    input_dict["hercules_comms"]["amr_wind"][amr_wind_name]["coupling"] = "local"
+print("Running Hercules with the FLORIS standin coupled locally")
+
+
+controller = ControllerStandin(input_dict)
+py_sims = PySims(input_dict)
+
+
+emulator = Emulator(controller, py_sims, input_dict)
+emulator.run_local()
@@ -0,0 +1,152 @@
+# AMR-Wind input files
+#
+# The emulator, the standins and the standin data tools all need settings from
+# the AMR-Wind input file (.inp): the time step and stop time, the turbines and
+# their positions, the actuator's rotor and curves, and the HELICS port. The
+# file is a list of "key = value(s)" lines with "#" comments, which is read here
+# once into an AMRWindInput. Reads are memoized by the path and modification
+# time of the file, so that the emulator and the standins built in one process
+# (e.g. in local coupling or a multi-case launch) share a single parse; an
+# edited file is read again.
+
+import os
+from pathlib import Path
+
+# Parsed AMRWindInput, by (resolved path, modification time, size)
+_amr_wind_input_cache = {}
+
+
+def tokenize_amr_wind_input(text):
+    """
+    The parameters of the text of an AMR-Wind input file, as a dictionary of
+    key to the list of its value tokens. Comments are dropped, and a key given
+    several times takes its last value.
+    """
+    params = {}
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        key = key.strip()
+        if key:
+            params[key] = value.split()
+    return params
+
+
+class AMRWindInput:
+    """
+    The settings of an AMR-Wind input file used by Hercules, parsed in one pass.
+
+    Attributes not given in the file are None. Turbine positions are in the
+    order of the turbine labels.
+
+    Inputs:
+    - text: the text of the input file
+    - path: the path of the input file, for error messages
+    """
+
+    def __init__(self, text, path=None):
+        self.text = text
+        self.path = path
+        self.params = tokenize_amr_wind_input(text)
+
+        self.dt = self._float("time.fixed_dt")
+        self.stop_time = self._float("time.stop_time")
+        self.helics_port = None
+        if "helics.broker_port" in self.params:
+            port = self.params["helics.broker_port"]
+            if len(port) < 1:
+                raise ValueError("Broker port couldn't be read. Check the spacing after the =")
+            self.helics_port = int(port[0])
+
+        self.turbine_labels = self.params.get("Actuator.labels", [])
+        self.actuator_type = self._string("Actuator.type")
+        self.rotor_diameter = self._actuator_float("rotor_diameter")
+        self.hub_height = self._actuator_float("hub_height")
+        self.density = self._actuator_float("density")
+        self.thrust_coefficient = self._actuator_floats("thrust_coeff")
+        self.wind_speed = self._actuator_floats("wind_speed")
+
+        self.base_positions = []
+        for label in self.turbine_labels:
+            key = "Actuator.{}.base_position".format(label)
+            if key not in self.params:
+                raise ValueError("{} has no {}.".format(self._name(), key))
+            self.base_positions.append(tuple(float(v) for v in self.params[key]))
+
+    @property
+    def num_turbines(self):
+        return len(self.turbine_labels)
+
+    @property
+    def turbine_locations(self):
+        """The (x, y) position of each turbine"""
+        return [tuple(position[:2]) for position in self.base_positions]
+
+    def require(self, *names):
+        """Raise a ValueError if any of the named attributes was not in the file"""
+        missing = [name for name in names if getattr(self, name) in (None, [])]
+        if missing:
+            raise ValueError("{} does not set {}.".format(self._name(), ", ".join(missing)))
+
+    def _name(self):
+        return "AMR-Wind input file {}".format(self.path) if self.path else "AMR-Wind input"
+
+    def _string(self, key):
+        if key not in self.params or not self.params[key]:
+            return None
+        return self.params[key][0]
+
+    def _float(self, key):
+        value = self._string(key)
+        return None if value is None else float(value)
+
+    def _actuator_float(self, name):
+        if self.actuator_type is None:
+            return None
+        return self._float("Actuator.{}.{}".format(self.actuator_type, name))
+
+    def _actuator_floats(self, name):
+        if self.actuator_type is None:
+            return None
+        key = "Actuator.{}.{}".format(self.actuator_type, name)
+        if key not in self.params:
+            return None
+        return [float(v) for v in self.params[key]]
+
+
+def load_amr_wind_input(amr_wind_input):
+    """
+    The AMRWindInput of the file amr_wind_input, parsed once per version of the
+    file. The returned object is shared; do not modify it.
+    """
+    path = Path(amr_wind_input).resolve()
+    stat = os.stat(path)
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _amr_wind_input_cache:
+        # Drop the parses of earlier versions of the file
+        for cached_key in [k for k in _amr_wind_input_cache if k[0] == key[0]]:
+            del _amr_wind_input_cache[cached_key]
+        with open(path) as fp:
+            _amr_wind_input_cache[key] = AMRWindInput(fp.read(), amr_wind_input)
+    return _amr_wind_input_cache[key]
+
+
+def read_amr_wind_input(amr_wind_input):
+    """
+    The settings of the AMR-Wind input file amr_wind_input, as a new dictionary
+    with keys dt, num_turbines, turbine_labels, rotor_diameter,
+    turbine_locations, helics_port and stop_time.
+    """
+    amr_input = load_amr_wind_input(amr_wind_input)
+    amr_input.require("dt", "stop_time", "turbine_labels")
+    return {
+        "dt": amr_input.dt,
+        "num_turbines": amr_input.num_turbines,
+        "turbine_labels": list(amr_input.turbine_labels),
+        "rotor_diameter": amr_input.rotor_diameter,
+        "turbine_locations": amr_input.turbine_locations,
+        "helics_port": amr_input.helics_port,
+        "stop_time": amr_input.stop_time,
+    }
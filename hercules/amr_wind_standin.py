@@ -10,15 +10,25 @@
 # - - Update the turbine measurements
 # - - Sleep for 1 s
 
-import ast
 import logging
 import sys
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
 from SEAS.federate_agent import FederateAgent
 
+from hercules.amr_wind_input import read_amr_wind_input
+from hercules.checkpoint import Checkpointer, load_checkpoint
+from hercules.local_coupling import farm_topics
+from hercules.message_codec import (
+    BINARY,
+    decode_message,
+    encode_message,
+    is_binary_message,
+    TEXT,
+)
+from hercules.standin_data import load_standin_data, standin_data_cursor
+
 # Set up the logger
 # Useful for when running on eagle
 Path("outputs").mkdir(parents=True, exist_ok=True)
@@ -34,75 +44,35 @@ logger = logging.getLogger("amr_wind_standin")
 # Perhaps a small hack to also send log to the terminal outout
 logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
 
-#  Make an announcement
-logger.info("Emulator amr_wind_standin (standing in for AMR-Wind) connecting to server")
-
-
-# Define a function to read the amrwind input file
-# Note simply copied from emulator
-def read_amr_wind_input(amr_wind_input):
-    # Probably want a file not found error instead
-    return_dict = {}
-
-    with open(amr_wind_input) as fp:
-        Lines = fp.readlines()
-
-        # Get the simulation time step
-        for line in Lines:
-            if "time.fixed_dt" in line:
-                dt = float(line.split()[2])
-
-        # Get the simulation time step
-        for line in Lines:
-            if "time.fixed_dt" in line:
-                dt = float(line.split()[2])
-
-        # Find the actuators
-        for line in Lines:
-            if "Actuator.labels" in line:
-                turbine_labels = line.split()[2:]
-                num_turbines = len(turbine_labels)
-
-        # Find the diameter
-        for line in Lines:
-            if "rotor_diameter" in line:
-                D = float(line.split()[-1])
-
-        # Get the turbine locations
-        turbine_locations = []
-        for label in turbine_labels:
-            for line in Lines:
-                if "Actuator.%s.base_position" % label in line:
-                    locations = tuple([float(f) for f in line.split()[-3:-1]])
-                    turbine_locations.append(locations)
-
-        # Get the helics port
-        for line in Lines:
-            if "helics.broker_port" in line:
-                if len(line.split()) < 3:
-                    raise ValueError("Broker port couldn't be read. Check the spacing after the =")
-                broker_port = int(line.split()[2])
-
-        # Get the stop time
-        for line in Lines:
-            if "time.stop_time" in line:
-                stop_time = float(line.split()[2])
-
-        return_dict = {
-            "dt": dt,
-            "num_turbines": num_turbines,
-            "turbine_labels": turbine_labels,
-            "rotor_diameter": D,
-            "turbine_locations": turbine_locations,
-            "helics_port": broker_port,
-            "stop_time": stop_time,
-        }
-
-    return return_dict
-
 
 class AMRWindStandin(FederateAgent):
-    def __init__(self, config_dict, amr_wind_input, amr_standin_data_file=None, helics_port=None):
+    """
+    AMRWindStandin class, which stands in for AMR-Wind.
+    Arguments:
+    config_dict: dictionary of configuration parameters
+    amr_wind_input: path to the AMR-Wind input file
+    amr_standin_data_file [optional]: path to the AMR-Wind standin data, a CSV
+        file or a binary bundle directory (see hercules.standin_data). Defaults
+        to None
+    helics_port [optional]: not used, kept for compatibility. Defaults to None
+    message_codec [optional]: codec for status messages. "auto" replies in the
+        binary codec once the emulator has sent a binary control message; "text"
+        always replies in text. Defaults to "auto".
+
+    Checkpointing is set in config_dict: "checkpoint_interval" (s) and
+    "checkpoint_file" save the standin state periodically, and "restart_file"
+    resumes from a checkpoint at its time. Use the same checkpoint_interval as
+    the emulator so that both restart from the same time. "verbose" (default
+    True) gates the progress messages of each step.
+    """
+    def __init__(
+            self,
+            config_dict,
+            amr_wind_input,
+            amr_standin_data_file=None,
+            helics_port=None,
+            message_codec="auto",
+        ):
 
         super(AMRWindStandin, self).__init__(
             name=config_dict["name"],
@@ -115,6 +85,22 @@ class AMRWindStandin(FederateAgent):
 
         self.config_dict = config_dict
 
+        # Print progress to the console
+        if "verbose" in config_dict:
+            self.verbose = config_dict["verbose"]
+        else:
+            self.verbose = True
+
+        #  Make an announcement
+        if self.verbose:
+            logger.info(
+                "Emulator amr_wind_standin (standing in for AMR-Wind) connecting to server"
+            )
+
+        # HELICS topics on which control messages are received and status messages sent
+        self.control_topic = config_dict["helics"]["subscription_topics"][0]
+        self.status_topic = config_dict["helics"]["publication_topics"][0]
+
         # Read the amrwind input file
         self.amr_wind_input = amr_wind_input
         self.amr_wind_input_dict = read_amr_wind_input(self.amr_wind_input)
@@ -127,10 +113,54 @@ class AMRWindStandin(FederateAgent):
         self.num_turbines = self.amr_wind_input_dict["num_turbines"]
 
         # Print the number of turbines
-        logger.info("Number of turbines: {}".format(self.num_turbines))
+        if self.verbose:
+            logger.info("Number of turbines: {}".format(self.num_turbines))
 
         if amr_standin_data_file is not None:
-            self.standin_data = pd.read_csv(amr_standin_data_file)
+            self.standin_data = load_standin_data(amr_standin_data_file)
+            self.standin_series = self.make_standin_series()
+
+        # Status messages are sent as text until the emulator offers the binary codec
+        if message_codec not in ["auto", TEXT]:
+            raise ValueError("message_codec must be 'auto' or 'text'.")
+        self.message_codec = message_codec
+        self.status_codec = TEXT
+
+        # Checkpointing
+        if "checkpoint_interval" in config_dict:
+            self.checkpoint_interval = config_dict["checkpoint_interval"]
+        else:
+            self.checkpoint_interval = None
+        if "checkpoint_file" in config_dict:
+            checkpoint_file = config_dict["checkpoint_file"]
+        else:
+            checkpoint_file = "outputs/{}_checkpoint.pkl".format(config_dict["name"])
+        self.checkpointer = Checkpointer(checkpoint_file)
+        if "restart_file" in config_dict:
+            self.restart_file = config_dict["restart_file"]
+        else:
+            self.restart_file = None
+
+        # Latest control message, kept for checkpoints
+        self.message_from_server = None
+
+    def make_standin_series(self):
+        """Cursor interpolating the wind speed, wind direction and turbine powers
+        of the standin data"""
+        return standin_data_cursor(
+            self.standin_data,
+            ["amr_wind_speed", "amr_wind_direction"]
+            + [f"turbine_power_{turb}" for turb in range(self.num_turbines)],
+        )
+
+    def get_state(self):
+        """State of the standin needed to restart from a checkpoint"""
+        return {"message_from_server": self.message_from_server, "status_codec": self.status_codec}
+
+    def set_state(self, state):
+        """Restore the state returned by get_state"""
+        self.message_from_server = state["message_from_server"]
+        self.status_codec = state["status_codec"]
 
     def run(self):
         # Initialize the values
@@ -143,7 +173,8 @@ class AMRWindStandin(FederateAgent):
         # Before starting the main time loop need to do an initial connection to the
         # Control center to get the starting wind speed and wind direction
         # Code the time step as -1 and -1 (to ensure it is an array)
-        logger.info("** First communication with control center")
+        if self.verbose:
+            logger.info("** First communication with control center")
         # message_from_client_array = [0, -1, -1]
         # Send initial message via helics
         # publish on topic: status
@@ -154,45 +185,46 @@ class AMRWindStandin(FederateAgent):
         incoming_messages = self.helics_connector.get_all_waiting_messages()
         if incoming_messages != {}:
             try:
-                message_from_server = list(ast.literal_eval(incoming_messages))
+                message_from_server = self.receive_control_message(
+                    incoming_messages[self.control_topic]["message"]
+                )
             except Exception:
                 message_from_server = None
         else:
             message_from_server = None
 
-        # Synchronize time bewteen control center and AMRWind
-        self.sync_time_helics(self.absolute_helics_time + self.deltat)
+        # Synchronize time bewteen control center and AMRWind. When restarting,
+        # restore the standin state and jump to the time of the checkpoint.
+        self.message_from_server = None
+        if self.restart_file is not None:
+            restart_state = load_checkpoint(self.restart_file)
+            self.set_state(restart_state["standin"])
+            self.sync_time_helics(restart_state["time"])
+            logger.info("** Restarted from checkpoint at time {}".format(restart_state["time"]))
+        else:
+            self.sync_time_helics(self.absolute_helics_time + self.deltat)
         sim_time_s = float(self.absolute_helics_time)
+        if self.checkpoint_interval:
+            next_checkpoint_time = (
+                np.floor(self.absolute_helics_time / self.checkpoint_interval) + 1
+            ) * self.checkpoint_interval
 
-        logger.info("** Initial Received reply: {}".format(message_from_server))
-
-        logger.info("** Intial Wind Speed: {}".format(amr_wind_speed))
-        logger.info("** Intial Wind Direction: {}".format(amr_wind_direction))
-        logger.info("...STARTING TIME LOOP...")
+        if self.verbose:
+            logger.info("** Initial Received reply: {}".format(message_from_server))
 
-        self.message_from_server = None
+            logger.info("** Intial Wind Speed: {}".format(amr_wind_speed))
+            logger.info("** Intial Wind Direction: {}".format(amr_wind_direction))
+            logger.info("...STARTING TIME LOOP...")
 
         while self.absolute_helics_time < (self.endtime - self.starttime + 1):
             # while sim_time_s <= (self.endtime - self.starttime):
             # SIMULATE A CALCULATION STEP IN AMR WIND=========================
             sim_time_s = float(self.absolute_helics_time)
-            logger.info("Calculating simulation time: %.3f" % sim_time_s)
+            if self.verbose:
+                logger.info("Calculating simulation time: %.3f" % sim_time_s)
 
             # Compute the turbine power using a simple formula
-            if self.message_from_server is not None:
-                if len(self.message_from_server) >= 3 + self.num_turbines:
-                    yaw_angles = self.message_from_server[3:3 + self.num_turbines]
-                else:
-                    yaw_angles = None
-                if len(self.message_from_server) >= 3 + 2*self.num_turbines:
-                    power_setpoints = self.message_from_server[
-                        3 + self.num_turbines:3 + 2*self.num_turbines
-                    ]
-                else:
-                    power_setpoints = None
-            else:
-                yaw_angles = None
-                power_setpoints = None
+            yaw_angles, power_setpoints = self.parse_control_message(self.message_from_server)
             (
                 amr_wind_speed,
                 amr_wind_direction,
@@ -204,37 +236,42 @@ class AMRWindStandin(FederateAgent):
             # Communicate with control center
             # Send the turbine powers for this time step and get wind speed and wind direction for
             # the next time step
-            logger.info("Time step: %0.3f" % sim_time_s)
-            logger.info("** Communicating with control center")
-            message_from_client_array = (
-                [
-                    sim_time_s,
-                    amr_wind_speed,
-                    amr_wind_direction,
-                ]
-                + turbine_powers
-                + turbine_wind_directions
+            if self.verbose:
+                logger.info("Time step: %0.3f" % sim_time_s)
+                logger.info("** Communicating with control center")
+            message_from_client_array = self.build_status_message(
+                sim_time_s,
+                amr_wind_speed,
+                amr_wind_direction,
+                turbine_powers,
+                turbine_wind_directions,
             )
 
-            # Cast all elements as native python float so they can be read in emulator
-            message_from_client_array = [float(num) for num in message_from_client_array]
-
             # Send helics message to Control Center
             # publish on topic: status
 
-            self.send_via_helics("status", str(message_from_client_array))
-            logger.info("** Message Sent: {}".format(message_from_client_array))
+            self.send_via_helics(
+                self.status_topic,
+                encode_message(
+                    message_from_client_array,
+                    self.status_codec,
+                    field_lengths=[3, self.num_turbines, self.num_turbines],
+                    n_turbines=self.num_turbines,
+                ),
+            )
+            if self.verbose:
+                logger.info("** Message Sent: {}".format(message_from_client_array))
 
             # Subscribe to helics messages from control center:
             incoming_messages = self.helics_connector.get_all_waiting_messages()
             if incoming_messages != {}:
-                self.message_from_server = list(
-                    ast.literal_eval(incoming_messages["control"]["message"])
+                self.message_from_server = self.receive_control_message(
+                    incoming_messages[self.control_topic]["message"]
                 )
             else:
                 self.message_from_server = None
             #  Now get the wind speed and wind direction back
-            if self.message_from_server is not None:
+            if self.message_from_server is not None and self.verbose:
                 logger.info("** Received reply {}: {}".format(sim_time_s, self.message_from_server))
 
                 # Note standin doesn't currently use received info for anything
@@ -242,11 +279,77 @@ class AMRWindStandin(FederateAgent):
             # Advance simulation time and time step counter
             # sim_time_s += self.dt
             self.sync_time_helics(self.absolute_helics_time + self.deltat)
-            print("ABSOLUTE TIME : ", self.absolute_helics_time, self.deltat, self.dt)
+            if self.verbose:
+                print("ABSOLUTE TIME : ", self.absolute_helics_time, self.deltat, self.dt)
             sim_time_s = self.absolute_helics_time
 
+            # Save a checkpoint
+            if self.checkpoint_interval and self.absolute_helics_time >= next_checkpoint_time:
+                self.checkpointer.save(
+                    {"time": self.absolute_helics_time, "standin": self.get_state()}
+                )
+                next_checkpoint_time += self.checkpoint_interval
+
+        self.checkpointer.wait()
+
     # TODO cleanup code to move publish and subscribe here.
 
+    def receive_control_message(self, message):
+        """Decode a control message, switching status messages to the binary codec
+        if the emulator sent binary and message_codec allows it"""
+        if is_binary_message(message) and self.message_codec == "auto":
+            self.status_codec = BINARY
+        return decode_message(message)
+
+    def parse_control_message(self, message_from_server):
+        """Split a decoded control message into yaw angles and power setpoints
+
+        Input:
+        message_from_server: [time, wind_speed, wind_direction] + yaw_angles
+            + power_setpoints, or None
+
+        Output:
+        yaw_angles: list of yaw angles, or None if not sent
+        power_setpoints: list of power setpoints, or None if not sent
+        """
+        if message_from_server is None:
+            return None, None
+
+        if len(message_from_server) >= 3 + self.num_turbines:
+            yaw_angles = message_from_server[3:3 + self.num_turbines]
+        else:
+            yaw_angles = None
+        if len(message_from_server) >= 3 + 2*self.num_turbines:
+            power_setpoints = message_from_server[
+                3 + self.num_turbines:3 + 2*self.num_turbines
+            ]
+        else:
+            power_setpoints = None
+
+        return yaw_angles, power_setpoints
+
+    def build_status_message(
+        self,
+        sim_time_s,
+        amr_wind_speed,
+        amr_wind_direction,
+        turbine_powers,
+        turbine_wind_directions,
+    ):
+        """Assemble the status message sent back to the emulator"""
+        message_from_client_array = (
+            [
+                sim_time_s,
+                amr_wind_speed,
+                amr_wind_direction,
+            ]
+            + list(turbine_powers)
+            + list(turbine_wind_directions)
+        )
+
+        # Cast all elements as native python float so they can be read in emulator
+        return [float(num) for num in message_from_client_array]
+
     def get_step(self, sim_time_s, yaw_angles=None, power_setpoints=None):
         """Retreive or calculate wind speed, direction, and turbine powers
 
@@ -260,24 +363,10 @@ class AMRWindStandin(FederateAgent):
         """
 
         if hasattr(self, "standin_data"):
-            amr_wind_speed = np.interp(
-                sim_time_s,
-                self.standin_data["time"],
-                self.standin_data["amr_wind_speed"],
-            )
-            amr_wind_direction = np.interp(
-                sim_time_s,
-                self.standin_data["time"],
-                self.standin_data["amr_wind_direction"],
-            )
-            turbine_powers = [
-                np.interp(
-                    sim_time_s,
-                    self.standin_data["time"],
-                    self.standin_data[f"turbine_power_{turb}"],
-                )
-                for turb in range(self.num_turbines)
-            ]
+            values = self.standin_series.interpolate(sim_time_s)
+            amr_wind_speed = values[0]
+            amr_wind_direction = values[1]
+            turbine_powers = values[2:].tolist()
 
             turbine_wind_directions = [0] * self.num_turbines
 
@@ -325,7 +414,16 @@ class AMRWindStandin(FederateAgent):
         pass
 
 
-def launch_amr_wind_standin(amr_input_file, amr_standin_data_file=None, helics_port=None):
+def launch_amr_wind_standin(
+    amr_input_file,
+    amr_standin_data_file=None,
+    helics_port=None,
+    message_codec="auto",
+    checkpoint_interval=None,
+    restart_file=None,
+    farm_name=None,
+    verbose=True,
+):
     temp = read_amr_wind_input(amr_input_file)
 
     # Check that helics_port is an integer
@@ -336,13 +434,17 @@ def launch_amr_wind_standin(amr_input_file, amr_standin_data_file=None, helics_p
         temp["helics_port"] = helics_port
 
 
+    # With several wind farms, each farm's standin has its own name and topics
+    control_topic, status_topic = farm_topics(farm_name)
+    name = "amr_wind_standin" if farm_name is None else "amr_wind_standin_{}".format(farm_name)
+
     config = {
-        "name": "amr_wind_standin",
+        "name": name,
         "gridpack": {},
         "helics": {
             "deltat": 0.5,
-            "subscription_topics": ["control"],
-            "publication_topics": ["status"],
+            "subscription_topics": [control_topic],
+            "publication_topics": [status_topic],
             "endpoints": [],
             "helicsport": temp["helics_port"],
         },
@@ -350,13 +452,18 @@ def launch_amr_wind_standin(amr_input_file, amr_standin_data_file=None, helics_p
         "endpoint_interval": 1,
         "starttime": 0,
         "stoptime": temp["stop_time"],
-        "Agent": "amr_wind_standin",
+        "Agent": name,
+        "checkpoint_interval": checkpoint_interval,
+        "restart_file": restart_file,
+        "verbose": verbose,
     }
 
     if amr_standin_data_file is not None:
-        obj = AMRWindStandin(config, amr_input_file, amr_standin_data_file)
+        obj = AMRWindStandin(
+            config, amr_input_file, amr_standin_data_file, message_codec=message_codec
+        )
     else:
-        obj = AMRWindStandin(config, amr_input_file)
+        obj = AMRWindStandin(config, amr_input_file, message_codec=message_codec)
 
     obj.run_helics_setup()
     obj.enter_execution(function_targets=[], function_arguments=[[]])
@@ -0,0 +1,94 @@
+# Checkpoints for restarting long Hercules runs
+#
+# A checkpoint is a pickled dictionary of state. To keep the pause in the main
+# loop short, the state is pickled (which snapshots it) on the calling thread
+# and the bytes are written to disk on a background thread. Files are written
+# to a temporary name and then renamed over the previous checkpoint, so a
+# crash part way through a write leaves the previous checkpoint intact.
+
+import os
+import pickle
+import threading
+from pathlib import Path
+
+CHECKPOINT_VERSION = 2
+
+
+def write_atomic(filename, data):
+    """Write bytes to filename, replacing any existing file only once complete"""
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    tmp_filename = filename.with_name(filename.name + ".tmp")
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def load_checkpoint(filename):
+    """Load the state dictionary saved in a checkpoint file"""
+    with open(filename, "rb") as f:
+        checkpoint = pickle.load(f)
+    if not isinstance(checkpoint, dict) or "checkpoint_version" not in checkpoint:
+        raise ValueError("{} is not a Hercules checkpoint.".format(filename))
+    if checkpoint["checkpoint_version"] != CHECKPOINT_VERSION:
+        raise ValueError(
+            "Checkpoint {0} has version {1}, expected {2}.".format(
+                filename, checkpoint["checkpoint_version"], CHECKPOINT_VERSION
+            )
+        )
+    return checkpoint["state"]
+
+
+class Checkpointer:
+    """
+    Saves checkpoints to one file, overwriting the previous checkpoint.
+
+    Inputs:
+    - filename: path of the checkpoint file
+    - background: write to disk on a background thread. save() then only waits
+        for the previous checkpoint to finish writing.
+    """
+
+    def __init__(self, filename, background=True):
+        self.filename = filename
+        self.background = background
+        self.n_saved = 0
+        self._thread = None
+        self._error = None
+
+    def save(self, state):
+        """Snapshot state (a picklable dictionary) and write it to the checkpoint file"""
+        data = pickle.dumps(
+            {"checkpoint_version": CHECKPOINT_VERSION, "state": state},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        self.wait()
+        if self.background:
+            self._thread = threading.Thread(
+                target=self._write, args=(data,), name="hercules-checkpoint", daemon=True
+            )
+            self._thread.start()
+        else:
+            self._write(data)
+            self._check_error()
+
+    def wait(self):
+        """Wait for a checkpoint being written in the background"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._check_error()
+
+    def _write(self, data):
+        try:
+            write_atomic(self.filename, data)
+            self.n_saved += 1
+        except BaseException as e:
+            self._error = e
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing checkpoint {} failed.".format(self.filename)) from error
@@ -1,17 +1,68 @@
-import ast
 import datetime as dt
-import os
+import functools
 import sys
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
 from SEAS.federate_agent import FederateAgent
 
+from hercules.amr_wind_input import load_amr_wind_input
+from hercules.checkpoint import Checkpointer, load_checkpoint
+from hercules.external_signals import ExternalSignals
+from hercules.flattening_plan import FlatteningPlan, StaleFlatteningPlan
+from hercules.local_coupling import (
+    check_coupling,
+    farm_topics,
+    FLORIS_STANDIN_OPTIONS,
+    LocalStandinCoupling,
+    LocalStandinGroup,
+    make_local_standin,
+    StandinPool,
+    StatusReplay,
+)
+from hercules.message_codec import check_codec, decode_message, encode_message
+from hercules.output_reduction import OutputReducer
+from hercules.output_writer import AsyncOutputWriter, CSVOutputWriter, make_output_writer
+from hercules.realtime import RealTimeScheduler
+from hercules.state_store import StateStore
+from hercules.status_recording import StatusRecorder
+from hercules.timing import StepTimer
+
 LOGFILE = str(dt.datetime.now()).replace(":", "_").replace(" ", "_").replace(".", "_")
 
 Path("outputs").mkdir(parents=True, exist_ok=True)
 
+# Top-level keys of the input file that set up the run rather than describe its
+# state: every optional key the Emulator reads from the input file. They stay in
+# main_dict but are not logged.
+RUN_OPTIONS = [
+    "verbose",
+    "timing",
+    "timing_output_interval",
+    "timing_summary_file",
+    "realtime",
+    "real_time_factor",
+    "step_deadline",
+    "checkpoint_interval",
+    "checkpoint_file",
+    "restart_file",
+    "output_format",
+    "output_file",
+    "output_flush_interval",
+    "output_async",
+    "output_queue_size",
+    "output_backpressure",
+    "output_reduction",
+    "external_data_file",
+    "external_data_chunksize",
+    "external_data_memmap_file",
+    "standin_workers",
+    "record_status_file",
+    "replay_status_file",
+    "state_store",
+]
+
+
 class Emulator(FederateAgent):
     def __init__(self, controller, py_sims, input_dict):
         # Make sure output folder exists
@@ -20,18 +71,127 @@ class Emulator(FederateAgent):
         # Save the input dict to main dict
         self.main_dict = input_dict
 
-        # Initialize the flattend main_dict
-        self.main_dict_flat = {}
+        # Print progress to the console
+        if "verbose" in input_dict:
+            self.verbose = input_dict["verbose"]
+        else:
+            self.verbose = True
+
+        # Per-phase timing of the main loop. If timing_output_interval is set, the
+        # mean time of each phase over the last timing_output_interval steps is
+        # written to main_dict["timing"] (and so to the output file).
+        if "timing" in input_dict:
+            self.timing = input_dict["timing"]
+        else:
+            self.timing = False
+        if "timing_output_interval" in input_dict:
+            self.timing_output_interval = input_dict["timing_output_interval"]
+        else:
+            self.timing_output_interval = 0
+        if "timing_summary_file" in input_dict:
+            self.timing_summary_file = input_dict["timing_summary_file"]
+        else:
+            self.timing_summary_file = "outputs/hercules_timing.csv"
+
+        # Real-time scheduling for hardware-in-the-loop runs. If realtime is True, each
+        # step starts on a wall-clock boundary (dt / real_time_factor apart); otherwise
+        # steps run as fast as possible. Steps taking longer than step_deadline seconds
+        # of wall-clock time (default: the pacing period when realtime) are counted and
+        # reported with the time of each phase.
+        if "realtime" in input_dict:
+            self.realtime = input_dict["realtime"]
+        else:
+            self.realtime = False
+        if "real_time_factor" in input_dict:
+            self.real_time_factor = input_dict["real_time_factor"]
+        else:
+            self.real_time_factor = 1.0
+        if "step_deadline" in input_dict:
+            self.step_deadline = input_dict["step_deadline"]
+        else:
+            self.step_deadline = None
+
+        # Checkpointing: every checkpoint_interval seconds of simulation time, save the
+        # state needed to restart to checkpoint_file. If restart_file is given, resume
+        # from that checkpoint, appending to the existing output files.
+        if "checkpoint_interval" in input_dict:
+            self.checkpoint_interval = input_dict["checkpoint_interval"]
+        else:
+            self.checkpoint_interval = None
+        if "checkpoint_file" in input_dict:
+            self.checkpoint_file = input_dict["checkpoint_file"]
+        else:
+            self.checkpoint_file = "outputs/hercules_checkpoint.pkl"
+        if "restart_file" in input_dict:
+            self.restart_file = input_dict["restart_file"]
+        else:
+            self.restart_file = None
+        self.checkpointer = Checkpointer(self.checkpoint_file)
+
+        # The flattening plan for logging main_dict is compiled on the first logged step
+        self.flattening_plan = None
 
         # Initialize the output file
+        if "output_format" in input_dict:
+            self.output_format = input_dict["output_format"]
+        else:
+            self.output_format = "csv"
         if "output_file" in input_dict:
             self.output_file = input_dict["output_file"]
         else:
-            self.output_file = "outputs/hercules_output.csv"
+            self.output_file = "outputs/hercules_output.{}".format(self.output_format)
+
+        # Number of rows held in memory between writes to the output file
+        if "output_flush_interval" in input_dict:
+            self.output_flush_interval = input_dict["output_flush_interval"]
+        else:
+            self.output_flush_interval = 100
+
+        # Writing outputs on a background thread (default) keeps disk I/O off the
+        # critical path of the time step. The backpressure policy ("block", "drop" or
+        # "coalesce") decides what happens when the queue of rows to write is full.
+        if "output_async" in input_dict:
+            self.output_async = input_dict["output_async"]
+        else:
+            self.output_async = True
+        if "output_queue_size" in input_dict:
+            self.output_queue_size = input_dict["output_queue_size"]
+        else:
+            self.output_queue_size = 1000
+        if "output_backpressure" in input_dict:
+            self.output_backpressure = input_dict["output_backpressure"]
+        else:
+            self.output_backpressure = "block"
 
         # Save time step
         self.dt = input_dict["dt"]
 
+        # Output reduction: a list of groups of main_dict keys, each written to its
+        # own file either every N steps ("every") or aggregated over a time window
+        # ("window", in s, with "stats" from mean/min/max/last). If output_reduction
+        # is given, only the keys in its groups are written and the full-rate output
+        # file is not.
+        self.output_reducers = []
+        self.reduced_output_writers = []
+        if "output_reduction" in input_dict:
+            self._setup_output_reduction(input_dict["output_reduction"])
+
+        # The output file itself is opened on the first logged step, once the
+        # output columns are known
+        if self.output_reducers:
+            self.output_writer = None
+        else:
+            self.output_writer = self._make_writer(
+                make_output_writer(
+                    self.output_file, self.output_format, self.output_flush_interval
+                )
+            )
+        self.output_keys = None
+
+        # Number of rows logged to each output file, recorded in checkpoints
+        self.n_output_rows = 0
+        self.n_reduced_output_rows = [0] * len(self.output_reducers)
+
         # Initialize components
         self.controller = controller
         self.py_sims = py_sims
@@ -43,18 +203,64 @@ class Emulator(FederateAgent):
         if self.main_dict["py_sims"]:
             self.main_dict["py_sims"]["inputs"]["sim_time_s"] = 0.0
 
+        # Set up the timer, sharing it with py_sims so each py_sim is timed separately
+        self.timer = StepTimer(
+            enabled=self.timing or self.realtime or self.step_deadline is not None,
+            phases=["step", "external_signals", "controller", "py_sims"]
+            + ["py_sims." + name for name in self.py_sims.py_sim_names]
+            + ["send", "helics_sync", "receive", "logging", "checkpoint"],
+        )
+        self.py_sims.timer = self.timer
+        if self.realtime or self.step_deadline is not None:
+            self.scheduler = RealTimeScheduler(
+                self.dt,
+                pacing=self.realtime,
+                step_deadline=self.step_deadline,
+                real_time_factor=self.real_time_factor,
+                timer=self.timer,
+            )
+        else:
+            self.scheduler = None
+        if self.timing and self.timing_output_interval:
+            self.main_dict["timing"] = {name: np.nan for name in self.timer.histograms}
+
         # HELICS dicts
         self.hercules_comms_dict = input_dict["hercules_comms"]
         self.hercules_helics_dict = self.hercules_comms_dict["helics"]
         self.helics_config_dict = self.hercules_comms_dict["helics"]["config"]
 
-        # Read in any external data
+        # Read in any external data. For very large files, external_data_chunksize
+        # reads the file in chunks of rows and external_data_memmap_file keeps the
+        # interpolated signals in a memory-mapped .npy file instead of RAM.
         self.external_data_all = {}
         if "external_data_file" in input_dict:
             self._read_external_data_file(input_dict["external_data_file"])
             self.external_signals = {}
             self.main_dict["external_signals"] = {}
 
+        # HELICS topics of each wind farm: "control" and "status" for a single farm,
+        # and topics carrying the farm name for several farms (see farm_topics)
+        amr_wind_names = list(self.hercules_comms_dict["amr_wind"].keys())
+        self.farm_topics = {}
+        for amr_wind_name in amr_wind_names:
+            if len(amr_wind_names) > 1:
+                self.farm_topics[amr_wind_name] = farm_topics(amr_wind_name)
+            else:
+                self.farm_topics[amr_wind_name] = farm_topics()
+        helics_topics = self.helics_config_dict["helics"]
+        if len(amr_wind_names) > 1:
+            helics_topics["publication_topics"] = [
+                t for t in helics_topics["publication_topics"] if t != "control"
+            ]
+            helics_topics["subscription_topics"] = [
+                t for t in helics_topics["subscription_topics"] if t != "status"
+            ]
+        for control_topic, status_topic in self.farm_topics.values():
+            if control_topic not in helics_topics["publication_topics"]:
+                helics_topics["publication_topics"].append(control_topic)
+            if status_topic not in helics_topics["subscription_topics"]:
+                helics_topics["subscription_topics"].append(status_topic)
+
         # Write the time step into helics config dict
         self.helics_config_dict["helics"]["deltat"] = self.dt
 
@@ -94,35 +300,150 @@ class Emulator(FederateAgent):
                 self.read_amr_wind_input(self.amr_wind_dict[amr_wind_name]["amr_wind_input_file"])
             )
 
-        # TODO For now, need to assume for simplicity there is one and only
-        # one AMR_Wind simulation
+        # Settings of the first wind farm, kept for single farm code
         self.num_turbines = self.amr_wind_dict[self.amr_wind_names[0]]["num_turbines"]
+
+        # Codec for the control messages sent to each farm's AMRWind: "text" (default,
+        # understood by AMR-Wind) or "binary" (understood by the standins, which reply
+        # in kind). Incoming messages are accepted in either codec.
+        self.message_codecs = {}
+        for amr_wind_name in self.amr_wind_names:
+            if "message_codec" in self.amr_wind_dict[amr_wind_name]:
+                self.message_codecs[amr_wind_name] = check_codec(
+                    self.amr_wind_dict[amr_wind_name]["message_codec"]
+                )
+            else:
+                self.message_codecs[amr_wind_name] = "text"
+        self.message_codec = self.message_codecs[self.amr_wind_names[0]]
+
+        # Coupling to AMRWind, the same for all farms: "helics" (default) exchanges
+        # messages with separate AMR-Wind or standin processes through the HELICS
+        # broker; "local" runs standins for the farms inside this process and calls
+        # them directly (see run_local). With standin_workers > 0, the local standins
+        # are instead stepped in parallel in that many worker processes.
+        couplings = []
+        for amr_wind_name in self.amr_wind_names:
+            if "coupling" in self.amr_wind_dict[amr_wind_name]:
+                couplings.append(check_coupling(self.amr_wind_dict[amr_wind_name]["coupling"]))
+            else:
+                couplings.append("helics")
+        if len(set(couplings)) > 1:
+            raise ValueError("All wind farms must use the same coupling, received {}.".format(
+                couplings
+            ))
+        self.coupling = couplings[0]
+        if "standin_workers" in input_dict:
+            self.standin_workers = input_dict["standin_workers"]
+        else:
+            self.standin_workers = 0
+
+        # Record and replay of the status messages of the farms. record_status_file
+        # records the messages received each step (see hercules.status_recording);
+        # replay_status_file replaces AMRWind (or the standins) with such a recording,
+        # run without HELICS through run_local.
+        if "record_status_file" in input_dict:
+            self.record_status_file = input_dict["record_status_file"]
+        else:
+            self.record_status_file = None
+        if "replay_status_file" in input_dict:
+            self.replay_status_file = input_dict["replay_status_file"]
+        else:
+            self.replay_status_file = None
+        farm_sizes = {
+            name: self.amr_wind_dict[name]["num_turbines"] for name in self.amr_wind_names
+        }
+        # A restart resumes the recording in restore_checkpoint
+        if self.record_status_file is not None and self.restart_file is None:
+            self.status_recorder = StatusRecorder(self.record_status_file, farm_sizes, self.dt)
+        else:
+            self.status_recorder = None
+
+        if self.replay_status_file is not None:
+            self.coupling = "replay"
+            self.local_coupling = StatusReplay(self.replay_status_file, farm_sizes)
+        elif self.coupling == "local" and self.standin_workers:
+            self.local_coupling = StandinPool(
+                {name: self.amr_wind_dict[name] for name in self.amr_wind_names},
+                self.dt,
+                self.helics_config_dict["stoptime"],
+                n_workers=self.standin_workers,
+                make_standin=functools.partial(make_local_standin, verbose=self.verbose),
+            )
+        elif self.coupling == "local":
+            self.local_coupling = LocalStandinGroup(
+                {
+                    name: LocalStandinCoupling(
+                        make_local_standin(
+                            self.amr_wind_dict[name],
+                            self.dt,
+                            self.helics_config_dict["stoptime"],
+                            verbose=self.verbose,
+                        )
+                    )
+                    for name in self.amr_wind_names
+                }
+            )
+        else:
+            self.local_coupling = None
+
         self.rotor_diameter = self.amr_wind_dict[self.amr_wind_names[0]]["rotor_diameter"]
         self.turbine_locations = self.amr_wind_dict[self.amr_wind_names[0]]["turbine_locations"]
         self.turbine_labels = self.amr_wind_dict[self.amr_wind_names[0]]["turbine_labels"]
 
-        # TODO In fugure could cover multiple farms
-        # Initialize the turbine power array
+        # Initialize the turbine outputs of each farm, in hercules_comms so that the
+        # controller can access them
         self.turbine_power_array = np.zeros(self.num_turbines)
-        self.amr_wind_dict[self.amr_wind_names[0]]["turbine_powers"] = np.zeros(self.num_turbines)
-        self.amr_wind_dict[self.amr_wind_names[0]]["turbine_wind_directions"] = [
-            0.0
-        ] * self.num_turbines
-        # Write to hercules_comms so that controller can access
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]]["turbine_powers"] = [
-            0.0
-        ] * self.num_turbines
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-            "turbine_wind_directions"
-        ] = [0.0] * self.num_turbines
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]]["wind_direction"] = 0
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-            "sim_time_s_amr_wind"
-        ] = 0
+        for amr_wind_name in self.amr_wind_names:
+            num_turbines = self.amr_wind_dict[amr_wind_name]["num_turbines"]
+            self.amr_wind_dict[amr_wind_name]["turbine_powers"] = [0.0] * num_turbines
+            self.amr_wind_dict[amr_wind_name]["turbine_wind_directions"] = [0.0] * num_turbines
+            self.amr_wind_dict[amr_wind_name]["wind_direction"] = 0
+            self.amr_wind_dict[amr_wind_name]["sim_time_s_amr_wind"] = 0
 
         self.wind_speed = 0
         self.wind_direction = 0
 
+        # Keys of main_dict not logged: the run options, the options of the farms'
+        # standins, and timing unless it holds the timing outputs
+        self.unlogged_keys = [k for k in RUN_OPTIONS if k != "timing"]
+        if not (self.timing and self.timing_output_interval):
+            self.unlogged_keys.append("timing")
+        for name in self.amr_wind_names:
+            self.unlogged_keys += [
+                "hercules_comms.amr_wind.{}.{}".format(name, option)
+                for option in FLORIS_STANDIN_OPTIONS
+            ]
+
+        # Optionally hold main_dict in an array-backed state store. Floating point
+        # values then live in one numpy buffer behind a dictionary facade, so the
+        # controller and py_sims see a dictionary while logging copies the buffer.
+        if "state_store" in input_dict:
+            self.state_store = input_dict["state_store"]
+        else:
+            self.state_store = False
+        if self.state_store:
+            self.main_dict = StateStore.from_dict(self.main_dict)
+            self.hercules_comms_dict = self.main_dict["hercules_comms"]
+            self.amr_wind_dict = self.hercules_comms_dict["amr_wind"]
+            self.py_sims.py_sim_dict = self.main_dict["py_sims"]
+
+        # Log of the messages received from each farm's AMRWind, header written on
+        # construction. With several farms, each log file name ends with the farm name.
+        self.amr_wind_log_writers = {}
+        for amr_wind_name in self.amr_wind_names:
+            if self.n_amr_wind > 1:
+                log_filename = f"{LOGFILE}_{amr_wind_name}.csv"
+            else:
+                log_filename = f"{LOGFILE}.csv"
+            num_turbines = self.amr_wind_dict[amr_wind_name]["num_turbines"]
+            writer = self._make_writer(CSVOutputWriter(log_filename, self.output_flush_interval))
+            writer.write_header(
+                ["helics_time", "AMRwind_time", "AMRWind_speed", "AMRWind_direction"]
+                + [f"power_{i}" for i in range(num_turbines)]
+                + [f"turbine_wd_direction_{i}" for i in range(num_turbines)]
+            )
+            self.amr_wind_log_writers[amr_wind_name] = writer
+
         # TODO Could set up logging here
 
         # TODO Set interface comms to either dash or kenny's front end
@@ -139,90 +460,270 @@ class Emulator(FederateAgent):
         # list(self.pub.values())[0].publish(str("[-1,-1,-1]"))
         # self.logger.info(" #### Entering main loop #### ")
 
-    def _read_external_data_file(self, filename):
-        # Read in the external data file
-        df_ext = pd.read_csv(filename)
-        if "time" not in df_ext.columns:
-            raise ValueError("External data file must have a 'time' column")
+    def _make_writer(self, writer):
+        # Wrap an output writer to run on a background thread if requested
+        if self.output_async:
+            return AsyncOutputWriter(writer, self.output_queue_size, self.output_backpressure)
+        return writer
+
+    def _setup_output_reduction(self, output_groups):
+        # Construct a reducer and an output writer for each output group
+        output_file = Path(self.output_file)
+        for i, group in enumerate(output_groups):
+            if "name" in group:
+                name = group["name"]
+            else:
+                name = "group_{}".format(i)
+            if "file" in group:
+                filename = group["file"]
+            else:
+                filename = output_file.with_name(
+                    "{0}_{1}{2}".format(output_file.stem, name, output_file.suffix)
+                )
+
+            self.output_reducers.append(
+                OutputReducer(
+                    name,
+                    group["keys"],
+                    self.dt,
+                    every=group["every"] if "every" in group else None,
+                    window=group["window"] if "window" in group else None,
+                    stats=group["stats"] if "stats" in group else None,
+                )
+            )
+            self.reduced_output_writers.append(
+                self._make_writer(
+                    make_output_writer(filename, self.output_format, self.output_flush_interval)
+                )
+            )
 
-        # Interpolate the external data according to time.
+    def _read_external_data_file(self, filename):
+        # Read in the external data file and interpolate it onto the time grid.
         # Goes to 1 time step past stoptime specified in the input file.
-        times = np.arange(
+        if "external_data_chunksize" in self.main_dict:
+            chunksize = self.main_dict["external_data_chunksize"]
+        else:
+            chunksize = None
+        if "external_data_memmap_file" in self.main_dict:
+            memmap_file = self.main_dict["external_data_memmap_file"]
+        else:
+            memmap_file = None
+
+        self.external_data_all = ExternalSignals(
+            filename,
             self.helics_config_dict["starttime"],
-            self.helics_config_dict["stoptime"]+(2*self.dt),
-            self.dt
+            self.helics_config_dict["stoptime"],
+            self.dt,
+            chunksize=chunksize,
+            memmap_file=memmap_file,
         )
-        self.external_data_all["time"] = times
-        for c in df_ext.columns:
-            if c != "time":
-                self.external_data_all[c] = np.interp(times, df_ext.time, df_ext[c])
 
     def run(self):
         # TODO In future code that doesnt insist on AMRWInd can make this optional
-        print("... waiting for initial connection from AMRWind")
-        # Send initial connection signal to AMRWind
+        if self.verbose:
+            print("... waiting for initial connection from AMRWind")
+        # Send initial connection signal to AMRWind (to every farm)
         # publish on topic: control
         self.receive_amrwind_data()
-        self.send_via_helics("control", str("[-1,-1,-1]"))
-        print(" #### Entering main loop #### ")
-        self.sync_time_helics(self.absolute_helics_time + self.deltat)
+        self.send_control_message([-1, -1, -1])
+        if self.verbose:
+            print(" #### Entering main loop #### ")
+
         # Initialize the first iteration flag
         self.first_iteration = True
 
-        # Run simulation till  endtime
-        # while self.absolute_helics_time < self.endtime:
-        while self.absolute_helics_time < (self.endtime - self.starttime + 1):
-            print(self.absolute_helics_time)
-            # Loop till we reach simulation startime.
-            # if self.absolute_helics_time < self.starttime:
-            #     continue
-            # Get any external data
-            # print('self.external_data_all = ',self.external_data_all)
-            for k in self.external_data_all:
-                self.main_dict["external_signals"][k] = self.external_data_all[k][
-                    self.external_data_all["time"] == self.absolute_helics_time
-                ][0]
-
-            # Update controller and py sims
-            # TODO: Should 'time' in the main dict be AMR-wind time or
-            # helics time? Why aren't they the same?
-            self.main_dict["time"] = self.absolute_helics_time
-            self.main_dict = self.controller.step(self.main_dict)
-            if self.main_dict["py_sims"]:
-                self.py_sims.step(self.main_dict)
-                self.main_dict["py_sims"] = self.py_sims.get_py_sim_dict()
-
-            # Send inputs (initiates the AMRWind step)
-            self.send_data_to_amrwind()
-
-            # Update time to next time step (TODO: check logging for pysims?)
+        # Advance to the first time step, or restore the checkpoint being restarted
+        # from and jump to its time
+        if self.restart_file is not None:
+            self.restore_checkpoint(load_checkpoint(self.restart_file))
+        else:
+            self.advance_time()
+        if self.checkpoint_interval:
+            self.next_checkpoint_time = (
+                np.floor(self.absolute_helics_time / self.checkpoint_interval) + 1
+            ) * self.checkpoint_interval
+
+        # Run simulation till  endtime, making sure buffered outputs reach disk
+        # even if the run is interrupted
+        try:
+            self.run_main_loop()
+        finally:
+            self.close_outputs()
+            self.checkpointer.wait()
+            if self.local_coupling is not None:
+                self.local_coupling.close()
+            if self.timing:
+                self.write_timing_summary()
+            if self.scheduler is not None:
+                print(self.scheduler.format_summary())
+
+    def run_local(self):
+        """Run the simulation with the standin in this process (coupling: local),
+        or replaying a status recording (replay_status_file), without a HELICS
+        broker. Used in place of run_helics_setup and enter_execution."""
+        if self.local_coupling is None:
+            raise RuntimeError(
+                "run_local requires coupling: local for the wind farm, or replay_status_file."
+            )
+
+        # Start the clock and compute the standin's initial state, standing in for
+        # the status message AMRWind sends on connection
+        self.absolute_helics_time = 0.0
+        self.local_coupling.step(self.absolute_helics_time)
+        self.run()
+
+    def advance_time(self):
+        # Advance to the next time step. With local coupling this also steps the
+        # standin, using the latest control message.
+        if self.local_coupling is not None:
+            self.absolute_helics_time = self.absolute_helics_time + self.dt
+            self.local_coupling.step(self.absolute_helics_time)
+        else:
             self.sync_time_helics(self.absolute_helics_time + self.deltat)
 
-            # Receive outputs back (for next time step)
-            self.receive_amrwind_data()
-            
-            # Log the current state
-            self.log_main_dict()
-            
-            # If this is first iteration print the input dict
-            # And turn off the first iteration flag
-            if self.first_iteration:
-                print(self.main_dict)
-                self.save_main_dict_as_text()
-                self.first_iteration = False
+    def run_main_loop(self):
+        # while self.absolute_helics_time < self.endtime:
+        timer = self.timer
+        scheduler = self.scheduler
+        n_steps = 0
+        if scheduler is not None:
+            scheduler.start()
+        while self.absolute_helics_time < (self.endtime - self.starttime + 1):
+            if scheduler is not None:
+                scheduler.begin_step()
+                step_time = self.absolute_helics_time
+            with timer.phase("step"):
+                if self.verbose:
+                    print(self.absolute_helics_time)
+                # Loop till we reach simulation startime.
+                # if self.absolute_helics_time < self.starttime:
+                #     continue
+                # Get any external data
+                if self.external_data_all:
+                    with timer.phase("external_signals"):
+                        self.main_dict["external_signals"].update(
+                            self.external_data_all.get_signals(self.absolute_helics_time)
+                        )
+
+                # Update controller and py sims
+                # TODO: Should 'time' in the main dict be AMR-wind time or
+                # helics time? Why aren't they the same?
+                self.main_dict["time"] = self.absolute_helics_time
+                with timer.phase("controller"):
+                    self.main_dict = self.controller.step(self.main_dict)
+                if self.main_dict["py_sims"]:
+                    with timer.phase("py_sims"):
+                        self.py_sims.step(self.main_dict)
+                        self.main_dict["py_sims"] = self.py_sims.get_py_sim_dict()
+
+                # Send inputs (initiates the AMRWind step)
+                with timer.phase("send"):
+                    self.send_data_to_amrwind()
+
+                # Update time to next time step (TODO: check logging for pysims?)
+                # (with local coupling, this is where the standin is stepped)
+                with timer.phase("helics_sync"):
+                    self.advance_time()
+
+                # Receive outputs back (for next time step)
+                with timer.phase("receive"):
+                    self.receive_amrwind_data()
+
+                # Record the mean phase timings over the last timing_output_interval steps
+                n_steps += 1
+                if (
+                    self.timing
+                    and self.timing_output_interval
+                    and n_steps % self.timing_output_interval == 0
+                ):
+                    self.main_dict["timing"].update(timer.pop_window_means())
+
+                # Log the current state
+                with timer.phase("logging"):
+                    self.log_main_dict()
+
+                # If this is first iteration print the input dict
+                # And turn off the first iteration flag
+                if self.first_iteration:
+                    if self.verbose:
+                        print(self.main_dict)
+                    self.save_main_dict_as_text()
+                    self.first_iteration = False
+
+                # Save a checkpoint
+                if (
+                    self.checkpoint_interval
+                    and self.absolute_helics_time >= self.next_checkpoint_time
+                ):
+                    with timer.phase("checkpoint"):
+                        self.save_checkpoint()
+                    self.next_checkpoint_time += self.checkpoint_interval
+
+            # Track the step's deadline and wait for the next wall-clock boundary
+            if scheduler is not None:
+                overrun = scheduler.end_step()
+                if overrun > 0:
+                    print(
+                        "Step at time {} overran its deadline by {:.1f} ms ({})".format(
+                            step_time, overrun * 1000, scheduler.format_step_phases()
+                        )
+                    )
+                scheduler.wait()
 
     def receive_amrwind_data(self):
-        # Subscribe to helics messages:
-        incoming_messages = self.helics_connector.get_all_waiting_messages()
-        if incoming_messages != {}:
-            subscription_value = self.process_subscription_messages(incoming_messages)
-            # print("What did we receive ", subscription_value)
+        # Receive the status messages of all wind farms. With HELICS coupling, the
+        # messages of all farms arrive together after the time sync.
+        if self.local_coupling is not None:
+            subscription_values = {
+                name: self.local_coupling.get_status(name) for name in self.amr_wind_names
+            }
         else:
-            print("Emulator: Did not receive subscription from AMRWind, setting everyhthing to 0.")
+            # Subscribe to helics messages:
+            incoming_messages = self.helics_connector.get_all_waiting_messages()
+            subscription_values = {}
+            for amr_wind_name in self.amr_wind_names:
+                if self.farm_topics[amr_wind_name][1] in incoming_messages:
+                    subscription_values[amr_wind_name] = self.process_subscription_messages(
+                        incoming_messages, amr_wind_name
+                    )
+                else:
+                    subscription_values[amr_wind_name] = None
+
+        if self.status_recorder is not None:
+            self.status_recorder.record(self.absolute_helics_time, subscription_values)
+
+        total_power = 0.0
+        for amr_wind_name in self.amr_wind_names:
+            wind_farm_power, sim_time_s_amr_wind = self.receive_farm_data(
+                amr_wind_name, subscription_values[amr_wind_name]
+            )
+            total_power += wind_farm_power
+            if amr_wind_name == self.amr_wind_names[0]:
+                first_sim_time_s_amr_wind = sim_time_s_amr_wind
+
+        # Assign Py_sim outputs
+        if self.main_dict["py_sims"]:
+            self.main_dict["py_sims"]["inputs"]["available_power"] += total_power
+            # print("sim_time_s_amr_wind = ", sim_time_s_amr_wind)
+            self.main_dict["py_sims"]["inputs"]["sim_time_s"] = first_sim_time_s_amr_wind
+            # print('self.main_dict[''py_sims''][''inputs''][''sim_time_s''] = ',
+            #           self.main_dict['py_sims']['inputs']['sim_time_s'])
+
+        return None
+
+    def receive_farm_data(self, amr_wind_name, subscription_value):
+        # Store the status message of one wind farm in main_dict and log it. Returns
+        # the farm power and the AMRWind time of the message.
+        num_turbines = self.amr_wind_dict[amr_wind_name]["num_turbines"]
+        if subscription_value is None:
+            print(
+                "Emulator: Did not receive subscription from AMRWind ({}), "
+                "setting everyhthing to 0.".format(amr_wind_name)
+            )
             subscription_value = (
                 [0, 0, 0]
-                + [0 for t in range(self.num_turbines)]
-                + [0 for t in range(self.num_turbines)]
+                + [0 for t in range(num_turbines)]
+                + [0 for t in range(num_turbines)]
             )
 
         # TODO Parse returns from AMRWind
@@ -231,122 +732,242 @@ class Emulator(FederateAgent):
             wind_speed_amr_wind,
             wind_direction_amr_wind,
         ) = subscription_value[:3]
-        turbine_power_array = subscription_value[3 : 3 + self.num_turbines]
-        turbine_wd_array = subscription_value[3 + self.num_turbines :]
-        self.wind_speed = wind_speed_amr_wind
-        self.wind_direction = wind_direction_amr_wind
+        turbine_power_array = subscription_value[3 : 3 + num_turbines]
+        turbine_wd_array = subscription_value[3 + num_turbines :]
         wind_farm_power = sum(turbine_power_array)
-
-        # Assign Py_sim outputs
-        if self.main_dict["py_sims"]:
-            self.main_dict["py_sims"]["inputs"]["available_power"] += wind_farm_power
-            # print("sim_time_s_amr_wind = ", sim_time_s_amr_wind)
-            self.main_dict["py_sims"]["inputs"]["sim_time_s"] = sim_time_s_amr_wind
-            # print('self.main_dict[''py_sims''][''inputs''][''sim_time_s''] = ',
-            #           self.main_dict['py_sims']['inputs']['sim_time_s'])
+        if amr_wind_name == self.amr_wind_names[0]:
+            self.wind_speed = wind_speed_amr_wind
+            self.wind_direction = wind_direction_amr_wind
+            self.turbine_power_array = turbine_power_array
 
         ## TODO add other parameters that need to be logged to csv here.
         # Write turbine power and turbine wind direction to csv logfile.
-        aa = [str(xx) for xx in turbine_power_array]
-        xyz = ",".join(aa)
-        bb = [str(xx) for xx in turbine_wd_array]
-        zyx = ",".join(bb)
-        with open(f"{LOGFILE}.csv", "a") as filex:
-            filex.write(
-                str(self.absolute_helics_time)
-                + ","
-                + str(sim_time_s_amr_wind)
-                + ","
-                + str(wind_speed_amr_wind)
-                + ","
-                + str(wind_direction_amr_wind)
-                + ","
-                + xyz
-                + ","
-                + zyx
-                + os.linesep
-            )
+        self.amr_wind_log_writers[amr_wind_name].write_row(
+            [
+                self.absolute_helics_time,
+                sim_time_s_amr_wind,
+                wind_speed_amr_wind,
+                wind_direction_amr_wind,
+            ]
+            + list(turbine_power_array)
+            + list(turbine_wd_array)
+        )
 
         # TODO F-Strings
-        print("=======================================")
-        print("AMRWindTime:", sim_time_s_amr_wind)
-        print("AMRWindSpeed:", wind_speed_amr_wind)
-        print("AMRWindDirection:", wind_direction_amr_wind)
-        print("AMRWindTurbinePowers:", turbine_power_array)
-        print("AMRWindTurbineWD:", turbine_wd_array)
-        print("=======================================")
-
-        # Store turbine powers back to the dict
-        # TODO hard-coded for now assuming only one AMR-WIND
-        self.amr_wind_dict[self.amr_wind_names[0]]["turbine_powers"] = turbine_power_array
-        self.amr_wind_dict[self.amr_wind_names[0]]["wind_farm_power"] = wind_farm_power
-        self.amr_wind_dict[self.amr_wind_names[0]]["turbine_wind_directions"] = turbine_wd_array
-        self.turbine_power_array = turbine_power_array
-        self.amr_wind_dict[self.amr_wind_names[0]]["sim_time_s_amr_wind"] = sim_time_s_amr_wind
-        # TODO: write these to the hercules_comms object, too?
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-            "turbine_powers"
-        ] = turbine_power_array
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-            "turbine_wind_directions"
-        ] = turbine_wd_array
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-            "wind_direction"
-        ] = wind_direction_amr_wind
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-            "wind_speed"
-        ] = wind_speed_amr_wind
-        self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-            "wind_farm_power"
-        ] = wind_farm_power
-
-        return None
-
-    def recursive_flatten_main_dict(self, nested_dict, prefix=""):
-        # Recursively flatten the input dict
-        for k, v in nested_dict.items():
-            if isinstance(v, dict):
-                self.recursive_flatten_main_dict(v, prefix + k + ".")
-            else:
-                # If v is a list or np.array, enter each element seperately
-                if isinstance(v, (list, np.ndarray)):
-                    for i, vi in enumerate(v):
-                        if isinstance(vi, (int, float)):
-                            self.main_dict_flat[prefix + k + ".%03d" % i] = vi
-
-                # If v is a string, int, or float, enter it directly
-                if isinstance(v, (int, np.integer, float)):
-                    self.main_dict_flat[prefix + k] = v
+        if self.verbose:
+            print("=======================================")
+            if self.n_amr_wind > 1:
+                print("AMRWind:", amr_wind_name)
+            print("AMRWindTime:", sim_time_s_amr_wind)
+            print("AMRWindSpeed:", wind_speed_amr_wind)
+            print("AMRWindDirection:", wind_direction_amr_wind)
+            print("AMRWindTurbinePowers:", turbine_power_array)
+            print("AMRWindTurbineWD:", turbine_wd_array)
+            print("=======================================")
+
+        # Store turbine powers back to the dict (hercules_comms)
+        farm_dict = self.main_dict["hercules_comms"]["amr_wind"][amr_wind_name]
+        self._write_vector(farm_dict, "turbine_powers", turbine_power_array)
+        farm_dict["wind_farm_power"] = wind_farm_power
+        self._write_vector(farm_dict, "turbine_wind_directions", turbine_wd_array)
+        farm_dict["sim_time_s_amr_wind"] = sim_time_s_amr_wind
+        farm_dict["wind_direction"] = wind_direction_amr_wind
+        farm_dict["wind_speed"] = wind_speed_amr_wind
+
+        return wind_farm_power, sim_time_s_amr_wind
+
+    def _read_vector(self, d, key):
+        # A vector of main_dict. With the state store, a view of its slice of the
+        # buffer rather than a copy; the view is only used within the step.
+        if self.state_store and d.field(key) is not None:
+            return d.view(key)
+        return d[key]
+
+    def _write_vector(self, d, key, values):
+        # Write a vector into main_dict. With the state store, a vector of the same
+        # length is copied into its slice of the buffer in one numpy assignment.
+        if self.state_store:
+            f = d.field(key)
+            if f is not None and f[2] and f[1] == len(values):
+                d.view(key)[:] = values
+                return
+        d[key] = values
 
     def log_main_dict(self):
-        # Update the flattened input dict
-        self.recursive_flatten_main_dict(self.main_dict)
-
-        # Add the current time
-        self.main_dict_flat["clock_time"] = dt.datetime.now()
-
-        # The keys and values as two lists
-        keys = list(self.main_dict_flat.keys())
-        values = list(self.main_dict_flat.values())
-
-        # If this is first iteration, write the keys as csv header
+        # On the first iteration, compile the flattening plan, which fixes the
+        # output columns, and write them as the header
         if self.first_iteration:
-            with open(self.output_file, "w") as filex:
-                filex.write(",".join(keys) + os.linesep)
-
-        # Load the csv header and check if it matches the current keys
-        with open(self.output_file, "r") as filex:
-            header = filex.readline().strip().split(",")
-            if header != keys:
+            self.flattening_plan = FlatteningPlan(self.main_dict, exclude=self.unlogged_keys)
+            self.output_keys = self.flattening_plan.columns + ["clock_time"]
+            if self.output_writer is not None:
+                self.output_writer.write_header(self.output_keys)
+            for reducer, writer in zip(self.output_reducers, self.reduced_output_writers):
+                writer.write_header(reducer.set_columns(self.flattening_plan.columns))
+                if len(reducer.index) == 0:
+                    print(
+                        "WARNING: output group '{0}' matches no main_dict keys: {1}".format(
+                            reducer.name, reducer.keys
+                        )
+                    )
+
+        # Gather the current values into the row buffer. If main_dict has changed
+        # layout, rebuild the plan against the existing columns and report the change
+        try:
+            row = self.flattening_plan.gather(self.main_dict)
+        except StaleFlatteningPlan:
+            self.flattening_plan = FlatteningPlan(
+                self.main_dict, columns=self.flattening_plan.columns, exclude=self.unlogged_keys
+            )
+            if self.flattening_plan.added_keys or self.flattening_plan.removed_keys:
                 print(
-                    "WARNING: Input dict keys have changed since first iteration.\
-                        Not writing to csv file."
+                    "WARNING: main_dict keys have changed since first iteration. "
+                    + "New keys (not logged): {}. ".format(self.flattening_plan.added_keys)
+                    + "Removed keys (logged as NaN): {}.".format(
+                        self.flattening_plan.removed_keys
+                    )
                 )
-                return
+            row = self.flattening_plan.gather(self.main_dict)
 
-        # Append the values to the csv file
-        with open(self.output_file, "a") as filex:
-            filex.write(",".join([str(v) for v in values]) + os.linesep)
+        # Hand the values to the output writer, which batches writes to disk
+        if self.output_writer is not None:
+            self.output_writer.write_row(row.tolist() + [dt.datetime.now()])
+            self.n_output_rows += 1
+
+        # Reduce the values for each output group, writing any rows that are due
+        for i, (reducer, writer) in enumerate(
+            zip(self.output_reducers, self.reduced_output_writers)
+        ):
+            reduced_row = reducer.add(self.main_dict["time"], row)
+            if reduced_row is not None:
+                writer.write_row(reduced_row)
+                self.n_reduced_output_rows[i] += 1
+
+    def close_outputs(self):
+        # Write out any buffered rows (and incomplete aggregation windows) and close
+        # the output files
+        if self.output_writer is not None:
+            self.output_writer.close()
+        for reducer, writer in zip(self.output_reducers, self.reduced_output_writers):
+            reduced_row = reducer.finish()
+            if reduced_row is not None:
+                writer.write_row(reduced_row)
+            writer.close()
+        for writer in self.amr_wind_log_writers.values():
+            writer.close()
+        if self.status_recorder is not None:
+            self.status_recorder.close()
+
+    def save_checkpoint(self):
+        # Make sure the rows logged so far are on disk, so that a restart can resume
+        # the output files from the row counts saved here
+        if self.output_writer is not None:
+            self.output_writer.flush()
+        for writer in self.reduced_output_writers:
+            writer.flush()
+        if self.status_recorder is not None:
+            self.status_recorder.flush()
+
+        # main_dict holds the py_sim objects, and with them their state
+        state = {
+            "time": self.absolute_helics_time,
+            "main_dict": self.main_dict,
+            "emulator": {
+                "wind_speed": self.wind_speed,
+                "wind_direction": self.wind_direction,
+                "turbine_power_array": self.turbine_power_array,
+            },
+            "output_keys": self.output_keys,
+            "n_output_rows": self.n_output_rows,
+            "output_reducers": self.output_reducers,
+            "n_reduced_output_rows": self.n_reduced_output_rows,
+        }
+        if self.status_recorder is not None:
+            state["n_status_records"] = self.status_recorder.n_records
+        if hasattr(self.controller, "get_state"):
+            state["controller"] = self.controller.get_state()
+        if self.local_coupling is not None:
+            state["local_coupling"] = self.local_coupling.get_state()
+        self.checkpointer.save(state)
+
+    def restore_checkpoint(self, state):
+        # Restore main_dict, keeping the HELICS settings of this run, and point
+        # everything that refers into it at the restored dictionary
+        main_dict = state["main_dict"]
+        main_dict["hercules_comms"]["helics"] = self.hercules_helics_dict
+        self.main_dict = main_dict
+        self.hercules_comms_dict = main_dict["hercules_comms"]
+        self.amr_wind_dict = self.hercules_comms_dict["amr_wind"]
+        self.py_sims.py_sim_dict = main_dict["py_sims"]
+
+        self.wind_speed = state["emulator"]["wind_speed"]
+        self.wind_direction = state["emulator"]["wind_direction"]
+        self.turbine_power_array = state["emulator"]["turbine_power_array"]
+        if "controller" in state:
+            self.controller.set_state(state["controller"])
+        if self.local_coupling is not None:
+            self.local_coupling.set_state(state["local_coupling"])
+
+        # Resume the output files after the rows logged up to the checkpoint
+        if len(state["output_reducers"]) != len(self.output_reducers):
+            raise ValueError("output_reduction must be the same as in the checkpointed run.")
+        self.output_keys = state["output_keys"]
+        self.flattening_plan = FlatteningPlan(
+            self.main_dict, columns=self.output_keys[:-1], exclude=self.unlogged_keys
+        )
+        self.n_output_rows = state["n_output_rows"]
+        if self.output_writer is not None:
+            self.output_writer = self._make_writer(
+                make_output_writer(
+                    self.output_file,
+                    self.output_format,
+                    self.output_flush_interval,
+                    resume_rows=self.n_output_rows,
+                )
+            )
+            self.output_writer.write_header(self.output_keys)
+        self.output_reducers = state["output_reducers"]
+        self.n_reduced_output_rows = state["n_reduced_output_rows"]
+        for i, reducer in enumerate(self.output_reducers):
+            self.reduced_output_writers[i] = self._make_writer(
+                make_output_writer(
+                    self.reduced_output_writers[i].filename,
+                    self.output_format,
+                    self.output_flush_interval,
+                    resume_rows=self.n_reduced_output_rows[i],
+                )
+            )
+            self.reduced_output_writers[i].write_header(reducer.columns)
+        if self.record_status_file is not None:
+            farm_sizes = {
+                name: self.amr_wind_dict[name]["num_turbines"] for name in self.amr_wind_names
+            }
+            self.status_recorder = StatusRecorder(
+                self.record_status_file,
+                farm_sizes,
+                self.dt,
+                resume_records=state.get("n_status_records"),
+            )
+        self.first_iteration = False
+
+        # Jump to the time of the checkpoint
+        if self.local_coupling is not None:
+            self.absolute_helics_time = state["time"]
+        else:
+            self.sync_time_helics(state["time"])
+        print("Restarted from checkpoint {0} at time {1}".format(self.restart_file, state["time"]))
+
+    def write_timing_summary(self):
+        # Print the per-phase timing statistics and save them to timing_summary_file
+        print(" #### Timing summary #### ")
+        print(self.timer.format_summary())
+
+        summary = self.timer.summary()
+        writer = CSVOutputWriter(self.timing_summary_file)
+        columns = ["count", "mean_ms", "p50_ms", "p95_ms", "max_ms", "total_s"]
+        writer.write_header(["phase"] + columns)
+        for name, stats in summary.items():
+            writer.write_row([name] + [stats[c] for c in columns])
+        writer.close()
 
     def save_main_dict_as_text(self):
         # Echo the dictionary to a seperate file in case it is helpful
@@ -361,58 +982,86 @@ class Emulator(FederateAgent):
     def parse_input_yaml(self, filename):
         pass
 
-    def process_subscription_messages(self, msg):
-        # process data from HELICS subscription
-        print(
-            f"{self.name}, {self.absolute_helics_time} subscribed to message {msg}",
-            flush=True,
-        )
+    def process_subscription_messages(self, msg, amr_wind_name=None):
+        # process data from HELICS subscription, the status message of one wind
+        # farm (the first if amr_wind_name is None)
+        if amr_wind_name is None:
+            amr_wind_name = self.amr_wind_names[0]
+        if self.verbose:
+            print(
+                f"{self.name}, {self.absolute_helics_time} subscribed to message {msg}",
+                flush=True,
+            )
         try:
-            return list(ast.literal_eval(str(msg["status"]["message"])))
+            return decode_message(msg[self.farm_topics[amr_wind_name][1]]["message"])
         except Exception as e:
             print(f"Subscription error:  {e} , returning 0s ", flush=True)
+            num_turbines = self.amr_wind_dict[amr_wind_name]["num_turbines"]
             return (
                 [0, 0, 0]
-                + [0 for t in range(self.num_turbines)]
-                + [0 for t in range(self.num_turbines)]
+                + [0 for t in range(num_turbines)]
+                + [0 for t in range(num_turbines)]
             )
 
     def send_data_to_amrwind(self):
         self.process_periodic_publication()
 
     def process_periodic_publication(self):
-        # Periodically publish data to the surrogate
-
-        # Hard coded to single wind farm for the moment
-        if (
-            "turbine_yaw_angles"
-            in self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]]
-        ):
-            yaw_angles = self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-                "turbine_yaw_angles"
-            ]
-        else:  # set yaw_angles based on self.wind_direction
-            yaw_angles = [self.wind_direction] * self.num_turbines
-
-        if (
-            "turbine_power_setpoints"
-            in self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]]
-        ):
-            power_setpoints = self.main_dict["hercules_comms"]["amr_wind"][self.amr_wind_names[0]][
-                "turbine_power_setpoints"
-            ]
-        else:  # pass no power setpoints
-            power_setpoints = [] * self.num_turbines
-
-        # Send timing and yaw information to AMRWind via helics
-        # publish on topic: control
-        tmp = np.array(
-            [self.absolute_helics_time, self.wind_speed, self.wind_direction]
-            + yaw_angles
-            + power_setpoints
-        ).tolist()
+        # Periodically publish data to the surrogates, one control message per farm
+        for amr_wind_name in self.amr_wind_names:
+            farm_dict = self.main_dict["hercules_comms"]["amr_wind"][amr_wind_name]
+            if "wind_speed" in farm_dict:
+                wind_speed = farm_dict["wind_speed"]
+            else:
+                wind_speed = 0
+            wind_direction = farm_dict["wind_direction"]
+
+            if "turbine_yaw_angles" in farm_dict:
+                yaw_angles = self._read_vector(farm_dict, "turbine_yaw_angles")
+            else:  # set yaw_angles based on the farm's wind direction
+                yaw_angles = [wind_direction] * farm_dict["num_turbines"]
+
+            if "turbine_power_setpoints" in farm_dict:
+                power_setpoints = self._read_vector(farm_dict, "turbine_power_setpoints")
+            else:  # pass no power setpoints
+                power_setpoints = []
+
+            # Send timing and yaw information to AMRWind via helics
+            # publish on topic: control
+            tmp = np.concatenate(
+                [
+                    [self.absolute_helics_time, wind_speed, wind_direction],
+                    yaw_angles,
+                    power_setpoints,
+                ]
+            ).tolist()
+
+            self.send_control_message(
+                tmp,
+                field_lengths=[3, len(yaw_angles), len(power_setpoints)],
+                amr_wind_name=amr_wind_name,
+            )
 
-        self.send_via_helics("control", str(tmp))
+    def send_control_message(self, message, field_lengths=None, amr_wind_name=None):
+        # Publish a control message to a farm's AMRWind on its control topic, or hand
+        # it directly to the farm's standin with local coupling. If amr_wind_name is
+        # None, the message is sent to every farm.
+        if amr_wind_name is None:
+            for name in self.amr_wind_names:
+                self.send_control_message(message, field_lengths, name)
+            return
+        if self.local_coupling is not None:
+            self.local_coupling.publish_control(amr_wind_name, message)
+        else:
+            self.send_via_helics(
+                self.farm_topics[amr_wind_name][0],
+                encode_message(
+                    message,
+                    self.message_codecs[amr_wind_name],
+                    field_lengths=field_lengths,
+                    n_turbines=self.amr_wind_dict[amr_wind_name]["num_turbines"],
+                ),
+            )
 
     def process_endpoint_event(self, msg):
         pass
@@ -421,89 +1070,23 @@ class Emulator(FederateAgent):
         pass
 
     def read_amr_wind_input(self, amr_wind_input):
-        # TODO this function is ugly and uncommented
-        # print("How many times does this get called ", amr_wind_input)
-
-        # TODO Initialize to empty in case doesn't run
-        # Probably want a file not found error instead
-        return_dict = {}
-
-        with open(amr_wind_input) as fp:
-            Lines = fp.readlines()
-
-            # Find the actuators
-            for line in Lines:
-                if "Actuator.labels" in line:
-                    turbine_labels = line.split()[2:]
-                    num_turbines = len(turbine_labels)
-            for line in Lines:
-                if "Actuator.type" in line:
-                    actuator_type = line.split()[-1]
-
-            self.num_turbines = num_turbines
-            print("Number of turbines in amrwind: ", num_turbines)
-
-            aa = [f"power_{i}" for i in range(num_turbines)]
-            xyz = ",".join(aa)
-            bb = [f"turbine_wd_direction_{i}" for i in range(num_turbines)]
-            zyx = ",".join(bb)
-            with open(f"{LOGFILE}.csv", "a") as filex:
-                filex.write(
-                    "helics_time"
-                    + ","
-                    + "AMRwind_time"
-                    + ","
-                    + "AMRWind_speed"
-                    + ","
-                    + "AMRWind_direction"
-                    + ","
-                    + xyz
-                    + ","
-                    + zyx
-                    + os.linesep
-                )
-
-            # Find the diameter
-            for line in Lines:
-                if "Actuator.%s.rotor_diameter" % actuator_type in line:
-                    D = float(line.split()[-1])
-
-            # Get the turbine locations
-            turbine_locations = []
-            for label in turbine_labels:
-                for line in Lines:
-                    if "Actuator.%s.base_position" % label in line:
-                        locations = tuple([float(f) for f in line.split()[-3:-1]])
-                        turbine_locations.append(locations)
-
-            return_dict = {
-                "num_turbines": num_turbines,
-                "turbine_labels": turbine_labels,
-                "rotor_diameter": D,
-                "turbine_locations": turbine_locations,
-            }
-
+        # Read the settings of a wind farm from its AMR-Wind input file, shared with
+        # the standins through load_amr_wind_input
+        amr_input = load_amr_wind_input(amr_wind_input)
+        amr_input.require("turbine_labels")
+
+        self.num_turbines = amr_input.num_turbines
+        if self.verbose:
+            print("Number of turbines in amrwind: ", amr_input.num_turbines)
+
+        return_dict = {
+            "num_turbines": amr_input.num_turbines,
+            "turbine_labels": list(amr_input.turbine_labels),
+            "rotor_diameter": amr_input.rotor_diameter,
+            "turbine_locations": amr_input.turbine_locations,
+        }
+
+        if self.verbose:
             print(return_dict)
 
-            # Write header for logfile:
-            aa = [f"power_{i}" for i in range(self.num_turbines)]
-            xyz = ",".join(aa)
-            bb = [f"turbine_wd_direction_{i}" for i in range(self.num_turbines)]
-            zyx = ",".join(bb)
-            with open(f"{LOGFILE}.csv", "a") as filex:
-                filex.write(
-                    "helics_time"
-                    + ","
-                    + "AMRwind_time"
-                    + ","
-                    + "AMRWind_speed"
-                    + ","
-                    + "AMRWind_direction"
-                    + ","
-                    + xyz
-                    + ","
-                    + zyx
-                    + os.linesep
-                )
-
         return return_dict
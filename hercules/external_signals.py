@@ -0,0 +1,111 @@
+# External signals (e.g. power reference or price) for the Hercules emulator
+#
+# External data files are interpolated once onto the emulator time grid and
+# held as a single (time x signal) array. Since the grid is regular, the row for
+# a given time is found by arithmetic rather than by searching the time column.
+
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+class ExternalSignals(Mapping):
+    """
+    Time-indexed store of external signals sampled on the emulator time grid.
+
+    The store behaves as a read-only mapping from signal name (including "time")
+    to the full column of interpolated values, and get_signals(time) returns the
+    values of all signals at one time step.
+
+    Inputs:
+    - filename: path to a csv file with a "time" column and one column per signal
+    - starttime, stoptime, dt: the emulator time grid. Signals are interpolated
+        up to one time step past stoptime.
+    - chunksize: if given, read the file this many rows at a time so that the raw
+        data never needs to be held in memory at once
+    - memmap_file: if given, hold the interpolated signals in a .npy file of this
+        name, memory-mapped, instead of in RAM
+    """
+
+    def __init__(self, filename, starttime, stoptime, dt, chunksize=None, memmap_file=None):
+        self.starttime = starttime
+        self.dt = dt
+
+        columns = list(pd.read_csv(filename, nrows=0).columns)
+        if "time" not in columns:
+            raise ValueError("External data file must have a 'time' column")
+        self.signal_names = [c for c in columns if c != "time"]
+        self.names = ["time"] + self.signal_names
+        self._column_index = {k: i for i, k in enumerate(self.names)}
+
+        # Goes to 1 time step past stoptime specified in the input file.
+        times = np.arange(starttime, stoptime + (2 * dt), dt)
+        shape = (len(times), len(self.names))
+        if memmap_file is not None:
+            self.data = np.lib.format.open_memmap(
+                memmap_file, mode="w+", dtype=np.float64, shape=shape
+            )
+        else:
+            self.data = np.empty(shape)
+        self.data[:, 0] = times
+
+        self._interpolate_file(filename, times, chunksize)
+
+        if memmap_file is not None:
+            self.data.flush()
+
+    def _interpolate_file(self, filename, times, chunksize):
+        # Interpolate the file chunk by chunk. Each chunk is extended with the last
+        # row of the previous chunk so that grid times falling between chunks are
+        # interpolated exactly as if the whole file had been read at once.
+        if chunksize is None:
+            chunks = [pd.read_csv(filename, usecols=self.names)]
+        else:
+            chunks = pd.read_csv(filename, usecols=self.names, chunksize=chunksize)
+
+        n_filled = 0
+        t_prev, v_prev = None, None
+        for chunk in chunks:
+            if len(chunk) == 0:
+                continue
+            t = chunk["time"].to_numpy(dtype=float)
+            v = chunk[self.signal_names].to_numpy(dtype=float)
+            if t_prev is not None:
+                t = np.concatenate([t_prev, t])
+                v = np.concatenate([v_prev, v])
+
+            # Fill every grid time up to the end of this chunk
+            n_end = np.searchsorted(times, t[-1], side="right")
+            for j in range(len(self.signal_names)):
+                self.data[n_filled:n_end, j + 1] = np.interp(times[n_filled:n_end], t, v[:, j])
+            n_filled = max(n_filled, n_end)
+            t_prev, v_prev = t[-1:], v[-1:]
+
+        if t_prev is None:
+            raise ValueError("External data file {} has no data.".format(filename))
+
+        # Hold the last value past the end of the file
+        self.data[n_filled:, 1:] = v_prev
+
+    def index(self, time):
+        """Row of the time grid closest to time"""
+        i = int(round((time - self.starttime) / self.dt))
+        return min(max(i, 0), self.data.shape[0] - 1)
+
+    def get_row(self, time):
+        """Values of all signals (time first) at time, as a numpy array"""
+        return self.data[self.index(time)]
+
+    def get_signals(self, time):
+        """Values of all signals at time, as a dict"""
+        return dict(zip(self.names, self.get_row(time).tolist()))
+
+    def __getitem__(self, name):
+        return self.data[:, self._column_index[name]]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
@@ -0,0 +1,223 @@
+# Compiled flattening of the nested main_dict for logging
+#
+# The emulator logs every numeric leaf of main_dict as one column of the
+# output file. Instead of walking the nested dict and building the column
+# names every step, a FlatteningPlan walks it once, fixes the column order and
+# records where each value lives. Each step then only gathers the values into
+# a preallocated numpy row. When main_dict is backed by a StateStore, the
+# values held in the store buffer are gathered with a single indexed copy.
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from hercules.state_store import StateDict
+
+
+class StaleFlatteningPlan(Exception):
+    """Raised when main_dict no longer has the layout a FlatteningPlan was compiled for"""
+
+
+def _is_number(v):
+    return isinstance(v, (int, float, np.number)) and not isinstance(v, np.datetime64)
+
+
+class FlatteningPlan:
+    """
+    Column layout and accessors for flattening main_dict into a numeric row.
+
+    Numeric values are logged under their dotted path (e.g. "py_sims.inputs.available_power")
+    and numeric list or 1-D array elements under the path plus a three digit index
+    (e.g. "hercules_comms.amr_wind.wind_farm_0.turbine_powers.001"). None entries in
+    numeric lists are logged as NaN. Strings and other objects are not logged.
+
+    Inputs:
+    - main_dict: nested dictionary to compile the plan against
+    - columns: optional list of columns to keep. If given, the plan keeps this column
+        order; columns no longer found in main_dict are filled with NaN and new leaves
+        are left out. The differences are listed in added_keys and removed_keys.
+    - exclude: optional dotted paths of keys not to log, with everything below them
+    """
+
+    def __init__(self, main_dict, columns=None, exclude=None):
+        # Each group is one dict in main_dict, with the index of its parent group, its
+        # key in the parent, its number of keys and the leaves gathered from it
+        self._groups = []
+        self._exclude = set(exclude) if exclude is not None else set()
+        discovered = {}
+        self._walk(main_dict, -1, None, "", discovered)
+
+        if columns is None:
+            columns = list(discovered.keys())
+        self.columns = list(columns)
+        column_set = set(self.columns)
+        self.added_keys = [k for k in discovered if k not in column_set]
+        self.removed_keys = [k for k in self.columns if k not in discovered]
+
+        # Resolve each discovered leaf to its position in the row
+        position = {k: i for i, k in enumerate(self.columns)}
+        for group in self._groups:
+            scalars, vectors = [], []
+            for kind, key, index, names in group.pop("leaves"):
+                positions = [position.get(n) for n in names]
+                if kind == "vector":
+                    start = positions[0]
+                    if start is not None and positions == list(range(start, start + len(names))):
+                        # Whole vector maps onto a contiguous slice of the row
+                        vectors.append((key, start, start + len(names)))
+                    else:
+                        # Vector only partly kept; gather elementwise
+                        scalars.extend(
+                            (key, i, p) for i, p in enumerate(positions) if p is not None
+                        )
+                elif positions[0] is not None:
+                    scalars.append((key, index, positions[0]))
+            group["scalars"] = scalars
+            group["vectors"] = vectors
+
+        self.row = np.full(len(self.columns), np.nan)
+
+        # For main_dict backed by a StateStore, gather buffer values by index
+        self._store = None
+        if isinstance(main_dict, StateDict):
+            self._compile_store(main_dict)
+
+    def _compile_store(self, main_dict):
+        # Split the leaves into those held in the store buffer, copied with one
+        # indexed copy, and plain values, read from their StateDict directly. The
+        # layout is fixed as long as the store version is unchanged.
+        self._store = main_dict.store
+        self._version = self._store.version
+        src, dst = [], []
+        self._direct = []
+        resolved = []
+        for group in self._groups:
+            if group["parent"] < 0:
+                d = main_dict
+            else:
+                d = resolved[group["parent"]][group["key"]]
+            resolved.append(d)
+
+            scalars, vectors = [], []
+            for key, index, pos in group["scalars"]:
+                f = d.field(key)
+                if f is None:
+                    scalars.append((key, index, pos))
+                else:
+                    src.append(f[0] + (index or 0))
+                    dst.append(pos)
+            for key, start, stop in group["vectors"]:
+                f = d.field(key)
+                if f is None:
+                    vectors.append((key, start, stop))
+                else:
+                    src.extend(range(f[0], f[0] + f[1]))
+                    dst.extend(range(start, stop))
+            if scalars or vectors:
+                self._direct.append((d, scalars, vectors))
+        self._src = np.array(src, dtype=int)
+        self._dst = np.array(dst, dtype=int)
+
+    def _walk(self, d, parent, key_in_parent, prefix, discovered):
+        # Leaves are ("scalar", key, None, [name]), ("element", key, index, [name])
+        # or ("vector", key, None, names)
+        group = {"parent": parent, "key": key_in_parent, "n_keys": len(d), "leaves": []}
+        self._groups.append(group)
+        group_index = len(self._groups) - 1
+
+        for k, v in d.items():
+            if prefix + k in self._exclude:
+                continue
+            if isinstance(v, Mapping):
+                self._walk(v, group_index, k, prefix + k + ".", discovered)
+            elif isinstance(v, (list, tuple)) or (isinstance(v, np.ndarray) and v.ndim == 1):
+                names = [prefix + k + ".%03d" % i for i in range(len(v))]
+                keep = [_is_number(vi) or vi is None for vi in v]
+                if len(v) > 0 and all(keep):
+                    group["leaves"].append(("vector", k, None, names))
+                else:
+                    # Mixed list: keep only the numeric elements
+                    keep = [_is_number(vi) for vi in v]
+                    for i in range(len(v)):
+                        if keep[i]:
+                            group["leaves"].append(("element", k, i, [names[i]]))
+                for n, kept in zip(names, keep):
+                    if kept:
+                        discovered[n] = True
+            elif _is_number(v) or (isinstance(v, np.ndarray) and v.ndim == 0):
+                group["leaves"].append(("scalar", k, None, [prefix + k]))
+                discovered[prefix + k] = True
+
+    def gather(self, main_dict):
+        """
+        Gather the current values of main_dict into the plan's row buffer.
+
+        Returns the row buffer itself, which is overwritten on the next call.
+        Raises StaleFlatteningPlan if a dict gained or lost keys or a list changed length.
+        """
+        if self._store is not None:
+            return self._gather_store(main_dict)
+
+        row = self.row
+        resolved = []
+        try:
+            for group in self._groups:
+                if group["parent"] < 0:
+                    d = main_dict
+                else:
+                    d = resolved[group["parent"]][group["key"]]
+                if not isinstance(d, Mapping) or len(d) != group["n_keys"]:
+                    raise StaleFlatteningPlan()
+                resolved.append(d)
+
+                for key, index, pos in group["scalars"]:
+                    v = d[key] if index is None else d[key][index]
+                    try:
+                        row[pos] = v
+                    except (TypeError, ValueError):
+                        row[pos] = np.nan
+
+                for key, start, stop in group["vectors"]:
+                    v = d[key]
+                    if len(v) != stop - start:
+                        raise StaleFlatteningPlan()
+                    try:
+                        row[start:stop] = v
+                    except (TypeError, ValueError):
+                        row[start:stop] = [vi if _is_number(vi) else np.nan for vi in v]
+        except (KeyError, IndexError, TypeError):
+            raise StaleFlatteningPlan()
+
+        return row
+
+    def _gather_store(self, main_dict):
+        if (
+            not isinstance(main_dict, StateDict)
+            or main_dict.store is not self._store
+            or self._store.version != self._version
+        ):
+            raise StaleFlatteningPlan()
+
+        row = self.row
+        row[self._dst] = self._store.data[self._src]
+        try:
+            for d, scalars, vectors in self._direct:
+                for key, index, pos in scalars:
+                    v = d[key] if index is None else d[key][index]
+                    try:
+                        row[pos] = v
+                    except (TypeError, ValueError):
+                        row[pos] = np.nan
+
+                for key, start, stop in vectors:
+                    v = d[key]
+                    if len(v) != stop - start:
+                        raise StaleFlatteningPlan()
+                    try:
+                        row[start:stop] = v
+                    except (TypeError, ValueError):
+                        row[start:stop] = [vi if _is_number(vi) else np.nan for vi in v]
+        except (KeyError, IndexError, TypeError):
+            raise StaleFlatteningPlan()
+
+        return row
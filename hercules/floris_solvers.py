@@ -0,0 +1,671 @@
+# Faster FLORIS solves for the FLORIS standin
+#
+# The FLORIS standin solves FLORIS for a single wind condition every time step.
+# The helpers here reduce that cost, in exchange for small, user-controlled
+# differences from solving every step (interpolation or quantization errors).
+#
+# FlorisPowerTable precomputes the turbine powers over a grid of wind speeds
+# and wind directions in a few large vectorized runs, and then serves them by
+# interpolation, for steps in which all turbines operate at their defaults
+# (no yaw misalignment, no power setpoint) under homogeneous inflow.
+#
+# FlorisSolveCache memoizes FLORIS solves on the quantized inputs of a step, so
+# that steps repeating an earlier wind condition and turbine operation reuse
+# its turbine powers.
+#
+# FlorisLookahead solves a known time series of wind conditions (from the
+# standin data) ahead of time in batched runs, re-solving the steps ahead of
+# the current one when the turbine operation changes.
+#
+# FlorisIncrementalSolver re-solves only the turbines whose inflow can change
+# when the operation of a few turbines changes under the same wind condition.
+#
+# FlorisBatchSolver runs the batched solves of the power table and look-ahead,
+# optionally splitting the wind conditions of large batches across processes
+# with FLORIS's ParFlorisModel. A single wind condition cannot be split, so
+# parallelism only pays off for batches.
+
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+
+import floris
+import numpy as np
+from floris import ParFlorisModel
+from floris.core.turbine.operation_models import POWER_SETPOINT_DEFAULT
+
+DEFAULT_TABLE_WIND_SPEEDS = np.arange(0.0, 30.0 + 0.25, 0.5)
+DEFAULT_TABLE_WIND_DIRECTIONS = np.arange(0.0, 360.0, 1.0)
+
+# Flow field entries that change from step to step, and so do not identify a model
+_CONDITION_KEYS = ["wind_speeds", "wind_directions", "turbulence_intensities"]
+
+
+def operation_is_default(yaw_angles, power_setpoints):
+    """
+    True if the FLORIS yaw angles (misalignments) are all zero and no power
+    setpoint is below the FLORIS default, i.e. the turbines operate normally.
+    Either argument may be None, meaning default.
+    """
+    if yaw_angles is not None and np.any(np.asarray(yaw_angles, dtype=float) != 0.0):
+        return False
+    if power_setpoints is not None and np.any(
+        np.asarray(power_setpoints, dtype=float) < POWER_SETPOINT_DEFAULT
+    ):
+        return False
+    return True
+
+
+def _turbulence_intensity(fmodel):
+    # The turbulence intensity of the wind conditions fmodel is set to
+    turbulence_intensities = np.asarray(fmodel.core.flow_field.turbulence_intensities)
+    if turbulence_intensities.size == 0:
+        raise ValueError("fmodel must have its wind conditions set.")
+    return float(turbulence_intensities.flat[0])
+
+
+def floris_model_hash(fmodel, *extra):
+    """
+    Hash identifying a FLORIS model (layout, turbines, wake models and ambient
+    settings, but not the current wind conditions) and the installed FLORIS
+    version, together with any extra JSON-serializable values.
+    """
+    model_dict = fmodel.core.as_dict()
+    model_dict["flow_field"] = {
+        k: v for k, v in model_dict["flow_field"].items() if k not in _CONDITION_KEYS
+    }
+    model_dict.pop("logging", None)
+    text = json.dumps(
+        [model_dict, floris.__version__, list(extra)],
+        sort_keys=True,
+        default=lambda o: o.tolist() if isinstance(o, np.ndarray) else str(o),
+    )
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class FlorisBatchSolver:
+    """
+    Solves batches of wind conditions, in parallel for large batches if
+    configured.
+
+    Inputs:
+    - fmodel: FlorisModel to solve. It is copied, not modified.
+    - parallel: optional dictionary of options for ParFlorisModel ("interface",
+        "max_workers", "n_wind_condition_splits"), plus "min_batch_size", the
+        smallest batch solved in parallel, as starting the worker processes
+        costs more than solving small batches. Defaults to None (always solve in
+        this process).
+    - min_batch_size: smallest batch solved in parallel if parallel does not
+        give "min_batch_size". Callers solving smaller batches pass their batch
+        size. Defaults to 100.
+    """
+
+    def __init__(self, fmodel, parallel=None, min_batch_size=100):
+        self.fmodel = fmodel.copy()
+        if parallel is not None:
+            parallel = dict(parallel)
+            self.min_batch_size = int(parallel.pop("min_batch_size", min_batch_size))
+            self.par_fmodel = ParFlorisModel(fmodel, **parallel)
+        else:
+            self.min_batch_size = None
+            self.par_fmodel = None
+        self.n_parallel_runs = 0
+
+    @property
+    def n_turbines(self):
+        return self.fmodel.n_turbines
+
+    def solve(
+        self,
+        wind_speeds,
+        wind_directions,
+        turbulence_intensity,
+        yaw_misalignments=None,
+        power_setpoints=None,
+    ):
+        """
+        Turbine powers (kW), of shape (n_conditions, n_turbines), for each wind
+        condition, with the given yaw misalignments (deg) and power setpoints (W)
+        for all conditions, or default operation if None
+        """
+        n = len(wind_speeds)
+        if self.par_fmodel is not None and n >= self.min_batch_size:
+            fmodel = self.par_fmodel
+            self.n_parallel_runs += 1
+        else:
+            fmodel = self.fmodel
+        fmodel.set(
+            wind_speeds=wind_speeds,
+            wind_directions=wind_directions,
+            turbulence_intensities=np.full(n, turbulence_intensity),
+            heterogeneous_inflow_config=None,
+        )
+        fmodel.reset_operation()
+        if yaw_misalignments is not None or power_setpoints is not None:
+            fmodel.set(
+                yaw_angles=(
+                    None
+                    if yaw_misalignments is None
+                    else np.repeat(np.reshape(yaw_misalignments, (1, -1)), n, axis=0)
+                ),
+                power_setpoints=(
+                    None
+                    if power_setpoints is None
+                    else np.repeat(np.reshape(power_setpoints, (1, -1)), n, axis=0)
+                ),
+            )
+        fmodel.run()
+        return fmodel.get_turbine_powers() / 1000  # in kW
+
+
+class FlorisPowerTable:
+    """
+    Turbine powers precomputed over a (wind speed x wind direction) grid.
+
+    The powers are computed with default turbine operation at the turbulence
+    intensity of fmodel, and interpolated bilinearly (periodically in wind
+    direction if the direction grid covers the full circle).
+
+    Inputs:
+    - fmodel: FlorisModel to tabulate. It is copied, not modified.
+    - wind_speeds: grid of wind speeds (m/s). Defaults to 0 to 30 m/s by 0.5 m/s.
+    - wind_directions: grid of wind directions (deg). Defaults to 0 to 359 deg by 1 deg.
+    - cache_file: optional .npz file. If it holds a table for the same model, grid
+        and FLORIS version it is loaded; otherwise the table is computed and saved to it.
+    - batch_size: number of wind conditions solved per FLORIS run
+    - parallel: optional options for solving the table in parallel (see
+        FlorisBatchSolver)
+    """
+
+    def __init__(
+        self,
+        fmodel,
+        wind_speeds=None,
+        wind_directions=None,
+        cache_file=None,
+        batch_size=10000,
+        parallel=None,
+    ):
+        if wind_speeds is None:
+            wind_speeds = DEFAULT_TABLE_WIND_SPEEDS
+        if wind_directions is None:
+            wind_directions = DEFAULT_TABLE_WIND_DIRECTIONS
+        self.wind_speeds = np.sort(np.asarray(wind_speeds, dtype=float))
+        self.wind_directions = np.sort(np.mod(np.asarray(wind_directions, dtype=float), 360.0))
+        if len(self.wind_speeds) < 2 or len(self.wind_directions) < 2:
+            raise ValueError("The power table needs at least two wind speeds and directions.")
+        self.turbulence_intensity = _turbulence_intensity(fmodel)
+
+        self.key = floris_model_hash(
+            fmodel,
+            self.wind_speeds,
+            self.wind_directions,
+            self.turbulence_intensity,
+        )
+        self.powers = None
+        if cache_file is not None and Path(cache_file).exists():
+            cached = np.load(cache_file)
+            if str(cached["key"]) == self.key:
+                self.powers = cached["powers"]
+        if self.powers is None:
+            self.powers = self._solve(FlorisBatchSolver(fmodel, parallel), int(batch_size))
+            if cache_file is not None:
+                Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+                np.savez(cache_file, key=self.key, powers=self.powers)
+
+        # Close the direction grid across 360 deg if it covers the full circle
+        wd = self.wind_directions
+        gap = wd[0] + 360.0 - wd[-1]
+        self.periodic = gap <= np.max(np.diff(wd)) + 1e-9
+        if self.periodic:
+            self._wd_grid = np.append(wd, wd[0] + 360.0)
+            self._powers = np.concatenate([self.powers, self.powers[:, :1, :]], axis=1)
+        else:
+            self._wd_grid = wd
+            self._powers = self.powers
+
+    def _solve(self, solver, batch_size):
+        # Solve all grid conditions in batches, with default turbine operation
+        ws, wd = np.meshgrid(self.wind_speeds, self.wind_directions, indexing="ij")
+        ws = ws.ravel()
+        wd = wd.ravel()
+        powers = np.empty((len(ws), solver.n_turbines))
+        for start in range(0, len(ws), batch_size):
+            stop = min(start + batch_size, len(ws))
+            powers[start:stop] = solver.solve(
+                ws[start:stop], wd[start:stop], self.turbulence_intensity
+            )
+        return powers.reshape(len(self.wind_speeds), len(self.wind_directions), -1)
+
+    def get_turbine_powers(self, wind_speed, wind_direction):
+        """
+        Interpolated turbine powers (kW) at one wind condition, or None if it is
+        outside the grid
+        """
+        ws_grid = self.wind_speeds
+        if not ws_grid[0] <= wind_speed <= ws_grid[-1]:
+            return None
+        wd_grid = self._wd_grid
+        wind_direction = float(wind_direction) % 360.0
+        if self.periodic and wind_direction < wd_grid[0]:
+            wind_direction += 360.0
+        if not wd_grid[0] <= wind_direction <= wd_grid[-1]:
+            return None
+
+        i = min(np.searchsorted(ws_grid, wind_speed, side="right") - 1, len(ws_grid) - 2)
+        j = min(np.searchsorted(wd_grid, wind_direction, side="right") - 1, len(wd_grid) - 2)
+        a = (wind_speed - ws_grid[i]) / (ws_grid[i + 1] - ws_grid[i])
+        b = (wind_direction - wd_grid[j]) / (wd_grid[j + 1] - wd_grid[j])
+        p = self._powers
+        return (
+            (1 - a) * (1 - b) * p[i, j]
+            + a * (1 - b) * p[i + 1, j]
+            + (1 - a) * b * p[i, j + 1]
+            + a * b * p[i + 1, j + 1]
+        )
+
+
+def _quantize(values, tolerance):
+    # Round values to multiples of tolerance (exact values if tolerance is 0)
+    values = np.asarray(values, dtype=float).ravel()
+    if tolerance > 0:
+        values = np.round(values / tolerance)
+    return tuple(values.tolist())
+
+
+def heterogeneous_inflow_key(heterogeneous_inflow_config):
+    """Hash of the values of a FLORIS heterogeneous inflow configuration, or None"""
+    if heterogeneous_inflow_config is None:
+        return None
+    h = hashlib.sha256()
+    for k in sorted(heterogeneous_inflow_config):
+        h.update(k.encode())
+        h.update(np.ascontiguousarray(heterogeneous_inflow_config[k], dtype=float).tobytes())
+    return h.hexdigest()
+
+
+class FlorisSolveCache:
+    """
+    Least recently used cache of FLORIS turbine powers, keyed on the quantized
+    inputs of a solve.
+
+    Inputs that round to the same multiples of the tolerances share an entry,
+    so a hit returns the powers solved for the first inputs seen in that bin.
+    A tolerance of 0 requires an exact match.
+
+    Inputs:
+    - max_size: maximum number of entries held
+    - wind_speed_tolerance: quantization of the wind speed (m/s)
+    - wind_direction_tolerance: quantization of the wind direction (deg)
+    - yaw_tolerance: quantization of the yaw misalignments (deg)
+    - power_setpoint_tolerance: quantization of the power setpoints (W)
+    """
+
+    def __init__(
+        self,
+        max_size=1024,
+        wind_speed_tolerance=0.01,
+        wind_direction_tolerance=0.01,
+        yaw_tolerance=0.01,
+        power_setpoint_tolerance=1000.0,
+    ):
+        if int(max_size) < 1:
+            raise ValueError("max_size must be at least 1.")
+        tolerances = [
+            wind_speed_tolerance,
+            wind_direction_tolerance,
+            yaw_tolerance,
+            power_setpoint_tolerance,
+        ]
+        if any(t < 0 for t in tolerances):
+            raise ValueError("Tolerances must not be negative.")
+        self.max_size = int(max_size)
+        self.wind_speed_tolerance = wind_speed_tolerance
+        self.wind_direction_tolerance = wind_direction_tolerance
+        self.yaw_tolerance = yaw_tolerance
+        self.power_setpoint_tolerance = power_setpoint_tolerance
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(
+        self,
+        wind_speed,
+        wind_direction,
+        yaw_misalignments,
+        power_setpoints,
+        heterogeneous_inflow_config=None,
+    ):
+        """
+        Key for one solve. yaw_misalignments (deg) and power_setpoints (W) are
+        the values FLORIS solves with, not None.
+        """
+        return (
+            _quantize(wind_speed, self.wind_speed_tolerance),
+            _quantize(np.mod(wind_direction, 360.0), self.wind_direction_tolerance),
+            _quantize(yaw_misalignments, self.yaw_tolerance),
+            _quantize(power_setpoints, self.power_setpoint_tolerance),
+            heterogeneous_inflow_key(heterogeneous_inflow_config),
+        )
+
+    def get(self, key):
+        """The turbine powers stored under key, or None, counting the hit or miss"""
+        turbine_powers = self._entries.get(key)
+        if turbine_powers is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return turbine_powers
+
+    def put(self, key, turbine_powers):
+        """Store turbine powers under key, evicting the least recently used entry if full"""
+        self._entries[key] = np.array(turbine_powers)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def format_summary(self):
+        """One line summary of the cache counters, for logging"""
+        n = self.hits + self.misses
+        hit_rate = 100.0 * self.hits / n if n > 0 else 0.0
+        return "FLORIS solve cache: {0} hits, {1} misses ({2:.1f}% hit rate), {3} entries".format(
+            self.hits, self.misses, hit_rate, len(self)
+        )
+
+
+class FlorisLookahead:
+    """
+    Turbine powers solved ahead of time over a known time series of homogeneous
+    wind conditions.
+
+    Steps are solved in batches: chunk_size steps at a time while the turbines
+    operate at their defaults, and resolve_steps steps at a time otherwise. Each
+    batch holds the operation of its first step for all its steps. Only the
+    current operation is tracked: when it changes, the steps solved so far are
+    out of date, and the step is solved on its own, since the operation may well
+    change again at the next step. Batches resume once the operation has stayed
+    the same for a step.
+
+    Inputs:
+    - fmodel: FlorisModel to solve. It is copied, not modified.
+    - times: times of the steps (s), increasing
+    - wind_speeds: wind speed at each step (m/s)
+    - wind_directions: wind direction at each step (deg)
+    - chunk_size: number of steps solved per FLORIS run with default operation
+    - resolve_steps: number of steps solved per FLORIS run with other operation
+    - parallel: optional options for solving batches in parallel (see
+        FlorisBatchSolver). Unless they give "min_batch_size", batches of
+        resolve_steps steps or more are solved in parallel, and steps solved
+        alone are not.
+    """
+
+    def __init__(
+        self,
+        fmodel,
+        times,
+        wind_speeds,
+        wind_directions,
+        chunk_size=1000,
+        resolve_steps=10,
+        parallel=None,
+    ):
+        if int(chunk_size) < 1 or int(resolve_steps) < 1:
+            raise ValueError("chunk_size and resolve_steps must be at least 1.")
+        self.solver = FlorisBatchSolver(
+            fmodel, parallel, min_batch_size=min(100, int(chunk_size), int(resolve_steps))
+        )
+        self.times = np.asarray(times, dtype=float)
+        self.wind_speeds = np.asarray(wind_speeds, dtype=float)
+        self.wind_directions = np.asarray(wind_directions, dtype=float)
+        self.chunk_size = int(chunk_size)
+        self.resolve_steps = int(resolve_steps)
+        self.turbulence_intensity = _turbulence_intensity(fmodel)
+
+        n_turbines = self.solver.n_turbines
+        self.powers = np.full((len(self.times), n_turbines), np.nan)
+        # Current operation (yaw misalignments and power setpoints, as bytes), and
+        # the number of changes of operation so far; each step holds that number
+        # when it was solved (-1: not solved)
+        self._operation = None
+        self._n_changes = 0
+        self._solved_with = np.full(len(self.times), -1, dtype=int)
+        self.n_runs = 0
+        self.n_steps_solved = 0
+
+    def step_index(self, time):
+        """Index of the step at time, or None if time is not a step"""
+        i = int(np.searchsorted(self.times, time))
+        for j in (i - 1, i):
+            if 0 <= j < len(self.times) and np.isclose(self.times[j], time, rtol=0, atol=1e-9):
+                return j
+        return None
+
+    def get_turbine_powers(self, time, yaw_misalignments, power_setpoints):
+        """
+        Turbine powers (kW) at the step at time, solving ahead if needed, or None
+        if time is not a step. yaw_misalignments (deg) and power_setpoints (W)
+        are the values FLORIS solves with, not None.
+        """
+        i = self.step_index(time)
+        if i is None:
+            return None
+
+        yaw_misalignments = np.asarray(yaw_misalignments, dtype=float).reshape(1, -1)
+        power_setpoints = np.asarray(power_setpoints, dtype=float).reshape(1, -1)
+        operation = yaw_misalignments.tobytes() + power_setpoints.tobytes()
+        changed = self._operation is not None and operation != self._operation
+        if operation != self._operation:
+            self._operation = operation
+            self._n_changes += 1
+
+        if self._solved_with[i] != self._n_changes:
+            if changed:
+                n_steps = 1
+            elif operation_is_default(yaw_misalignments, power_setpoints):
+                n_steps = self.chunk_size
+            else:
+                n_steps = self.resolve_steps
+            self._solve(i, min(i + n_steps, len(self.times)), yaw_misalignments, power_setpoints)
+            self._solved_with[i : i + n_steps] = self._n_changes
+        return self.powers[i]
+
+    def _solve(self, start, stop, yaw_misalignments, power_setpoints):
+        self.powers[start:stop] = self.solver.solve(
+            self.wind_speeds[start:stop],
+            self.wind_directions[start:stop],
+            self.turbulence_intensity,
+            yaw_misalignments,
+            power_setpoints,
+        )
+        self.n_runs += 1
+        self.n_steps_solved += stop - start
+
+
+class FlorisIncrementalSolver:
+    """
+    Solves FLORIS for one wind condition at a time, re-solving only part of the
+    farm when the wind condition is unchanged and only some turbines change
+    their yaw misalignment or power setpoint.
+
+    The turbines affected by a change are the changed turbines and, repeatedly,
+    the turbines in the wake cone of an affected turbine for the current wind
+    direction. These are solved in a sub-farm together with the turbines whose
+    wakes can reach them; the other turbines keep their previous powers. The wake
+    cone of a turbine widens from wake_margin rotor diameters either side of its
+    axis by wake_expansion (m per m downstream). Wakes outside the cone are
+    neglected, so the cone should be wide enough to hold the wakes and their
+    deflection. The transverse velocities of the GCH model
+    (enable_transverse_velocities) are not confined to a cone, so with them the
+    turbines outside the sub-farm keep slightly outdated powers.
+
+    The wind condition counts as unchanged while it stays within the tolerances
+    of the wind condition of the last full solve, so that slowly drifting wind
+    still brings a full solve once it has drifted by more than the tolerances.
+    The sub-farm is solved for the current wind condition.
+
+    Inputs:
+    - fmodel: FlorisModel to solve. It is copied, not modified.
+    - wake_expansion: growth of the half width of the wake cone per unit distance
+        downstream
+    - wake_margin: half width of the wake cone at the turbine, in rotor diameters
+    - max_fraction: if the sub-farm would hold more than this fraction of the
+        turbines, the whole farm is solved instead
+    - wind_speed_tolerance: largest change of the wind speed from the last full
+        solve counted as unchanged (m/s)
+    - wind_direction_tolerance: largest change of the wind direction from the
+        last full solve counted as unchanged (deg)
+    """
+
+    def __init__(
+        self,
+        fmodel,
+        wake_expansion=0.1,
+        wake_margin=1.5,
+        max_fraction=0.5,
+        wind_speed_tolerance=0.01,
+        wind_direction_tolerance=0.01,
+    ):
+        if wind_speed_tolerance < 0 or wind_direction_tolerance < 0:
+            raise ValueError("Tolerances must be non-negative.")
+        self.fmodel = fmodel.copy()
+        self._sub_fmodel = fmodel.copy()
+        self.wake_expansion = wake_expansion
+        self.wake_margin = wake_margin
+        self.max_fraction = max_fraction
+        self.wind_speed_tolerance = wind_speed_tolerance
+        self.wind_direction_tolerance = wind_direction_tolerance
+        self.turbulence_intensity = _turbulence_intensity(fmodel)
+
+        self.layout_x = np.array(self.fmodel.layout_x, dtype=float)
+        self.layout_y = np.array(self.fmodel.layout_y, dtype=float)
+        self.n_turbines = len(self.layout_x)
+        self.rotor_diameters = np.asarray(
+            self.fmodel.core.farm.rotor_diameters, dtype=float
+        ).ravel()[-self.n_turbines :]
+        self.turbine_type = list(self.fmodel.core.farm.turbine_type)
+
+        # Wind condition of the last full solve, and operation and turbine powers
+        # (kW) of the previous solve
+        self._wind = None
+        self._yaw_misalignments = None
+        self._power_setpoints = None
+        self.turbine_powers = None
+        self._influence = None
+
+        self.n_full = 0
+        self.n_incremental = 0
+        self.n_reused = 0
+
+    def influence(self, wind_direction):
+        """
+        Boolean matrix, entry [j, i] True if the wake of turbine j can reach
+        turbine i for the wind direction (deg)
+        """
+        theta = np.radians(wind_direction)
+        # Unit vector in the direction the wind blows towards
+        ux, uy = -np.sin(theta), -np.cos(theta)
+        dx = self.layout_x[None, :] - self.layout_x[:, None]
+        dy = self.layout_y[None, :] - self.layout_y[:, None]
+        downstream = dx * ux + dy * uy
+        lateral = np.abs(dx * uy - dy * ux)
+        half_width = (
+            self.wake_margin * self.rotor_diameters[:, None]
+            + 0.5 * self.rotor_diameters[None, :]
+            + self.wake_expansion * downstream
+        )
+        return (downstream > 0) & (lateral <= half_width)
+
+    @staticmethod
+    def _closure(start, influence):
+        # All turbines reachable from start through the influence matrix
+        reached = start.copy()
+        while True:
+            new = reached | influence[reached].any(axis=0)
+            if (new == reached).all():
+                return reached
+            reached = new
+
+    def solve(self, wind_speed, wind_direction, yaw_misalignments, power_setpoints):
+        """
+        Turbine powers (kW) for the wind condition, with yaw_misalignments (deg)
+        and power_setpoints (W) the values FLORIS solves with, not None
+        """
+        yaw_misalignments = np.array(yaw_misalignments, dtype=float).reshape(1, -1)
+        power_setpoints = np.array(power_setpoints, dtype=float).reshape(1, -1)
+        wind = (float(wind_speed), float(wind_direction))
+
+        if self._wind_changed(wind) or self.turbine_powers is None:
+            self._solve_full(wind, yaw_misalignments, power_setpoints)
+            return self.turbine_powers.copy()
+
+        changed = (yaw_misalignments != self._yaw_misalignments).ravel() | (
+            power_setpoints != self._power_setpoints
+        ).ravel()
+        if not changed.any():
+            self.n_reused += 1
+            return self.turbine_powers.copy()
+
+        if self._influence is None:
+            self._influence = self.influence(self._wind[1])
+        affected = self._closure(changed, self._influence)
+        sub_farm = self._closure(affected, self._influence.T)
+        if sub_farm.sum() > self.max_fraction * self.n_turbines:
+            self._solve_full(wind, yaw_misalignments, power_setpoints)
+            return self.turbine_powers.copy()
+
+        index = np.flatnonzero(sub_farm)
+        if len(self.turbine_type) > 1:
+            turbine_type = [self.turbine_type[i] for i in index]
+        else:
+            turbine_type = None
+        self._sub_fmodel.set(
+            layout_x=self.layout_x[index],
+            layout_y=self.layout_y[index],
+            turbine_type=turbine_type,
+            wind_speeds=[wind_speed],
+            wind_directions=[wind_direction],
+            turbulence_intensities=[self.turbulence_intensity],
+            yaw_angles=yaw_misalignments[:, index],
+            power_setpoints=power_setpoints[:, index],
+        )
+        self._sub_fmodel.run()
+        sub_powers = self._sub_fmodel.get_turbine_powers().ravel() / 1000  # in kW
+        self.turbine_powers[index[affected[index]]] = sub_powers[affected[index]]
+
+        self._yaw_misalignments = yaw_misalignments
+        self._power_setpoints = power_setpoints
+        self.n_incremental += 1
+        return self.turbine_powers.copy()
+
+    def _wind_changed(self, wind):
+        # Whether wind is outside the tolerances of the wind of the last full solve
+        if self._wind is None:
+            return True
+        speed_change = abs(wind[0] - self._wind[0])
+        direction_change = abs((wind[1] - self._wind[1] + 180.0) % 360.0 - 180.0)
+        return (
+            speed_change > self.wind_speed_tolerance
+            or direction_change > self.wind_direction_tolerance
+        )
+
+    def _solve_full(self, wind, yaw_misalignments, power_setpoints):
+        self.fmodel.set(
+            wind_speeds=[wind[0]],
+            wind_directions=[wind[1]],
+            turbulence_intensities=[self.turbulence_intensity],
+            yaw_angles=yaw_misalignments,
+            power_setpoints=power_setpoints,
+        )
+        self.fmodel.run()
+        self.turbine_powers = self.fmodel.get_turbine_powers().ravel() / 1000  # in kW
+        if wind != self._wind:
+            self._influence = None
+        self._wind = wind
+        self._yaw_misalignments = yaw_misalignments
+        self._power_setpoints = power_setpoints
+        self.n_full += 1
@@ -10,17 +10,33 @@
 # - - Update the turbine measurements
 # - - Sleep for 1 s
 
+import hashlib
+import json
 import logging
+import os
+import pickle
 import sys
-import warnings
+import time
 from pathlib import Path
 
+import floris
 import numpy as np
 from floris import FlorisModel
 from floris.turbine_library import build_cosine_loss_turbine_dict
-from scipy.interpolate import interp1d
 
-from hercules.amr_wind_standin import AMRWindStandin, read_amr_wind_input
+from hercules.amr_wind_input import load_amr_wind_input, read_amr_wind_input
+from hercules.amr_wind_standin import AMRWindStandin
+from hercules.floris_solvers import (
+    FlorisIncrementalSolver,
+    FlorisLookahead,
+    FlorisPowerTable,
+    FlorisSolveCache,
+    operation_is_default,
+)
+from hercules.heterogeneous_inflow import HeterogeneousInflowSeries
+from hercules.local_coupling import farm_topics
+from hercules.realtime import StepBudget
+from hercules.standin_data import standin_data_cursor
 
 # Set up the logger
 # Useful for when running on eagle
@@ -36,83 +52,124 @@ logger = logging.getLogger("amr_wind_standin")
 # Perhaps a small hack to also send log to the terminal outout
 logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
 
-#  Make an announcement
-logger.info("Emulator amr_wind_standin (standing in for AMR-Wind) connecting to server")
-
-
-# Define a function to read the amrwind input file
-# Note simply copied from emulator
-def construct_floris_from_amr_input(amr_wind_input):
-    # Probably want a file not found error instead
-
-    with open(amr_wind_input) as fp:
-        Lines = fp.readlines()
-
-        # Get the turbine locations
-        layout_x = []
-        layout_y = []
-        for line in Lines:
-            if ".base_position" in line:
-                loc = [float(d) for d in line.split()[2:]]
-                layout_x.append(loc[0])
-                layout_y.append(loc[1])
-
-        # Check that uniform disk is specified
-        for line in Lines:
-            if "Actuator.type" in line:
-                acuator_type = line.split()[2]
-                if acuator_type == "UniformCtDisk":
-                    pass
-                else:
-                    raise NotImplementedError("FLORIS standin requires UniformCtDisk actuators.")
-
-        # Get the turine parameters
-        for line in Lines:
-            if acuator_type + ".rotor_diameter" in line:
-                rotor_diameter = float(line.split()[2])
-        for line in Lines:
-            if acuator_type + ".hub_height" in line:
-                hub_height = float(line.split()[2])
-        for line in Lines:
-            if acuator_type + ".density" in line:
-                ref_air_density = float(line.split()[2])
-
-        # construct turbine thrust and power curves
-        for line in Lines:
-            if acuator_type + ".thrust_coeff" in line:
-                thrust_coefficient = [float(d) for d in line.split()[2:]]
-        for line in Lines:
-            if acuator_type + ".wind_speed" in line:
-                wind_speed = [float(d) for d in line.split()[2:]]
-        # The power curve needs to be constructed from available data
-        thrust_coefficient = np.array(thrust_coefficient)
-        if (thrust_coefficient < 0).any() or (thrust_coefficient > 1).any():
-            print("Clipping thrust_coefficient to (0, 1) interval.")
-            thrust_coefficient = np.clip(thrust_coefficient, 0.0, 1.0)
-        ai = (1 - np.sqrt(1 - np.array(thrust_coefficient))) / 2
-        power_coefficient = 4 * ai * (1 - ai) ** 2
-        turbine_data_dict = {
-            "wind_speed": wind_speed,
-            "thrust_coefficient": thrust_coefficient,
-            "power_coefficient": list(power_coefficient),
-        }
-
-        # Build the turbine dictionary as expected by FLORIS
-        turb_dict = build_cosine_loss_turbine_dict(
-            turbine_data_dict=turbine_data_dict,
-            turbine_name="FLORIS-standin-turbine",
-            hub_height=hub_height,
-            rotor_diameter=rotor_diameter,
-            ref_air_density=ref_air_density,
-            generator_efficiency=1.0,
-        )
-        turb_dict["operation_model"] = "mixed"
 
-        # load a default model
-        fmodel = FlorisModel(default_floris_dict)
-        fmodel.set(
-            layout_x=layout_x, layout_y=layout_y, turbine_type=[turb_dict] * len(layout_x)
-        )
+# Constructed FLORIS models, pickled, by floris_input_key
+_floris_model_cache = {}
+
+# Version of the construction of the model from the input file, part of the cache
+# key so that models cached by an earlier construction are not loaded
+_FLORIS_MODEL_FORMAT = "2"
+
+
+def floris_input_key(amr_wind_input_text):
+    """
+    Key identifying the FLORIS model constructed from the text of an AMR-Wind
+    input file: a hash of the text, the default FLORIS settings of the standin
+    and the installed FLORIS and numpy versions.
+    """
+    h = hashlib.sha256()
+    h.update(amr_wind_input_text.encode())
+    h.update(json.dumps(default_floris_dict, sort_keys=True).encode())
+    h.update(floris.__version__.encode())
+    h.update(np.__version__.encode())
+    h.update(_FLORIS_MODEL_FORMAT.encode())
+    return h.hexdigest()
+
+
+def construct_floris_from_amr_input(amr_wind_input, cache_dir=None):
+    """
+    Construct the FLORIS model standing in for the AMR-Wind simulation of
+    amr_wind_input.
+
+    Constructed models are cached, keyed on floris_input_key, so that later
+    calls with the same input file (e.g. standins launched in a parameter
+    sweep) load the model instead of building it. The cache is held in memory,
+    and also in cache_dir if given, where it is shared with other processes and
+    later runs. Each call returns a new model.
+    """
+    amr_input = load_amr_wind_input(amr_wind_input)
+    key = floris_input_key(amr_input.text)
+
+    if key not in _floris_model_cache and cache_dir is not None:
+        cache_file = Path(cache_dir) / "floris_model_{}.pkl".format(key[:16])
+        if cache_file.exists():
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached["key"] == key:
+                _floris_model_cache[key] = cached["model"]
+    if key not in _floris_model_cache:
+        fmodel = _construct_floris(amr_input)
+        _floris_model_cache[key] = pickle.dumps(fmodel, protocol=pickle.HIGHEST_PROTOCOL)
+        if cache_dir is not None:
+            _write_floris_model_cache(cache_dir, key, _floris_model_cache[key])
+
+    return pickle.loads(_floris_model_cache[key])
+
+
+def _write_floris_model_cache(cache_dir, key, model):
+    # Write to a temporary file and rename, so that standins launched together
+    # never load a partly written cache file
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_file = cache_dir / "floris_model_{}.pkl".format(key[:16])
+    tmp_file = cache_dir / "{}.{}.tmp".format(cache_file.name, os.getpid())
+    with open(tmp_file, "wb") as f:
+        pickle.dump({"key": key, "model": model}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
+
+
+def _construct_floris(amr_input):
+    # Build the FLORIS model from the settings of an AMR-Wind input file (AMRWindInput)
+
+    # Check that uniform disk is specified
+    if amr_input.actuator_type != "UniformCtDisk":
+        raise NotImplementedError("FLORIS standin requires UniformCtDisk actuators.")
+    amr_input.require(
+        "turbine_labels", "rotor_diameter", "hub_height", "density", "thrust_coefficient",
+        "wind_speed",
+    )
+
+    # Get the turbine locations
+    layout_x = [position[0] for position in amr_input.base_positions]
+    layout_y = [position[1] for position in amr_input.base_positions]
+
+    # Get the turbine parameters
+    rotor_diameter = amr_input.rotor_diameter
+    hub_height = amr_input.hub_height
+    ref_air_density = amr_input.density
+
+    # construct turbine thrust and power curves
+    thrust_coefficient = amr_input.thrust_coefficient
+    wind_speed = list(amr_input.wind_speed)
+    # The power curve needs to be constructed from available data
+    thrust_coefficient = np.array(thrust_coefficient)
+    if (thrust_coefficient < 0).any() or (thrust_coefficient > 1).any():
+        print("Clipping thrust_coefficient to (0, 1) interval.")
+        thrust_coefficient = np.clip(thrust_coefficient, 0.0, 1.0)
+    ai = (1 - np.sqrt(1 - np.array(thrust_coefficient))) / 2
+    power_coefficient = 4 * ai * (1 - ai) ** 2
+    turbine_data_dict = {
+        "wind_speed": wind_speed,
+        "thrust_coefficient": thrust_coefficient,
+        "power_coefficient": list(power_coefficient),
+    }
+
+    # Build the turbine dictionary as expected by FLORIS
+    turb_dict = build_cosine_loss_turbine_dict(
+        turbine_data_dict=turbine_data_dict,
+        turbine_name="FLORIS-standin-turbine",
+        hub_height=hub_height,
+        rotor_diameter=rotor_diameter,
+        ref_air_density=ref_air_density,
+        generator_efficiency=1.0,
+    )
+    turb_dict["operation_model"] = "mixed"
+
+    # load a default model
+    fmodel = FlorisModel(default_floris_dict)
+    fmodel.set(
+        layout_x=layout_x, layout_y=layout_y, turbine_type=[turb_dict] * len(layout_x)
+    )
 
     return fmodel
 
@@ -123,18 +180,74 @@ class FlorisStandin(AMRWindStandin):
     Arguments:
     config_dict: dictionary of configuration parameters
     amr_input_file: path to the AMR-Wind input file
-    amr_standin_data_file [optional]: path to the AMR-Wind standin data file.
-        Defaults to None
+    amr_standin_data_file [optional]: path to the AMR-Wind standin data, a CSV
+        file or a binary bundle directory (see hercules.standin_data). Defaults
+        to None
     smoothing_coefficient [optional]: smoothing coefficient for turbine power
         output. Must be in [0, 1). If 0, no smoothing is applied; if near 1,
         the output is heavily smoothed. Defaults to 0.5.
+    message_codec [optional]: codec for status messages, "auto" or "text". See
+        AMRWindStandin. Defaults to "auto".
+    power_table [optional]: if given, a dictionary of options for a precomputed
+        power table (see FlorisPowerTable), with optional keys "wind_speeds",
+        "wind_directions" and "cache_file". Steps with homogeneous inflow and
+        default turbine operation then interpolate the turbine powers from the
+        table instead of running FLORIS. Defaults to None (always run FLORIS).
+    solve_cache [optional]: if given, a dictionary of options for a cache of
+        FLORIS solves (see FlorisSolveCache), with optional keys "max_size",
+        "wind_speed_tolerance", "wind_direction_tolerance", "yaw_tolerance",
+        "power_setpoint_tolerance" (W) and "log_interval" (number of lookups
+        between logging the hit and miss counts, default 1000). Defaults to None
+        (no cache).
+    lookahead [optional]: if given, a dictionary of options for solving the
+        wind conditions of amr_standin_data_file ahead of time in batches (see
+        FlorisLookahead), with optional keys "chunk_size" and "resolve_steps".
+        Requires amr_standin_data_file without heterogeneous inflow. Defaults to
+        None (solve each step as it comes).
+    incremental [optional]: if given, a dictionary of options for re-solving
+        only the part of the farm affected by changes of yaw angles or power
+        setpoints while the wind condition is unchanged (see
+        FlorisIncrementalSolver), with optional keys "wake_expansion",
+        "wake_margin", "max_fraction", "wind_speed_tolerance" and
+        "wind_direction_tolerance" (wind conditions within the tolerances of
+        the last full solve count as unchanged). Only used with homogeneous
+        inflow. This is an approximation: the turbines outside the re-solved
+        part keep their previous powers, and with the GCH transverse velocities
+        enabled (enable_transverse_velocities) these can be off by about 0.6% of
+        rated power. Defaults to None (solve the whole farm).
+    step_budget [optional]: wall-clock time (s) allowed for each step. When a
+        FLORIS solve is expected to take longer than the time left in the step,
+        the standin falls back to the power table (ignoring yaw angles and power
+        setpoints) if there is one, or else reuses the previous FLORIS solution.
+        Defaults to None (always solve).
+    model_cache_dir [optional]: directory caching the FLORIS model constructed
+        from amr_input_file, so that later standins with the same input file
+        load it instead of building it (see construct_floris_from_amr_input).
+        Defaults to None (cache in memory only).
+    parallel [optional]: if given, a dictionary of options for solving the
+        batches of power_table and lookahead in parallel with FLORIS's
+        ParFlorisModel (see FlorisBatchSolver), with optional keys "interface",
+        "max_workers", "n_wind_condition_splits" and "min_batch_size". The
+        smallest batch solved in parallel defaults to 100 steps for power_table
+        and to the lookahead resolve_steps (if smaller) for lookahead, so that
+        its re-solves after a change of operation run in parallel too. Steps
+        solved one at a time are not affected. Defaults to None (solve in this
+        process).
     """
     def __init__(
             self,
             config_dict,
             amr_input_file,
             amr_standin_data_file=None,
-            smoothing_coefficient=0.5
+            smoothing_coefficient=0.5,
+            message_codec="auto",
+            power_table=None,
+            solve_cache=None,
+            lookahead=None,
+            incremental=None,
+            step_budget=None,
+            model_cache_dir=None,
+            parallel=None,
         ):
         """
         Constructor for the FlorisStandin class
@@ -146,16 +259,29 @@ class FlorisStandin(AMRWindStandin):
             config_dict=config_dict,
             amr_wind_input=amr_input_file,
             amr_standin_data_file=amr_standin_data_file,
+            message_codec=message_codec,
         )
 
         # Construct the floris object
-        self.fmodel = construct_floris_from_amr_input(amr_input_file)
+        self.fmodel = construct_floris_from_amr_input(amr_input_file, cache_dir=model_cache_dir)
+
+        # Parse any heterogeneous inflow in the standin data
+        if (
+            hasattr(self, "standin_data")
+            and "heterogeneous_inflow_config" in self.standin_data.columns
+        ):
+            self.heterogeneous_inflow = HeterogeneousInflowSeries(
+                self.standin_data["time"], self.standin_data["heterogeneous_inflow_config"]
+            )
+        else:
+            self.heterogeneous_inflow = None
 
         # Get the number of turbines
         self.num_turbines = len(self.fmodel.layout_x)
 
         # Print the number of turbines
-        logger.info("Number of turbines: {}".format(self.num_turbines))
+        if self.verbose:
+            logger.info("Number of turbines: {}".format(self.num_turbines))
 
         # Initialize storage
         self.yaw_angles_stored = [0.0] * self.num_turbines
@@ -166,6 +292,83 @@ class FlorisStandin(AMRWindStandin):
             raise ValueError("Smoothing coefficient must be in [0, 1).")
         self.smoothing_coefficient = smoothing_coefficient
 
+        # Precompute the power table
+        if power_table is not None:
+            logger.info("Computing FLORIS power table")
+            self.power_table = FlorisPowerTable(
+                self.fmodel,
+                wind_speeds=power_table.get("wind_speeds"),
+                wind_directions=power_table.get("wind_directions"),
+                cache_file=power_table.get("cache_file"),
+                parallel=parallel,
+            )
+        else:
+            self.power_table = None
+
+        # Set up the solve cache
+        if solve_cache is not None:
+            solve_cache = dict(solve_cache)
+            self.solve_cache_log_interval = solve_cache.pop("log_interval", 1000)
+            self.solve_cache = FlorisSolveCache(**solve_cache)
+        else:
+            self.solve_cache = None
+
+        # Set up solving the standin data ahead of time
+        if lookahead is not None:
+            if not hasattr(self, "standin_data"):
+                raise ValueError("lookahead requires an amr_standin_data_file.")
+            if self.heterogeneous_inflow is not None:
+                raise ValueError("lookahead does not support heterogeneous inflow.")
+            n_steps = int(np.floor(config_dict["stoptime"] / self.dt + 1e-9)) + 1
+            times = np.arange(n_steps) * self.dt
+            self.lookahead = FlorisLookahead(
+                self.fmodel,
+                times,
+                np.interp(times, self.standin_data["time"], self.standin_data["amr_wind_speed"]),
+                np.interp(
+                    times, self.standin_data["time"], self.standin_data["amr_wind_direction"]
+                ),
+                parallel=parallel,
+                **lookahead,
+            )
+        else:
+            self.lookahead = None
+
+        # Set up incremental solves
+        if incremental is not None:
+            self.incremental = FlorisIncrementalSolver(self.fmodel, **incremental)
+        else:
+            self.incremental = None
+
+        # Set up the fallbacks for steps about to overrun their wall-clock budget
+        if step_budget is not None:
+            self.step_budget = StepBudget(step_budget)
+        else:
+            self.step_budget = None
+        self.turbine_powers_floris_prev = None
+        self.n_degraded_steps = 0
+
+    def make_standin_series(self):
+        """Cursor interpolating the wind speed and wind direction of the standin data"""
+        return standin_data_cursor(self.standin_data, ["amr_wind_speed", "amr_wind_direction"])
+
+    def get_state(self):
+        """State of the standin needed to restart from a checkpoint, including the
+        smoothed turbine powers and the yaw angles and power setpoints FLORIS holds"""
+        state = super().get_state()
+        state["turbine_powers_prev"] = np.array(self.turbine_powers_prev)
+        state["yaw_angles"] = np.array(self.fmodel.core.farm.yaw_angles)
+        state["power_setpoints"] = np.array(self.fmodel.core.farm.power_setpoints)
+        return state
+
+    def set_state(self, state):
+        """Restore the state returned by get_state"""
+        super().set_state(state)
+        self.turbine_powers_prev = np.array(state["turbine_powers_prev"])
+        self.fmodel.set(
+            yaw_angles=state["yaw_angles"], power_setpoints=state["power_setpoints"]
+        )
+
     def get_step(self, sim_time_s, yaw_angles=None, power_setpoints=None):
         """Retreive or calculate wind speed, direction, and turbine powers
 
@@ -179,38 +382,14 @@ class FlorisStandin(AMRWindStandin):
         amr_wind_direction: wind direction at current time step [deg]
         turbine_powers: turbine powers at current time step [kW]
         """
+        if self.step_budget is not None:
+            self.step_budget.start()
 
         if hasattr(self, "standin_data"):
-            amr_wind_speed = np.interp(
-                sim_time_s,
-                self.standin_data["time"],
-                self.standin_data["amr_wind_speed"],
-            )
-            amr_wind_direction = np.interp(
-                sim_time_s,
-                self.standin_data["time"],
-                self.standin_data["amr_wind_direction"],
-            )
+            amr_wind_speed, amr_wind_direction = self.standin_series.interpolate(sim_time_s)
 
-            if "heterogeneous_inflow_config" in self.standin_data.columns:
-                if sim_time_s < self.standin_data["time"].iloc[-1]:
-                    next_idx = (
-                        self.standin_data["time"][self.standin_data["time"] > sim_time_s].idxmin()
-                    )
-                else:
-                    next_idx = len(self.standin_data) - 1
-                prev_idx = next_idx - 1
-
-                prev_dict = eval(self.standin_data["heterogeneous_inflow_config"].iloc[prev_idx])
-                next_dict = eval(self.standin_data["heterogeneous_inflow_config"].iloc[next_idx])
-                
-                heterogeneous_inflow_config = self.interpolate_heterogeneous_inflow_config(
-                    prev_dict,
-                    next_dict,
-                    self.standin_data["time"].iloc[prev_idx],
-                    self.standin_data["time"].iloc[next_idx],
-                    sim_time_s
-                )
+            if self.heterogeneous_inflow is not None:
+                heterogeneous_inflow_config = self.heterogeneous_inflow.get_config(sim_time_s)
             else: # No heterogeneous data supplied
                 heterogeneous_inflow_config = None
 
@@ -269,16 +448,87 @@ class FlorisStandin(AMRWindStandin):
             # Note conversion from Watts (used in Floris) and back to kW (used in Hercules)
             power_setpoints = power_setpoints * 1000 # in W
 
-        # Set up and solve FLORIS
-        self.fmodel.set(
-            wind_speeds=[amr_wind_speed],
-            wind_directions=[amr_wind_direction],
-            heterogeneous_inflow_config=heterogeneous_inflow_config,
-            yaw_angles=yaw_misalignments,
-            power_setpoints=power_setpoints
-        )
-        self.fmodel.run()
-        turbine_powers_floris = (self.fmodel.get_turbine_powers() / 1000).flatten()  # in kW
+        # Look up the turbine powers solved ahead, in the power table or in the solve
+        # cache if possible
+        turbine_powers_floris = None
+        if self.lookahead is not None:
+            turbine_powers_floris = self.lookahead.get_turbine_powers(
+                sim_time_s, *self.effective_operation(yaw_misalignments, power_setpoints)
+            )
+            if turbine_powers_floris is not None:
+                self.remember_operation(yaw_misalignments, power_setpoints)
+        if (
+            turbine_powers_floris is None
+            and self.power_table is not None
+            and heterogeneous_inflow_config is None
+        ):
+            turbine_powers_floris = self.get_table_powers(
+                amr_wind_speed, amr_wind_direction, yaw_misalignments, power_setpoints
+            )
+        if turbine_powers_floris is None and self.solve_cache is not None:
+            cache_key = self.solve_cache.make_key(
+                amr_wind_speed,
+                amr_wind_direction,
+                *self.effective_operation(yaw_misalignments, power_setpoints),
+                heterogeneous_inflow_config,
+            )
+            turbine_powers_floris = self.solve_cache.get(cache_key)
+            if turbine_powers_floris is not None:
+                self.remember_operation(yaw_misalignments, power_setpoints)
+            n_lookups = self.solve_cache.hits + self.solve_cache.misses
+            if self.solve_cache_log_interval and n_lookups % self.solve_cache_log_interval == 0:
+                logger.info(self.solve_cache.format_summary())
+
+        # If there is not enough time left in the step to solve FLORIS, fall back to
+        # a lower fidelity result
+        if (
+            turbine_powers_floris is None
+            and self.step_budget is not None
+            and not self.step_budget.can_afford("solve")
+        ):
+            turbine_powers_floris = self.get_fallback_powers(
+                amr_wind_speed, amr_wind_direction, heterogeneous_inflow_config
+            )
+            if turbine_powers_floris is not None:
+                self.remember_operation(yaw_misalignments, power_setpoints)
+                self.n_degraded_steps += 1
+                logger.warning(
+                    "Step at time {} used a fallback for the FLORIS solve ({} so far)".format(
+                        sim_time_s, self.n_degraded_steps
+                    )
+                )
+
+        # Otherwise solve FLORIS, incrementally if possible
+        solve_start = time.perf_counter()
+        solved = turbine_powers_floris is None
+        if (
+            turbine_powers_floris is None
+            and self.incremental is not None
+            and heterogeneous_inflow_config is None
+        ):
+            turbine_powers_floris = self.incremental.solve(
+                amr_wind_speed,
+                amr_wind_direction,
+                *self.effective_operation(yaw_misalignments, power_setpoints),
+            )
+            self.remember_operation(yaw_misalignments, power_setpoints)
+            if self.solve_cache is not None:
+                self.solve_cache.put(cache_key, turbine_powers_floris)
+        if turbine_powers_floris is None:
+            self.fmodel.set(
+                wind_speeds=[amr_wind_speed],
+                wind_directions=[amr_wind_direction],
+                heterogeneous_inflow_config=heterogeneous_inflow_config,
+                yaw_angles=yaw_misalignments,
+                power_setpoints=power_setpoints
+            )
+            self.fmodel.run()
+            turbine_powers_floris = (self.fmodel.get_turbine_powers() / 1000).flatten()  # in kW
+            if self.solve_cache is not None:
+                self.solve_cache.put(cache_key, turbine_powers_floris)
+        if solved and self.step_budget is not None:
+            self.step_budget.record("solve", time.perf_counter() - solve_start)
+        self.turbine_powers_floris_prev = turbine_powers_floris
 
         # Smooth output
         turbine_powers = (
@@ -295,6 +545,63 @@ class FlorisStandin(AMRWindStandin):
             turbine_wind_directions,
         )
 
+    def effective_operation(self, yaw_misalignments, power_setpoints):
+        """
+        The yaw misalignments and power setpoints (W) FLORIS solves with for the
+        given inputs, where None means FLORIS keeps its previous values
+        """
+        farm = self.fmodel.core.farm
+        if yaw_misalignments is None:
+            yaw_misalignments = farm.yaw_angles
+        if power_setpoints is None:
+            power_setpoints = farm.power_setpoints
+        return yaw_misalignments, power_setpoints
+
+    def remember_operation(self, yaw_misalignments, power_setpoints):
+        """
+        Store new yaw misalignments and power setpoints (W) in FLORIS without
+        solving, as a solve would, so that later steps passing None keep them
+        """
+        farm = self.fmodel.core.farm
+        if (
+            yaw_misalignments is not None
+            and not np.array_equal(np.asarray(yaw_misalignments, dtype=float), farm.yaw_angles)
+        ) or (
+            power_setpoints is not None
+            and not np.array_equal(np.asarray(power_setpoints, dtype=float), farm.power_setpoints)
+        ):
+            self.fmodel.set(yaw_angles=yaw_misalignments, power_setpoints=power_setpoints)
+
+    def get_fallback_powers(self, wind_speed, wind_direction, heterogeneous_inflow_config):
+        """
+        Turbine powers (kW) standing in for a FLORIS solve when there is no time
+        for one: from the power table for the wind condition, regardless of the
+        turbines' operation, or else the previous FLORIS solution. None if neither
+        is available.
+        """
+        if self.power_table is not None and heterogeneous_inflow_config is None:
+            turbine_powers = self.power_table.get_turbine_powers(wind_speed, wind_direction)
+            if turbine_powers is not None:
+                return turbine_powers
+        return self.turbine_powers_floris_prev
+
+    def get_table_powers(self, wind_speed, wind_direction, yaw_misalignments, power_setpoints):
+        """
+        Turbine powers (kW) from the power table, or None if the turbines do not
+        operate at their defaults or the wind condition is outside the table.
+        yaw_misalignments and power_setpoints (W) are as passed to FLORIS, with
+        None meaning FLORIS keeps its previous values.
+        """
+        if not operation_is_default(*self.effective_operation(yaw_misalignments, power_setpoints)):
+            return None
+
+        turbine_powers = self.power_table.get_turbine_powers(wind_speed, wind_direction)
+        if turbine_powers is None:
+            return None
+
+        self.remember_operation(yaw_misalignments, power_setpoints)
+        return turbine_powers
+
     def process_endpoint_event(self, msg):
         pass
 
@@ -308,49 +615,24 @@ class FlorisStandin(AMRWindStandin):
     def process_subscription_messages(self, msg):
         pass
 
-    @staticmethod
-    def interpolate_heterogeneous_inflow_config(dict_0, dict_1, time_0, time_1, time):
-        # Check for valid keys; if not there, raise warning and return None
-        default_dist = 1.0e6
-        default_heterogeneous_inflow_config = {
-            "x": np.array([-default_dist, -default_dist, default_dist, default_dist]),
-            "y": np.array([-default_dist, default_dist, -default_dist, default_dist]),
-            "speed_multipliers": np.array([[1.0, 1.0, 1.0, 1.0]]),
-        }
-        for k in ["x", "y", "speed_multipliers"]:
-            if (k not in dict_0.keys()) or (k not in dict_1.keys()):
-                warnings.warn((
-                    f"Needed key '{k}' missing from heterogeneous_inflow_config."+
-                    " Proceeding with homogeneous inflow."
-                ))
-                return default_heterogeneous_inflow_config
-        
-        # Check that x and y are the same between time stamps
-        # (changing x, y not currently supported)
-        if (dict_0["x"] != dict_1["x"]) or (dict_0["y"] != dict_1["y"]):
-            warnings.warn((
-                "Changing x, y between time stamps not currently supported."+
-                " Proceeding with homogeneous inflow."
-            ))
-            return default_heterogeneous_inflow_config
-        
-        # Interpolate speed multipliers
-        sm_interpolator = interp1d(
-            [time_0, time_1],
-            [dict_0["speed_multipliers"][0], dict_1["speed_multipliers"][0]],
-            axis=0,
-        )
-        speed_multipliers = sm_interpolator(time)
-
-        # Create return dictionary
-        return {
-            "x": np.array(dict_0["x"]),
-            "y": np.array(dict_0["y"]),
-            "speed_multipliers": np.array([speed_multipliers])
-        }
 
-
-def launch_floris(amr_input_file, amr_standin_data_file=None, helics_port=None):
+def launch_floris(
+    amr_input_file,
+    amr_standin_data_file=None,
+    helics_port=None,
+    message_codec="auto",
+    checkpoint_interval=None,
+    restart_file=None,
+    power_table=None,
+    solve_cache=None,
+    lookahead=None,
+    incremental=None,
+    step_budget=None,
+    model_cache_dir=None,
+    parallel=None,
+    farm_name=None,
+    verbose=True,
+):
     temp = read_amr_wind_input(amr_input_file)
 
     # Check amr_standin_data_file is not a number
@@ -365,13 +647,17 @@ def launch_floris(amr_input_file, amr_standin_data_file=None, helics_port=None):
             raise ValueError("helics_port must be an integer.")
         temp["helics_port"] = helics_port
 
+    # With several wind farms, each farm's standin has its own name and topics
+    control_topic, status_topic = farm_topics(farm_name)
+    name = "floris_standin" if farm_name is None else "floris_standin_{}".format(farm_name)
+
     config = {
-        "name": "floris_standin",
+        "name": name,
         "gridpack": {},
         "helics": {
             "deltat": temp["dt"],
-            "subscription_topics": ["control"],
-            "publication_topics": ["status"],
+            "subscription_topics": [control_topic],
+            "publication_topics": [status_topic],
             "endpoints": [],
             "helicsport": temp["helics_port"],
         },
@@ -379,10 +665,25 @@ def launch_floris(amr_input_file, amr_standin_data_file=None, helics_port=None):
         "endpoint_interval": 1,
         "starttime": 0,
         "stoptime": temp["stop_time"],
-        "Agent": "floris_standin",
+        "Agent": name,
+        "checkpoint_interval": checkpoint_interval,
+        "restart_file": restart_file,
+        "verbose": verbose,
     }
 
-    obj = FlorisStandin(config, amr_input_file, amr_standin_data_file)
+    obj = FlorisStandin(
+        config,
+        amr_input_file,
+        amr_standin_data_file,
+        message_codec=message_codec,
+        power_table=power_table,
+        solve_cache=solve_cache,
+        lookahead=lookahead,
+        incremental=incremental,
+        step_budget=step_budget,
+        model_cache_dir=model_cache_dir,
+        parallel=parallel,
+    )
 
     obj.run_helics_setup()
     obj.enter_execution(function_targets=[], function_arguments=[[]])
@@ -0,0 +1,118 @@
+# Heterogeneous inflow time series for the FLORIS standin
+#
+# The standin data file may hold a heterogeneous_inflow_config column, with a
+# FLORIS heterogeneous inflow configuration (x, y and speed_multipliers) written
+# as a Python literal for each time. The column is parsed once, into a fixed set
+# of x, y points and a (time x points) matrix of speed multipliers, so that the
+# configuration at any time is a linear blend of two rows.
+
+import ast
+import warnings
+
+import numpy as np
+
+HETEROGENEOUS_INFLOW_KEYS = ["x", "y", "speed_multipliers"]
+
+
+def default_heterogeneous_inflow_config():
+    """Heterogeneous inflow configuration equivalent to homogeneous inflow"""
+    default_dist = 1.0e6
+    return {
+        "x": np.array([-default_dist, -default_dist, default_dist, default_dist]),
+        "y": np.array([-default_dist, default_dist, -default_dist, default_dist]),
+        "speed_multipliers": np.array([[1.0, 1.0, 1.0, 1.0]]),
+    }
+
+
+def parse_heterogeneous_inflow_config(text):
+    """
+    Parse a heterogeneous inflow configuration written as a Python literal.
+    Only literals (dictionaries, lists and numbers) are accepted, so the data
+    file cannot run code.
+    """
+    config = ast.literal_eval(text)
+    if not isinstance(config, dict):
+        raise ValueError(
+            "heterogeneous_inflow_config must be a dictionary, received {}.".format(text)
+        )
+    return config
+
+
+class HeterogeneousInflowSeries:
+    """
+    Heterogeneous inflow configurations over time, interpolated linearly in time.
+
+    The x, y points must be the same at all times, and every configuration must
+    have the keys x, y and speed_multipliers (other keys are ignored). Otherwise
+    a warning is raised and the series holds homogeneous inflow. Outside the
+    range of times, the first or last configuration is used.
+
+    Inputs:
+    - times: times of the configurations (s), increasing
+    - configs: heterogeneous inflow configurations, as dictionaries or as
+        strings to parse with parse_heterogeneous_inflow_config
+    """
+
+    def __init__(self, times, configs):
+        configs = [
+            parse_heterogeneous_inflow_config(c) if isinstance(c, str) else c for c in configs
+        ]
+        self.times = np.asarray(times, dtype=float)
+        if len(self.times) != len(configs) or len(configs) == 0:
+            raise ValueError("times and configs must have the same, nonzero, length.")
+
+        config = self._check(configs)
+        self.x = np.array(config["x"], dtype=float)
+        self.y = np.array(config["y"], dtype=float)
+        if config is configs[0]:
+            self.speed_multipliers = np.array(
+                [np.asarray(c["speed_multipliers"], dtype=float)[0] for c in configs]
+            )
+        else:
+            self.speed_multipliers = np.repeat(config["speed_multipliers"], len(configs), axis=0)
+
+    @staticmethod
+    def _check(configs):
+        # The configuration giving x and y, or the homogeneous default if the
+        # configurations are not usable
+        for k in HETEROGENEOUS_INFLOW_KEYS:
+            if any(k not in c for c in configs):
+                warnings.warn(
+                    (
+                        f"Needed key '{k}' missing from heterogeneous_inflow_config."
+                        + " Proceeding with homogeneous inflow."
+                    )
+                )
+                return default_heterogeneous_inflow_config()
+
+        # Changing x, y not currently supported
+        x, y = configs[0]["x"], configs[0]["y"]
+        if any(not (np.array_equal(c["x"], x) and np.array_equal(c["y"], y)) for c in configs):
+            warnings.warn(
+                (
+                    "Changing x, y between time stamps not currently supported."
+                    + " Proceeding with homogeneous inflow."
+                )
+            )
+            return default_heterogeneous_inflow_config()
+
+        return configs[0]
+
+    def get_config(self, time):
+        """The heterogeneous inflow configuration at time"""
+        times = self.times
+        if len(times) == 1 or time <= times[0]:
+            speed_multipliers = self.speed_multipliers[0]
+        elif time >= times[-1]:
+            speed_multipliers = self.speed_multipliers[-1]
+        else:
+            i = np.searchsorted(times, time, side="right") - 1
+            w = (time - times[i]) / (times[i + 1] - times[i])
+            speed_multipliers = self.speed_multipliers[i] + w * (
+                self.speed_multipliers[i + 1] - self.speed_multipliers[i]
+            )
+        return {
+            "x": self.x,
+            "y": self.y,
+            "speed_multipliers": speed_multipliers[None, :].copy(),
+        }
@@ -0,0 +1,439 @@
+# In-process coupling between the emulator and an AMR-Wind standin
+#
+# With HELICS coupling, the emulator and the standin run as separate processes
+# connected through a broker, exchanging control and status messages once per
+# time step. For standins, whose get_step is plain Python, the emulator can
+# instead own the standin and call it directly. LocalStandinCoupling keeps the
+# message semantics of the HELICS exchange (the control message carries yaw
+# angles and power setpoints, the status message carries the wind and turbine
+# outputs) without the broker, the second process or the message encoding.
+#
+# With several wind farms, each farm exchanges its own control and status
+# messages (on its own HELICS topics with HELICS coupling). Locally coupled
+# standins can be stepped in this process one after the other
+# (LocalStandinGroup), or in parallel in a pool of worker processes
+# (StandinPool).
+#
+# StatusReplay has the same interface but replaces the standins: it returns the
+# status messages of a recording (see hercules.status_recording) at each step.
+
+import multiprocessing
+import traceback
+
+from hercules.status_recording import StatusRecording
+
+COUPLINGS = ["helics", "local"]
+LOCAL_STANDINS = ["floris", "amr_wind"]
+
+# Options of a farm's entry passed on to a locally coupled FlorisStandin; options
+# not given take the standin's defaults
+FLORIS_STANDIN_OPTIONS = [
+    "smoothing_coefficient",
+    "power_table",
+    "solve_cache",
+    "lookahead",
+    "incremental",
+    "step_budget",
+    "model_cache_dir",
+    "parallel",
+]
+
+
+def check_coupling(coupling):
+    if coupling not in COUPLINGS:
+        raise ValueError("coupling must be one of {0}, received '{1}'.".format(COUPLINGS, coupling))
+    return coupling
+
+
+def farm_topics(farm_name=None):
+    """
+    HELICS topics (control_topic, status_topic) of a wind farm. With a single
+    farm (farm_name None) these are "control" and "status"; with several farms,
+    each farm's topics carry its name, e.g. "control_wind_farm_1".
+    """
+    if farm_name is None:
+        return "control", "status"
+    return "control_{}".format(farm_name), "status_{}".format(farm_name)
+
+
+def make_local_standin(amr_wind_farm_dict, dt, stoptime, verbose=True):
+    """
+    Construct the standin for a wind farm coupled in-process.
+
+    Inputs:
+    - amr_wind_farm_dict: the farm's entry in hercules_comms["amr_wind"]. Uses
+        "amr_wind_input_file" and optionally "standin" (one of LOCAL_STANDINS,
+        defaults to "floris"), "amr_standin_data_file" and, for the FLORIS
+        standin, the FLORIS_STANDIN_OPTIONS.
+    - dt: emulator time step (s)
+    - stoptime: emulator stop time (s)
+    - verbose: whether the standin prints its progress
+    """
+    standin = amr_wind_farm_dict.get("standin", "floris")
+    if standin not in LOCAL_STANDINS:
+        raise ValueError(
+            "standin must be one of {0}, received '{1}'.".format(LOCAL_STANDINS, standin)
+        )
+
+    amr_standin_data_file = amr_wind_farm_dict.get("amr_standin_data_file")
+
+    # The standin is never connected to a broker, so no port is needed
+    config = {
+        "name": "{}_standin".format(standin),
+        "gridpack": {},
+        "helics": {
+            "deltat": dt,
+            "subscription_topics": ["control"],
+            "publication_topics": ["status"],
+            "endpoints": [],
+            "helicsport": None,
+        },
+        "publication_interval": 1,
+        "endpoint_interval": 1,
+        "starttime": 0,
+        "stoptime": stoptime,
+        "Agent": "{}_standin".format(standin),
+        "verbose": verbose,
+    }
+
+    # Imported here so that FLORIS is only loaded when it is needed
+    if standin == "floris":
+        from hercules.floris_standin import FlorisStandin
+
+        options = {
+            key: amr_wind_farm_dict[key]
+            for key in FLORIS_STANDIN_OPTIONS
+            if key in amr_wind_farm_dict
+        }
+        return FlorisStandin(
+            config,
+            amr_wind_farm_dict["amr_wind_input_file"],
+            amr_standin_data_file,
+            **options,
+        )
+    else:
+        from hercules.amr_wind_standin import AMRWindStandin
+
+        return AMRWindStandin(
+            config, amr_wind_farm_dict["amr_wind_input_file"], amr_standin_data_file
+        )
+
+
+class LocalStandinCoupling:
+    """
+    Exchanges control and status messages with a standin in the same process.
+
+    Each step the emulator publishes a control message, advances time and reads
+    the status message, as it would over HELICS. Here, advancing time runs the
+    standin's get_step with the yaw angles and power setpoints of the latest
+    control message.
+
+    Inputs:
+    - standin: an AMRWindStandin (or FlorisStandin), or any object with the same
+        parse_control_message, get_step and build_status_message methods
+    """
+
+    def __init__(self, standin):
+        self.standin = standin
+        self.control_message = None
+        self.status_message = None
+
+    def publish_control(self, message):
+        """Hold the control message ([time, wind_speed, wind_direction] + yaw_angles
+        + power_setpoints) for the next step of the standin"""
+        self.control_message = list(message)
+
+    def step(self, sim_time_s):
+        """Run the standin at sim_time_s and hold its status message"""
+        yaw_angles, power_setpoints = self.standin.parse_control_message(self.control_message)
+        (
+            amr_wind_speed,
+            amr_wind_direction,
+            turbine_powers,
+            turbine_wind_directions,
+        ) = self.standin.get_step(sim_time_s, yaw_angles, power_setpoints)
+        self.status_message = self.standin.build_status_message(
+            sim_time_s,
+            amr_wind_speed,
+            amr_wind_direction,
+            turbine_powers,
+            turbine_wind_directions,
+        )
+
+    def get_status(self):
+        """The status message from the latest step, or None before the first step"""
+        return self.status_message
+
+    def get_state(self):
+        """State of the standin and the latest messages, for checkpoints"""
+        return {
+            "standin": self.standin.get_state(),
+            "control_message": self.control_message,
+            "status_message": self.status_message,
+        }
+
+    def set_state(self, state):
+        """Restore the state returned by get_state"""
+        self.standin.set_state(state["standin"])
+        self.control_message = state["control_message"]
+        self.status_message = state["status_message"]
+
+
+class LocalStandinGroup:
+    """
+    The locally coupled standins of several wind farms, stepped one after the
+    other in this process.
+
+    Inputs:
+    - couplings: dictionary of LocalStandinCoupling, by farm name
+    """
+
+    def __init__(self, couplings):
+        self.couplings = dict(couplings)
+        self.farm_names = list(self.couplings)
+
+    def publish_control(self, farm_name, message):
+        """Hold the control message for the next step of a farm's standin"""
+        self.couplings[farm_name].publish_control(message)
+
+    def step(self, sim_time_s):
+        """Run all standins at sim_time_s"""
+        for coupling in self.couplings.values():
+            coupling.step(sim_time_s)
+
+    def get_status(self, farm_name):
+        """The status message of a farm from the latest step"""
+        return self.couplings[farm_name].get_status()
+
+    def get_state(self):
+        """States of all standins, by farm name"""
+        return {name: coupling.get_state() for name, coupling in self.couplings.items()}
+
+    def set_state(self, state):
+        """Restore the states returned by get_state"""
+        for name, coupling in self.couplings.items():
+            coupling.set_state(state[name])
+
+    def close(self):
+        pass
+
+
+def _standin_worker(connection, farm_dicts, dt, stoptime, make_standin):
+    # Worker process of a StandinPool: construct the standins of its farms, then
+    # carry out the commands received from the pool until told to close
+    try:
+        group = LocalStandinGroup(
+            {
+                name: LocalStandinCoupling(make_standin(farm_dict, dt, stoptime))
+                for name, farm_dict in farm_dicts.items()
+            }
+        )
+        connection.send(("ok", None))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+        return
+
+    while True:
+        command, args = connection.recv()
+        try:
+            if command == "step":
+                sim_time_s, control_messages = args
+                for name, message in control_messages.items():
+                    if message is not None:
+                        group.publish_control(name, message)
+                group.step(sim_time_s)
+                result = {name: group.get_status(name) for name in group.farm_names}
+            elif command == "get_state":
+                result = group.get_state()
+            elif command == "set_state":
+                group.set_state(args)
+                result = None
+            elif command == "close":
+                connection.send(("ok", None))
+                return
+            else:
+                raise ValueError("Unknown command '{}'.".format(command))
+            connection.send(("ok", result))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+
+
+class StandinPool:
+    """
+    The locally coupled standins of several wind farms, stepped in parallel in a
+    pool of worker processes. Each worker constructs and owns the standins of
+    its share of the farms; each step, the control messages are sent to all
+    workers before waiting for their status messages.
+
+    The workers are started with the default multiprocessing start method. Where
+    that is "spawn" (macOS, Windows), the run script must guard its top level
+    code with if __name__ == "__main__".
+
+    Inputs:
+    - farm_dicts: dictionary of the farms' entries in hercules_comms["amr_wind"],
+        by farm name (see make_local_standin)
+    - dt: emulator time step (s)
+    - stoptime: emulator stop time (s)
+    - n_workers: number of worker processes. Defaults to one per farm.
+    - make_standin: function constructing a standin from a farm's entry, dt and
+        stoptime. Defaults to make_local_standin.
+    """
+
+    def __init__(self, farm_dicts, dt, stoptime, n_workers=None, make_standin=None):
+        if make_standin is None:
+            make_standin = make_local_standin
+        self.farm_names = list(farm_dicts)
+        if n_workers is None:
+            n_workers = len(self.farm_names)
+        n_workers = max(1, min(int(n_workers), len(self.farm_names)))
+
+        # Farms are dealt to the workers in turn
+        self._worker_farms = [self.farm_names[i::n_workers] for i in range(n_workers)]
+        self._connections = []
+        self._processes = []
+        for farm_names in self._worker_farms:
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_standin_worker,
+                args=(
+                    worker_connection,
+                    {name: farm_dicts[name] for name in farm_names},
+                    dt,
+                    stoptime,
+                    make_standin,
+                ),
+                daemon=True,
+            )
+            process.start()
+            # Only the worker holds its end, so the pool sees EOF if the worker exits
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._gather()
+
+        self.control_messages = {name: None for name in self.farm_names}
+        self.status_messages = {name: None for name in self.farm_names}
+
+    def _gather(self):
+        # Wait for the reply of every worker, raising any worker error
+        results = []
+        errors = []
+        for connection in self._connections:
+            try:
+                status, result = connection.recv()
+            except EOFError:
+                status, result = "error", "Standin worker exited unexpectedly."
+            if status == "error":
+                errors.append(result)
+            results.append(result)
+        if errors:
+            self.close()
+            raise RuntimeError("Standin worker failed:\n" + "\n".join(errors))
+        return results
+
+    def publish_control(self, farm_name, message):
+        """Hold the control message for the next step of a farm's standin"""
+        self.control_messages[farm_name] = list(message)
+
+    def step(self, sim_time_s):
+        """Run all standins at sim_time_s, in parallel"""
+        for connection, farm_names in zip(self._connections, self._worker_farms):
+            connection.send(
+                ("step", (sim_time_s, {n: self.control_messages[n] for n in farm_names}))
+            )
+        for status_messages in self._gather():
+            self.status_messages.update(status_messages)
+
+    def get_status(self, farm_name):
+        """The status message of a farm from the latest step"""
+        return self.status_messages[farm_name]
+
+    def get_state(self):
+        """States of all standins, by farm name"""
+        for connection in self._connections:
+            connection.send(("get_state", None))
+        state = {}
+        for worker_state in self._gather():
+            state.update(worker_state)
+        return state
+
+    def set_state(self, state):
+        """Restore the states returned by get_state"""
+        for connection, farm_names in zip(self._connections, self._worker_farms):
+            connection.send(("set_state", {n: state[n] for n in farm_names}))
+        self._gather()
+        for name in self.farm_names:
+            self.control_messages[name] = state[name]["control_message"]
+            self.status_messages[name] = state[name]["status_message"]
+
+    def close(self):
+        """Stop the worker processes"""
+        for connection, process in zip(self._connections, self._processes):
+            if process.is_alive():
+                try:
+                    connection.send(("close", None))
+                    connection.recv()
+                except (BrokenPipeError, EOFError, OSError):
+                    pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._connections = []
+        self._processes = []
+
+
+class StatusReplay:
+    """
+    Replays the recorded status messages of the wind farms in place of their
+    standins. After each step, the status messages are those recorded at the
+    same emulator time; the control messages are accepted and ignored.
+
+    Inputs:
+    - recording: a StatusRecording, or the path of a recording file
+    - farms: dictionary of the number of turbines of each farm, by farm name,
+        checked against the recording
+    """
+
+    def __init__(self, recording, farms):
+        if not isinstance(recording, StatusRecording):
+            recording = StatusRecording(recording)
+        self.recording = recording
+        self.farm_names = list(farms)
+        for name, num_turbines in farms.items():
+            if recording.farms.get(name) != num_turbines:
+                raise ValueError(
+                    "Wind farm {} with {} turbines is not in the status recording {} "
+                    "(farms {}).".format(name, num_turbines, recording.path, recording.farms)
+                )
+        self.sim_time_s = None
+
+    def publish_control(self, farm_name, message):
+        pass
+
+    def step(self, sim_time_s):
+        """Move to sim_time_s"""
+        self.sim_time_s = sim_time_s
+
+    def get_status(self, farm_name):
+        """The status message of a farm recorded at the time of the latest step,
+        None before the first step. The emulator only reads the status at the
+        times it received status messages in the recorded run."""
+        if self.sim_time_s is None:
+            return None
+        index = self.recording.find(self.sim_time_s)
+        if index is None:
+            raise ValueError(
+                "The status recording {} has no record at time {}.".format(
+                    self.recording.path, self.sim_time_s
+                )
+            )
+        return self.recording.status_message(index, farm_name)
+
+    def get_state(self):
+        return {"sim_time_s": self.sim_time_s}
+
+    def set_state(self, state):
+        self.sim_time_s = state["sim_time_s"]
+
+    def close(self):
+        pass
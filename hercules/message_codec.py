@@ -0,0 +1,106 @@
+# Message codec for the exchange between the emulator and AMR-Wind (or a standin)
+#
+# Messages are flat lists of numbers, e.g. the status message
+# [time, wind_speed, wind_direction] + turbine_powers + turbine_wind_directions.
+# The text codec sends str(list) and parses it back with ast.literal_eval, which
+# is what AMR-Wind understands. The binary codec packs the values as float64
+# behind a small header and base64 encodes them so they can travel over the
+# HELICS string publications; it avoids printing and re-parsing every float.
+#
+# Binary layout (little endian), before base64 encoding:
+#   magic b"HRCB" | version u8 | n_turbines u32 | n_fields u16 |
+#   field lengths u32 x n_fields | values float64 x sum(field lengths)
+#
+# Receivers detect the codec from the message itself, so text messages are
+# always accepted. None values (e.g. unset power setpoints) are sent as NaN
+# and decoded back to None.
+
+import ast
+import base64
+import struct
+
+import numpy as np
+
+TEXT = "text"
+BINARY = "binary"
+MESSAGE_CODECS = [TEXT, BINARY]
+
+BINARY_VERSION = 1
+BINARY_PREFIX = "HRCB:"
+_MAGIC = b"HRCB"
+_HEADER = struct.Struct("<4sBIH")
+
+
+def check_codec(codec):
+    if codec not in MESSAGE_CODECS:
+        raise ValueError(
+            "message_codec must be one of {0}, received '{1}'.".format(MESSAGE_CODECS, codec)
+        )
+    return codec
+
+
+def is_binary_message(message):
+    """True if message was encoded with the binary codec"""
+    return isinstance(message, str) and message.startswith(BINARY_PREFIX)
+
+
+def encode_message(values, codec=TEXT, field_lengths=None, n_turbines=0):
+    """
+    Encode a flat list of values as a message string.
+
+    Inputs:
+    - values: list or array of numbers (None allowed)
+    - codec: TEXT or BINARY
+    - field_lengths: lengths of the fields making up values, recorded in the binary
+        header. Defaults to a single field holding all values.
+    - n_turbines: number of turbines, recorded in the binary header
+    """
+    if codec == TEXT:
+        return str(list(values))
+    check_codec(codec)
+
+    values = np.array(
+        [np.nan if v is None else v for v in values]
+        if isinstance(values, (list, tuple))
+        else values,
+        dtype="<f8",
+    )
+    if field_lengths is None:
+        field_lengths = [len(values)]
+    if sum(field_lengths) != len(values):
+        raise ValueError("field_lengths must add up to the number of values.")
+
+    header = _HEADER.pack(_MAGIC, BINARY_VERSION, n_turbines, len(field_lengths))
+    layout = np.array(field_lengths, dtype="<u4").tobytes()
+    payload = base64.b64encode(header + layout + values.tobytes())
+    return BINARY_PREFIX + payload.decode("ascii")
+
+
+def decode_binary_message(message):
+    """
+    Decode a binary message into (values, n_turbines, field_lengths), with values
+    as a float64 array (None sent as NaN).
+    """
+    data = base64.b64decode(message[len(BINARY_PREFIX) :])
+    magic, version, n_turbines, n_fields = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("Not a Hercules binary message.")
+    if version != BINARY_VERSION:
+        raise ValueError(
+            "Unsupported binary message version {0} (expected {1}).".format(version, BINARY_VERSION)
+        )
+    offset = _HEADER.size
+    field_lengths = np.frombuffer(data, dtype="<u4", count=n_fields, offset=offset)
+    offset += 4 * n_fields
+    values = np.frombuffer(data, dtype="<f8", count=int(field_lengths.sum()), offset=offset)
+    return values, n_turbines, field_lengths.tolist()
+
+
+def decode_message(message):
+    """Decode a text or binary message into a flat list of values"""
+    if is_binary_message(message):
+        values = decode_binary_message(message)[0]
+        if np.isnan(values).any():
+            return [None if np.isnan(v) else v for v in values.tolist()]
+        return values.tolist()
+    return list(ast.literal_eval(str(message)))
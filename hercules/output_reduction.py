@@ -0,0 +1,145 @@
+# Output reduction for the Hercules emulator
+#
+# Rather than logging every column of main_dict at every time step, the output
+# can be split into groups of columns, each written to its own file either
+# decimated (every N steps) or aggregated over a time window (mean, min, max
+# and/or last value). Aggregates are computed online, keeping only a running
+# sum, count, min, max and last value per column.
+
+import numpy as np
+
+REDUCTION_STATS = ["mean", "min", "max", "last"]
+
+
+def match_columns(columns, keys):
+    """
+    Indices of the columns selected by keys. A key selects the column of the
+    same name and every column below it, e.g. "py_sims.battery_0" selects
+    "py_sims.battery_0.outputs.power".
+    """
+    return [i for i, c in enumerate(columns) if any(c == k or c.startswith(k + ".") for k in keys)]
+
+
+class OutputReducer:
+    """
+    Reduces the rows of the flattened main_dict for one output group.
+
+    Exactly one of every and window must be given.
+
+    Inputs:
+    - name: name of the group
+    - keys: list of main_dict keys (flattened with "." separators) in the group
+    - dt: emulator time step (s)
+    - every: write one row every this many time steps
+    - window: aggregate over windows of this duration (s), which must be a
+        multiple of dt
+    - stats: statistics written for each column when aggregating, from
+        REDUCTION_STATS. Defaults to ["mean"].
+    """
+
+    def __init__(self, name, keys, dt, every=None, window=None, stats=None):
+        if (every is None) == (window is None):
+            raise ValueError(
+                "Output group '{}' must set exactly one of 'every' and 'window'.".format(name)
+            )
+        if stats is None:
+            stats = ["mean"]
+        for stat in stats:
+            if stat not in REDUCTION_STATS:
+                raise ValueError(
+                    "Output group '{0}': stats must be in {1}, received '{2}'.".format(
+                        name, REDUCTION_STATS, stat
+                    )
+                )
+
+        self.name = name
+        self.keys = list(keys)
+        self.stats = list(stats)
+        if every is not None:
+            if int(every) < 1:
+                raise ValueError("Output group '{}': every must be at least 1.".format(name))
+            self.aggregate = False
+            self.n_steps = int(every)
+        else:
+            self.aggregate = True
+            self.n_steps = int(round(window / dt))
+            if self.n_steps < 1 or not np.isclose(self.n_steps * dt, window):
+                raise ValueError(
+                    "Output group '{0}': window ({1} s) must be a multiple of dt ({2} s).".format(
+                        name, window, dt
+                    )
+                )
+
+        self.index = None
+        self.columns = None
+        self._step = 0
+
+    def set_columns(self, columns):
+        """
+        Select this group's columns from the full list of logged columns and
+        return the output columns ("time" first). Every group is labelled with
+        the time, so a "time" key adds no column.
+        """
+        self.index = np.array(
+            [i for i in match_columns(columns, self.keys) if columns[i] != "time"], dtype=int
+        )
+        selected = [columns[i] for i in self.index]
+        if self.aggregate:
+            self.columns = ["time"] + [
+                "{0}.{1}".format(c, stat) for c in selected for stat in self.stats
+            ]
+        else:
+            self.columns = ["time"] + selected
+        self._reset()
+        return self.columns
+
+    def _reset(self):
+        n = len(self.index)
+        self._count = np.zeros(n)
+        self._sum = np.zeros(n)
+        self._min = np.full(n, np.nan)
+        self._max = np.full(n, np.nan)
+        self._last = np.full(n, np.nan)
+        self._n_samples = 0
+
+    def add(self, time, row):
+        """
+        Add the values of one time step (the full row of logged columns). Returns
+        the row to write, or None if nothing is due at this step. For windows, the
+        row is written at the last step of the window and labelled with its time.
+        """
+        self._step += 1
+        values = row[self.index]
+
+        if not self.aggregate:
+            if (self._step - 1) % self.n_steps == 0:
+                return [time] + values.tolist()
+            return None
+
+        valid = ~np.isnan(values)
+        self._sum[valid] += values[valid]
+        self._count[valid] += 1
+        self._min = np.fmin(self._min, values)
+        self._max = np.fmax(self._max, values)
+        self._last = values.copy()
+        self._n_samples += 1
+        self._time = time
+
+        if self._n_samples == self.n_steps:
+            return self._pop()
+        return None
+
+    def finish(self):
+        """The aggregate of an incomplete final window, or None"""
+        if self.aggregate and self.index is not None and self._n_samples > 0:
+            return self._pop()
+        return None
+
+    def _pop(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._sum / self._count
+        values = {"mean": mean, "min": self._min, "max": self._max, "last": self._last}
+        out = np.column_stack([values[stat] for stat in self.stats]).ravel()
+        time = self._time
+        self._reset()
+        return [time] + out.tolist()
@@ -0,0 +1,375 @@
+# Output writers for the Hercules emulator
+#
+# The emulator logs one row of the flattened main_dict per time step. Rather
+# than reopening the output file every step, rows are held in memory and
+# written out in batches by one of the writers below. The column names are
+# fixed when the header is written and cached for the rest of the run. When
+# restarting from a checkpoint, a writer can resume an existing file instead,
+# keeping the rows written up to the checkpoint and appending after them.
+
+import datetime as dt
+import os
+import threading
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+OUTPUT_FORMATS = ["csv", "parquet"]
+BACKPRESSURE_POLICIES = ["block", "drop", "coalesce"]
+
+
+def infer_output_format(filename):
+    """Return the output format implied by the extension of filename (csv by default)"""
+    suffix = Path(filename).suffix.lower()
+    if suffix in [".parquet", ".pq"]:
+        return "parquet"
+    return "csv"
+
+
+def make_output_writer(filename, output_format=None, flush_interval=1, resume_rows=None):
+    """
+    Construct an output writer for filename.
+
+    Inputs:
+    - filename: path of the output file
+    - output_format: one of OUTPUT_FORMATS. If None, inferred from the file extension.
+    - flush_interval: number of rows to hold in memory between writes to disk
+    - resume_rows: if given, resume the existing file, keeping its first resume_rows
+        rows (see OutputWriter)
+    """
+    if output_format is None:
+        output_format = infer_output_format(filename)
+
+    if output_format == "csv":
+        return CSVOutputWriter(filename, flush_interval, resume_rows)
+    elif output_format == "parquet":
+        return ParquetOutputWriter(filename, flush_interval, resume_rows)
+    else:
+        raise ValueError(
+            "output_format must be one of {0}, received '{1}'.".format(
+                OUTPUT_FORMATS, output_format
+            )
+        )
+
+
+class OutputWriter:
+    """
+    Base class for buffered output writers.
+
+    Rows are held in memory and passed to _write_rows every flush_interval
+    rows, on flush() and on close(). Subclasses implement _open, _write_rows
+    and _close.
+
+    If resume_rows is given, write_header resumes the existing file instead of
+    creating a new one: its header must match the columns, its first resume_rows
+    rows are kept and any rows after them (written after the checkpoint being
+    restarted from) are discarded.
+    """
+
+    def __init__(self, filename, flush_interval=1, resume_rows=None):
+        if int(flush_interval) < 1:
+            raise ValueError("flush_interval must be at least 1.")
+
+        self.filename = filename
+        self.flush_interval = int(flush_interval)
+        self.resume_rows = resume_rows
+        self.columns = None
+        self.rows_written = 0
+        self._rows = []
+
+    def write_header(self, columns):
+        """Fix the output schema and open the file"""
+        if self.columns is not None:
+            raise RuntimeError("Output header for {} already written.".format(self.filename))
+        self.columns = list(columns)
+        Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
+        if self.resume_rows is not None:
+            self._resume()
+            self.rows_written = self.resume_rows
+        else:
+            self._open()
+
+    def write_row(self, values):
+        """Queue one row of values, ordered as the header columns"""
+        self._rows.append(values)
+        if len(self._rows) >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write any rows held in memory to disk"""
+        if self._rows:
+            self._write_rows(self._rows)
+            self.rows_written += len(self._rows)
+            self._rows = []
+
+    def close(self):
+        """Flush remaining rows and close the file"""
+        if self.columns is None:
+            return
+        self.flush()
+        self._close()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _resume(self):
+        raise NotImplementedError
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class CSVOutputWriter(OutputWriter):
+    """
+    Writes rows as comma separated text, keeping the file open between batches.
+    """
+
+    def _open(self):
+        self._file = open(self.filename, "w")
+        self._file.write(",".join(self.columns) + os.linesep)
+        self._file.flush()
+
+    def _resume(self):
+        # Find the end of the rows to keep and truncate the file there
+        with open(self.filename, "r+b") as f:
+            header = f.readline().decode().rstrip("\r\n").split(",")
+            if header != self.columns:
+                raise ValueError(
+                    "Cannot resume {}: its columns do not match.".format(self.filename)
+                )
+            for i in range(self.resume_rows):
+                if not f.readline():
+                    raise ValueError(
+                        "Cannot resume {0}: it has {1} rows, expected {2}.".format(
+                            self.filename, i, self.resume_rows
+                        )
+                    )
+            f.truncate(f.tell())
+        self._file = open(self.filename, "a")
+
+    def _write_rows(self, rows):
+        self._file.write("".join(",".join([str(v) for v in row]) + os.linesep for row in rows))
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetOutputWriter(OutputWriter):
+    """
+    Writes rows to a Parquet file, one row group per flushed batch.
+
+    Numeric columns are stored as float64, datetimes as timestamps and anything
+    else as strings. The column types are taken from the first row written.
+    Requires pyarrow.
+    """
+
+    def _open(self):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "pyarrow is required to write parquet output. "
+                + "Install with `pip install pyarrow` or set output_format to 'csv'."
+            )
+        self._writer = None
+
+    def _resume(self):
+        # Parquet files cannot be appended to, so the rows to keep are read and
+        # written again to a new file of the same name
+        self._open()
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(self.filename)
+        if table.column_names != self.columns:
+            raise ValueError("Cannot resume {}: its columns do not match.".format(self.filename))
+        if table.num_rows < self.resume_rows:
+            raise ValueError(
+                "Cannot resume {0}: it has {1} rows, expected {2}.".format(
+                    self.filename, table.num_rows, self.resume_rows
+                )
+            )
+        self._schema = table.schema
+        self._writer = pq.ParquetWriter(self.filename, self._schema)
+        self._writer.write_table(table.slice(0, self.resume_rows))
+
+    def _write_rows(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(zip(*rows))
+        if self._writer is None:
+            self._schema = pa.schema(
+                [(k, self._arrow_type(v)) for k, v in zip(self.columns, rows[0])]
+            )
+            self._writer = pq.ParquetWriter(self.filename, self._schema)
+
+        arrays = []
+        for field, column in zip(self._schema, columns):
+            if pa.types.is_string(field.type):
+                column = [str(v) for v in column]
+            arrays.append(pa.array(column, type=field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    @staticmethod
+    def _arrow_type(value):
+        import pyarrow as pa
+
+        if isinstance(value, (dt.datetime, np.datetime64)):
+            return pa.timestamp("us")
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            return pa.float64()
+        return pa.string()
+
+
+class AsyncOutputWriter:
+    """
+    Runs an output writer on a background thread.
+
+    write_row hands the row to a writer thread through a bounded queue, so the
+    caller does not wait on formatting or disk I/O. When the queue is full the
+    backpressure policy decides what happens to a new row:
+    - "block": wait until the writer thread has made room (no rows are lost)
+    - "drop": discard the new row
+    - "coalesce": replace the most recent queued row with the new one
+
+    Rows passed to write_row must not be modified afterwards. flush() and close()
+    wait for the queue to drain. An exception raised on the writer thread is
+    raised again on the next call from the main thread.
+
+    Inputs:
+    - writer: the OutputWriter doing the actual writing
+    - queue_size: maximum number of rows waiting to be written
+    - backpressure: one of BACKPRESSURE_POLICIES
+    """
+
+    def __init__(self, writer, queue_size=1000, backpressure="block"):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(
+                "backpressure must be one of {0}, received '{1}'.".format(
+                    BACKPRESSURE_POLICIES, backpressure
+                )
+            )
+        if int(queue_size) < 1:
+            raise ValueError("queue_size must be at least 1.")
+
+        self.writer = writer
+        self.queue_size = int(queue_size)
+        self.backpressure = backpressure
+        self.rows_dropped = 0
+        self.rows_coalesced = 0
+
+        self._queue = deque()
+        self._n_rows_queued = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._error = None
+
+    @property
+    def filename(self):
+        return self.writer.filename
+
+    @property
+    def columns(self):
+        return self.writer.columns
+
+    @property
+    def rows_written(self):
+        return self.writer.rows_written
+
+    def write_header(self, columns):
+        """Fix the output schema and start the writer thread"""
+        self._check_error()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="hercules-output-writer", daemon=True
+            )
+            self._thread.start()
+        self._put(("header", list(columns)))
+
+    def write_row(self, values):
+        """Queue one row of values, applying the backpressure policy if the queue is full"""
+        self._check_error()
+        with self._condition:
+            if self._n_rows_queued >= self.queue_size:
+                if self.backpressure == "drop":
+                    self.rows_dropped += 1
+                    return
+                elif self.backpressure == "coalesce" and self._queue[-1][0] == "row":
+                    self._queue[-1] = ("row", values)
+                    self.rows_coalesced += 1
+                    return
+                while self._n_rows_queued >= self.queue_size and self._error is None:
+                    self._condition.wait()
+                self._check_error()
+            self._queue.append(("row", values))
+            self._n_rows_queued += 1
+            self._condition.notify_all()
+
+    def flush(self):
+        """Wait until all queued rows have been written to disk"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._put(("flush", done))
+        while not done.wait(0.1):
+            self._check_error()
+        self._check_error()
+
+    def close(self):
+        """Write out all queued rows, close the file and stop the writer thread"""
+        if self._thread is None or self._closed:
+            return
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._check_error()
+
+    def _put(self, item):
+        with self._condition:
+            self._queue.append(item)
+            self._condition.notify_all()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise RuntimeError(
+                "Output writer for {} failed.".format(self.writer.filename)
+            ) from self._error
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    while not self._queue and not self._closed:
+                        self._condition.wait()
+                    if not self._queue:
+                        break
+                    kind, item = self._queue.popleft()
+                    if kind == "row":
+                        self._n_rows_queued -= 1
+                    self._condition.notify_all()
+
+                if kind == "row":
+                    self.writer.write_row(item)
+                elif kind == "header":
+                    self.writer.write_header(item)
+                elif kind == "flush":
+                    self.writer.flush()
+                    item.set()
+
+            self.writer.close()
+        except BaseException as e:
+            with self._condition:
+                self._error = e
+                self._condition.notify_all()
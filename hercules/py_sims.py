@@ -4,6 +4,7 @@ from hercules.python_simulators.battery import Battery
 from hercules.python_simulators.electrolyzer_plant import ElectrolyzerPlant
 from hercules.python_simulators.simple_solar import SimpleSolar
 from hercules.python_simulators.solar_pysam import SolarPySAM
+from hercules.timing import StepTimer
 
 
 class PySims:
@@ -11,6 +12,16 @@ class PySims:
         # Save timt step
         self.dt = input_dict["dt"]
 
+        # Print progress to the console
+        if "verbose" in input_dict:
+            self.verbose = input_dict["verbose"]
+        else:
+            self.verbose = True
+
+        # Timer for each py_sim's step, replaced by the emulator's timer when
+        # timing is enabled
+        self.timer = StepTimer(enabled=False)
+
         # Grab py sim details
         self.py_sim_dict = input_dict["py_sims"]
 
@@ -22,7 +33,8 @@ class PySims:
         else:
             self.n_py_sim = len(self.py_sim_dict)
             self.py_sim_names = np.copy(list(self.py_sim_dict.keys()))
-            print(self.py_sim_names)
+            if self.verbose:
+                print(self.py_sim_names)
             self.py_sim_dict["inputs"] = {}
             self.py_sim_dict["inputs"][
                 "available_power"
@@ -30,7 +42,8 @@ class PySims:
 
             # Collect the py_sim objects, inputs and outputs
             for py_sim_name in self.py_sim_names:
-                print((self.py_sim_dict[py_sim_name]))
+                if self.verbose:
+                    print((self.py_sim_dict[py_sim_name]))
                 self.py_sim_dict[py_sim_name]["object"] = self.get_py_sim(
                     self.py_sim_dict[py_sim_name]
                 )
@@ -42,7 +55,8 @@ class PySims:
                     self.py_sim_dict["inputs"][needed_input] = self.py_sim_dict[py_sim_name][
                         "object"
                     ].needed_inputs[needed_input]
-            print(self.py_sim_dict["inputs"])
+            if self.verbose:
+                print(self.py_sim_dict["inputs"])
             # TODO: always add 'available_power' as input??
             # print(self.py_sim_dict['solar_farm_0']['object'])
 
@@ -66,14 +80,16 @@ class PySims:
         # Collect the py_sim objects
         py_sims_available_power = 0.0
         for py_sim_name in self.py_sim_names:
-            print(py_sim_name)
+            if self.verbose:
+                print(py_sim_name)
 
             # print('self.__dict__.keys() = ', self.__dict__.keys())
             # print('main_dict = ',main_dict)
 
-            self.py_sim_dict[py_sim_name]["outputs"] = self.py_sim_dict[py_sim_name]["object"].step(
-                main_dict
-            )
+            with self.timer.phase("py_sims." + py_sim_name):
+                self.py_sim_dict[py_sim_name]["outputs"] = self.py_sim_dict[py_sim_name][
+                    "object"
+                ].step(main_dict)
             if "Solar" in self.py_sim_dict[py_sim_name]["py_sim_type"]:
                 # TODO: Remove try/except once all solar module options have same outputs
                 try:
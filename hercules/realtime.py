@@ -0,0 +1,217 @@
+# Real-time scheduling for hardware-in-the-loop runs
+#
+# When Hercules is connected to real controller hardware, each time step must
+# finish within a wall-clock budget. RealTimeScheduler paces the emulator main
+# loop, sleeping until the wall-clock boundary of each step (or running as fast
+# as possible), and tracks a deadline for every step: steps that overrun it are
+# counted, and the time of each phase of the step (from the emulator's
+# StepTimer) is attributed to the overrun. StepBudget is the counterpart for a
+# standin, which uses it to fall back to cheaper, lower fidelity results when a
+# step is about to overrun.
+
+import time
+
+import numpy as np
+
+
+class RealTimeScheduler:
+    """
+    Paces the emulator main loop and tracks the wall-clock deadline of each step.
+
+    Usage:
+        scheduler.start()
+        while ...:
+            scheduler.begin_step()
+            ...  # the step, timed by timer
+            overrun = scheduler.end_step()
+            scheduler.wait()
+
+    After a late step, the pacing restarts from the end of that step rather than
+    running the following steps back to back to catch up.
+
+    Inputs:
+    - dt: simulation time step (s)
+    - pacing: if True, each step starts on a wall-clock boundary, dt / real_time_factor
+        after the previous one. Otherwise steps run as fast as possible.
+    - step_deadline: wall-clock budget of each step (s). Defaults to the pacing period
+        when pacing, and to None (no deadline tracking) otherwise.
+    - real_time_factor: simulated seconds per wall-clock second when pacing
+    - timer: optional StepTimer timing the phases of the step, for attributing overruns
+    """
+
+    def __init__(self, dt, pacing=True, step_deadline=None, real_time_factor=1.0, timer=None):
+        if real_time_factor <= 0:
+            raise ValueError("real_time_factor must be positive.")
+        self.period = dt / real_time_factor
+        self.pacing = pacing
+        if step_deadline is None and pacing:
+            step_deadline = self.period
+        if step_deadline is not None and step_deadline <= 0:
+            raise ValueError("step_deadline must be positive.")
+        self.step_deadline = step_deadline
+        self.timer = timer
+
+        self.n_steps = 0
+        self.n_overruns = 0
+        self.max_overrun = 0.0
+        # Time (s) of each phase summed over the overrun steps, and the number of
+        # overruns in which each phase took the longest
+        self.overrun_phase_times = {}
+        self.overrun_worst_phase_counts = {}
+        # Time (s) of each phase in the latest step. The time of a phase excludes
+        # that of its nested phases (named "<phase>.<name>", e.g. "py_sims.battery"),
+        # so each part of the step is counted once.
+        self.step_phase_times = {}
+
+        self._step_start = None
+        self._next_boundary = None
+        self._phase_totals_ns = {}
+
+    def start(self):
+        """Start the clock, with the first step due now"""
+        self._next_boundary = time.perf_counter()
+        self._phase_totals_ns = self._read_phase_totals()
+
+    def begin_step(self):
+        """Mark the start of a step"""
+        if self._next_boundary is None:
+            self.start()
+        self._step_start = time.perf_counter()
+
+    def time_remaining(self):
+        """Wall-clock time (s) left before the deadline of the current step (inf
+        without a deadline)"""
+        if self.step_deadline is None or self._step_start is None:
+            return np.inf
+        return self._step_start + self.step_deadline - time.perf_counter()
+
+    def end_step(self):
+        """
+        Mark the end of a step, recording its phase times and whether it overran
+        its deadline. Returns the overrun (s), 0.0 if the step was on time.
+        """
+        duration = time.perf_counter() - self._step_start
+        self.n_steps += 1
+
+        totals_ns = self._read_phase_totals()
+        step_ns = {
+            name: total_ns - self._phase_totals_ns.get(name, 0)
+            for name, total_ns in totals_ns.items()
+            if name != "step" and total_ns > self._phase_totals_ns.get(name, 0)
+        }
+        self._phase_totals_ns = totals_ns
+        self_ns = dict(step_ns)
+        for name, phase_ns in step_ns.items():
+            parent = name.rpartition(".")[0]
+            if parent in self_ns:
+                self_ns[parent] -= phase_ns
+        self.step_phase_times = {
+            name: phase_ns / 1e9 for name, phase_ns in self_ns.items() if phase_ns > 0
+        }
+
+        if self.step_deadline is None or duration <= self.step_deadline:
+            return 0.0
+
+        overrun = duration - self.step_deadline
+        self.n_overruns += 1
+        self.max_overrun = max(self.max_overrun, overrun)
+        for name, phase_time in self.step_phase_times.items():
+            self.overrun_phase_times[name] = self.overrun_phase_times.get(name, 0.0) + phase_time
+        if self.step_phase_times:
+            worst = max(self.step_phase_times, key=self.step_phase_times.get)
+            self.overrun_worst_phase_counts[worst] = (
+                self.overrun_worst_phase_counts.get(worst, 0) + 1
+            )
+        return overrun
+
+    def wait(self):
+        """When pacing, sleep until the wall-clock boundary of the next step"""
+        if not self.pacing:
+            return
+        self._next_boundary += self.period
+        now = time.perf_counter()
+        if now < self._next_boundary:
+            time.sleep(self._next_boundary - now)
+        else:
+            # Late: start the next step now
+            self._next_boundary = now
+
+    def format_step_phases(self, n_phases=3):
+        """The longest phases of the latest step, as text"""
+        phases = sorted(self.step_phase_times.items(), key=lambda item: -item[1])[:n_phases]
+        return ", ".join("{}: {:.1f} ms".format(name, t * 1000) for name, t in phases)
+
+    def format_summary(self):
+        """Overrun counts and their attribution to phases, as text"""
+        if self.step_deadline is None:
+            return "{} steps, no deadline".format(self.n_steps)
+        lines = [
+            "{} of {} steps overran the deadline of {:.1f} ms (max overrun {:.1f} ms)".format(
+                self.n_overruns, self.n_steps, self.step_deadline * 1000, self.max_overrun * 1000
+            )
+        ]
+        if self.n_overruns:
+            lines.append("{:<32}{:>16}{:>16}".format("phase", "mean_ms", "n_longest"))
+            for name, phase_time in sorted(
+                self.overrun_phase_times.items(), key=lambda item: -item[1]
+            ):
+                lines.append(
+                    "{:<32}{:>16.3f}{:>16d}".format(
+                        name,
+                        phase_time / self.n_overruns * 1000,
+                        self.overrun_worst_phase_counts.get(name, 0),
+                    )
+                )
+        return "\n".join(lines)
+
+    def _read_phase_totals(self):
+        if self.timer is None:
+            return {}
+        return {name: h.total_ns for name, h in self.timer.histograms.items()}
+
+
+class StepBudget:
+    """
+    Wall-clock budget of a standin's step, with running estimates of the cost of
+    optional work (e.g. a FLORIS solve), for deciding whether there is time to do
+    it or a cheaper fallback should be used instead.
+
+    Inputs:
+    - budget: wall-clock time allowed for each step (s)
+    - smoothing: weight of the previous estimate when updating a cost estimate
+        with a new duration, in [0, 1)
+    """
+
+    def __init__(self, budget, smoothing=0.8):
+        if budget <= 0:
+            raise ValueError("budget must be positive.")
+        if smoothing < 0 or smoothing >= 1:
+            raise ValueError("smoothing must be in [0, 1).")
+        self.budget = budget
+        self.smoothing = smoothing
+        self.costs = {}
+        self._start = None
+
+    def start(self):
+        """Mark the start of a step"""
+        self._start = time.perf_counter()
+
+    def time_remaining(self):
+        """Wall-clock time (s) left in the current step"""
+        if self._start is None:
+            return self.budget
+        return self._start + self.budget - time.perf_counter()
+
+    def record(self, name, duration):
+        """Update the cost estimate of work name with a measured duration (s)"""
+        if name in self.costs:
+            self.costs[name] = self.smoothing * self.costs[name] + (1 - self.smoothing) * duration
+        else:
+            self.costs[name] = duration
+
+    def can_afford(self, name):
+        """Whether work name is expected to finish within the current step. Work
+        never measured is assumed affordable."""
+        if name not in self.costs:
+            return True
+        return self.costs[name] <= self.time_remaining()
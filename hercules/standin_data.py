@@ -0,0 +1,192 @@
+# Standin data files
+#
+# The standins replay a recorded (or generated) series of the wind speed, wind
+# direction and turbine powers. The series is either a CSV file (columns time,
+# amr_wind_speed, amr_wind_direction and turbine_power_<i>) or, for long series,
+# a binary bundle: a directory holding
+#   - time.npy: times of the samples (s), shape (n_times,)
+#   - values.npy: the channels at each time, shape (n_times, n_channels), with
+#     the wind speed and wind direction followed by the turbine power matrix
+#   - channels.json: the names of the channels, as in the CSV columns
+# The .npy files are opened memory-mapped, so that only the rows around the
+# simulation time are read from disk. convert_csv_to_bundle converts a CSV file
+# in chunks, without loading all of it.
+#
+# Usage: python -m hercules.standin_data <csv_file> <bundle_dir>
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from hercules.time_series import TimeSeriesCursor
+
+WIND_CHANNELS = ["amr_wind_speed", "amr_wind_direction"]
+
+
+class StandinDataBundle:
+    """
+    Standin data in a binary bundle, opened memory-mapped.
+
+    Columns can be read as from the DataFrame of a CSV file
+    (bundle["amr_wind_speed"], bundle.columns).
+
+    Inputs:
+    - path: the bundle directory
+    - mmap_mode: memory-map mode of the .npy files, or None to load them
+    """
+
+    def __init__(self, path, mmap_mode="r"):
+        path = Path(path)
+        self.path = path
+        self.times = np.load(path / "time.npy", mmap_mode=mmap_mode)
+        self.values = np.load(path / "values.npy", mmap_mode=mmap_mode)
+        with open(path / "channels.json") as f:
+            self.channels = json.load(f)
+        if self.values.shape != (len(self.times), len(self.channels)):
+            raise ValueError("values.npy of {} does not match its times and channels.".format(path))
+
+    @property
+    def columns(self):
+        return ["time"] + self.channels
+
+    @property
+    def turbine_powers(self):
+        """The turbine power matrix, shape (n_times, n_turbines)"""
+        return self.values[:, len(WIND_CHANNELS) :]
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, column):
+        if column == "time":
+            return self.times
+        if column not in self.channels:
+            raise KeyError(column)
+        return self.values[:, self.channels.index(column)]
+
+    def cursor(self, columns):
+        """TimeSeriesCursor over the given channels. Leading channels are
+        interpolated straight from the memory map; others are copied."""
+        columns = list(columns)
+        if self.channels[: len(columns)] == columns:
+            values = self.values[:, : len(columns)]
+        else:
+            values = self.values[:, [self.channels.index(c) for c in columns]]
+        return TimeSeriesCursor(self.times, values, columns)
+
+
+def is_standin_data_bundle(path):
+    """Whether path is a standin data bundle directory"""
+    return (Path(path) / "time.npy").exists()
+
+
+def load_standin_data(path):
+    """The standin data in path: a StandinDataBundle for a bundle directory,
+    otherwise a DataFrame read from a CSV file"""
+    if is_standin_data_bundle(path):
+        return StandinDataBundle(path)
+    return pd.read_csv(path)
+
+
+def standin_data_cursor(standin_data, columns):
+    """TimeSeriesCursor over columns of standin data loaded by load_standin_data"""
+    if isinstance(standin_data, StandinDataBundle):
+        return standin_data.cursor(columns)
+    return TimeSeriesCursor.from_dataframe(standin_data, columns)
+
+
+def standin_data_channels(columns):
+    """The channels of standin data with the given columns, in bundle order:
+    wind speed, wind direction and the turbine powers by turbine index"""
+    missing = [c for c in ["time"] + WIND_CHANNELS if c not in columns]
+    if missing:
+        raise ValueError("Standin data is missing the columns {}.".format(missing))
+    turbine_columns = sorted(
+        (c for c in columns if c.startswith("turbine_power_")),
+        key=lambda c: int(c[len("turbine_power_") :]),
+    )
+    return WIND_CHANNELS + turbine_columns
+
+
+def save_standin_data_bundle(path, times, wind_speeds, wind_directions, turbine_powers):
+    """
+    Write a standin data bundle.
+
+    Inputs:
+    - path: the bundle directory, created if needed
+    - times: times of the samples (s)
+    - wind_speeds, wind_directions: wind speed (m/s) and direction (deg) at each time
+    - turbine_powers: turbine powers (kW), shape (n_times, n_turbines)
+    """
+    times = np.asarray(times, dtype=float)
+    turbine_powers = np.asarray(turbine_powers, dtype=float).reshape(len(times), -1)
+    values = np.column_stack([wind_speeds, wind_directions, turbine_powers]).astype(float)
+    channels = WIND_CHANNELS + [
+        "turbine_power_{}".format(i) for i in range(turbine_powers.shape[1])
+    ]
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / "time.npy", times)
+    np.save(path / "values.npy", values)
+    with open(path / "channels.json", "w") as f:
+        json.dump(channels, f)
+
+
+def open_standin_data_bundle(path, n_times, n_turbines=None, channels=None):
+    """
+    Create a standin data bundle of n_times rows, filled with zeros, and return
+    its time and values arrays memory-mapped for writing, so that the bundle can
+    be written piece by piece. The channels are the wind speed, the wind
+    direction and n_turbines turbine powers, unless given.
+    """
+    if channels is None:
+        channels = WIND_CHANNELS + ["turbine_power_{}".format(i) for i in range(n_turbines)]
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / "channels.json", "w") as f:
+        json.dump(list(channels), f)
+    times = np.lib.format.open_memmap(path / "time.npy", mode="w+", shape=(n_times,))
+    values = np.lib.format.open_memmap(
+        path / "values.npy", mode="w+", shape=(n_times, len(channels))
+    )
+    return times, values
+
+
+def convert_csv_to_bundle(csv_file, path, chunksize=100000):
+    """
+    Convert a standin data CSV file to a bundle, reading chunksize rows at a
+    time so that the whole file is never held in memory.
+    """
+    columns = pd.read_csv(csv_file, nrows=0).columns.tolist()
+    if "heterogeneous_inflow_config" in columns:
+        raise ValueError(
+            "Standin data with heterogeneous_inflow_config cannot be stored in a bundle."
+        )
+    channels = standin_data_channels(columns)
+
+    # Count the rows, reading only the time column with the same reader so that
+    # the count agrees with the rows read, then fill the arrays chunk by chunk
+    n_rows = sum(
+        len(chunk) for chunk in pd.read_csv(csv_file, usecols=["time"], chunksize=chunksize)
+    )
+
+    times, values = open_standin_data_bundle(path, n_rows, channels=channels)
+    start = 0
+    for chunk in pd.read_csv(csv_file, usecols=["time"] + channels, chunksize=chunksize):
+        stop = start + len(chunk)
+        times[start:stop] = chunk["time"].to_numpy(dtype=float)
+        values[start:stop] = chunk[channels].to_numpy(dtype=float)
+        start = stop
+    times.flush()
+    values.flush()
+    return StandinDataBundle(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        raise Exception("Usage: python -m hercules.standin_data <csv_file> <bundle_dir>")
+    bundle = convert_csv_to_bundle(sys.argv[1], sys.argv[2])
+    print("Wrote {} rows of {} to {}".format(len(bundle), bundle.channels, bundle.path))
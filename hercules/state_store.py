@@ -0,0 +1,294 @@
+# Array-backed state store for main_dict
+#
+# main_dict is a nested dictionary passed between the emulator, the controller
+# and the py_sims. A StateStore keeps its floating point values (scalars and
+# vectors) in one contiguous numpy buffer, each under a named slice, behind a
+# dictionary facade (StateDict). Code that reads and writes main_dict as a
+# dictionary keeps working, while the emulator can log or copy all numeric
+# values at once from the buffer.
+#
+# Reading a float field returns a float, and reading a vector field returns a
+# copy of its values with the type they were assigned with (list, tuple or
+# numpy array), so reads behave as for a plain dictionary. StateDict.view gives
+# in-place access to a field's slice of the buffer. Assigning a float or float
+# vector of the same length writes into the buffer. Anything else (ints,
+# strings, objects, lists with None) is held as a plain Python value. Any
+# change of layout (keys added or removed, fields added, resized or turned into
+# plain values) increments the store's version, which lets cached views of the
+# layout (such as a FlatteningPlan or a view) detect it. The slots of removed
+# or resized fields are reused by later fields.
+#
+# Vector reads through the dictionary interface convert the values element by
+# element. The paths that avoid this work on the buffer directly: FlatteningPlan
+# for logging, and the emulator's control messages and received status
+# messages, which use StateDict.view.
+
+from collections.abc import Mapping, MutableMapping
+
+import numpy as np
+
+
+def _as_float_field(value):
+    """
+    Return (values, is_vector) if value can be held in the buffer, or None.
+    Floats and 1-D float arrays can, as can lists or tuples of numbers with at
+    least one float. Ints, bools and lists of ints are left as Python values so
+    they keep their type.
+    """
+    if isinstance(value, (float, np.floating)):
+        return float(value), False
+    if isinstance(value, np.ndarray):
+        if value.ndim == 1 and value.dtype.kind == "f" and len(value) > 0:
+            return value, True
+        return None
+    if isinstance(value, (list, tuple)) and len(value) > 0:
+        has_float = False
+        for v in value:
+            if isinstance(v, (float, np.floating)):
+                has_float = True
+            elif isinstance(v, (bool, np.bool_)) or not isinstance(v, (int, np.integer)):
+                return None
+        if has_float:
+            return np.asarray(value, dtype=float), True
+    return None
+
+
+class StateStore:
+    """
+    Contiguous float64 buffer holding the numeric fields of a StateDict tree.
+
+    Use StateStore.from_dict(main_dict) to convert a nested dictionary; it
+    returns the root StateDict, whose store attribute is the StateStore.
+    """
+
+    def __init__(self, capacity=64):
+        self.data = np.empty(max(int(capacity), 1))
+        self.size = 0
+        self.version = 0
+        # Slots released below size, as (offset, length) sorted by offset
+        self.free = []
+
+    @classmethod
+    def from_dict(cls, d):
+        """Convert the nested dictionary d into a StateDict backed by a new store"""
+        return StateDict(cls(), d)
+
+    def allocate(self, length):
+        """Reserve length entries of the buffer and return their offset. Released
+        slots are reused first; otherwise the entries are taken at the end of the
+        buffer, growing it if needed."""
+        self.version += 1
+        for i, (offset, free_length) in enumerate(self.free):
+            if free_length >= length:
+                if free_length == length:
+                    del self.free[i]
+                else:
+                    self.free[i] = (offset + length, free_length - length)
+                return offset
+        if self.size + length > len(self.data):
+            data = np.empty(max(2 * len(self.data), self.size + length))
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+        offset = self.size
+        self.size += length
+        return offset
+
+    def release(self, offset, length):
+        """Return length entries at offset, reserved by allocate, to the store"""
+        self.version += 1
+        free = self.free
+        free.append((offset, length))
+        free.sort()
+        # Merge adjacent slots, and give the last one back to the end of the buffer
+        merged = [free[0]]
+        for offset, length in free[1:]:
+            last_offset, last_length = merged[-1]
+            if last_offset + last_length == offset:
+                merged[-1] = (last_offset, last_length + length)
+            else:
+                merged.append((offset, length))
+        if merged[-1][0] + merged[-1][1] == self.size:
+            self.size = merged.pop()[0]
+        self.free = merged
+
+
+class _Field:
+    # Location of a value held in the store buffer, and the type (list, tuple or
+    # numpy array) a vector value was assigned with
+    __slots__ = ["offset", "length", "is_vector", "vector_type"]
+
+    def __init__(self, offset, length, is_vector, vector_type=None):
+        self.offset = offset
+        self.length = length
+        self.is_vector = is_vector
+        self.vector_type = vector_type
+
+
+class StateDict(MutableMapping):
+    """
+    Dictionary facade over a StateStore, for one level of the nested main_dict.
+
+    Nested dictionaries assigned into a StateDict become StateDicts on the same
+    store. Assigning a dictionary to a key holding a StateDict with the same keys
+    updates it in place, so per-step output dictionaries do not change the layout.
+    A nested StateDict replaced or deleted from the tree is moved to a store of
+    its own, so it keeps its values while its slots are reused.
+
+    Inputs:
+    - store: the StateStore holding the numeric values
+    - d: optional dictionary of initial contents
+    """
+
+    def __init__(self, store, d=None):
+        self.store = store
+        # key -> plain value, or _Field for values held in the store buffer
+        self._items = {}
+        if d is not None:
+            for k, v in d.items():
+                self[k] = v
+
+    def field(self, key):
+        """(offset, length, is_vector) of key in the store buffer, or None"""
+        f = self._items.get(key)
+        if type(f) is _Field:
+            return f.offset, f.length, f.is_vector
+        return None
+
+    def view(self, key):
+        """
+        Numpy view of the slice of the store buffer holding key (of length 1 for
+        a float), for in-place reads and writes. The view is only valid while the
+        store's version is unchanged: any change of layout may move the buffer or
+        give the slice to another field.
+        """
+        f = self._items[key]
+        if type(f) is not _Field:
+            raise TypeError("{} is not held in the store buffer.".format(key))
+        return self.store.data[f.offset : f.offset + f.length]
+
+    def __getitem__(self, key):
+        v = self._items[key]
+        if type(v) is _Field:
+            if v.is_vector:
+                values = self.store.data[v.offset : v.offset + v.length]
+                if v.vector_type is np.ndarray:
+                    return values.copy()
+                if v.vector_type is tuple:
+                    return tuple(values.tolist())
+                return values.tolist()
+            return float(self.store.data[v.offset])
+        return v
+
+    def __setitem__(self, key, value):
+        store = self.store
+        current = self._items.get(key)
+
+        # Nested dictionaries
+        if isinstance(value, Mapping):
+            if value is current:
+                return
+            if isinstance(current, StateDict) and current.keys() == value.keys():
+                for k, v in value.items():
+                    current[k] = v
+                return
+            self._release(key)
+            if not (isinstance(value, StateDict) and value.store is store):
+                value = StateDict(store, value)
+            self._set_value(key, value)
+            return
+
+        # Numeric values held in the buffer
+        numeric = _as_float_field(value)
+        if numeric is not None:
+            values, is_vector = numeric
+            length = len(values) if is_vector else 1
+            if (
+                type(current) is not _Field
+                or current.length != length
+                or current.is_vector != is_vector
+            ):
+                self._release(key)
+                current = _Field(store.allocate(length), length, is_vector)
+                self._items[key] = current
+            if is_vector:
+                if isinstance(value, np.ndarray):
+                    current.vector_type = np.ndarray
+                elif isinstance(value, tuple):
+                    current.vector_type = tuple
+                else:
+                    current.vector_type = list
+            if is_vector:
+                store.data[current.offset : current.offset + length] = values
+            else:
+                store.data[current.offset] = values
+            return
+
+        self._set_value(key, value)
+
+    def _release(self, key):
+        # Give the slots held under key back to the store, moving a nested
+        # StateDict to a store of its own
+        current = self._items.get(key)
+        if type(current) is _Field:
+            self.store.release(current.offset, current.length)
+            self._items[key] = None
+        elif isinstance(current, StateDict) and current.store is self.store:
+            current._move_to(StateStore())
+
+    def _move_to(self, store):
+        # Move the fields of this StateDict and its nested StateDicts to store
+        old_store = self.store
+        for k, v in self._items.items():
+            if type(v) is _Field:
+                f = _Field(store.allocate(v.length), v.length, v.is_vector, v.vector_type)
+                store.data[f.offset : f.offset + f.length] = old_store.data[
+                    v.offset : v.offset + v.length
+                ]
+                old_store.release(v.offset, v.length)
+                self._items[k] = f
+            elif isinstance(v, StateDict) and v.store is old_store:
+                v._move_to(store)
+        self.store = store
+
+    def _set_value(self, key, value):
+        # Hold value as a plain Python value, noting any change of layout
+        if key not in self._items:
+            self.store.version += 1
+        else:
+            current = self._items[key]
+            if current is not value:
+                self._release(key)
+            if type(current) is not type(value) or (
+                isinstance(value, (list, tuple)) and len(value) != len(current)
+            ):
+                self.store.version += 1
+        self._items[key] = value
+
+    def __delitem__(self, key):
+        self._release(key)
+        self._items.pop(key)
+        self.store.version += 1
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def to_dict(self):
+        """Copy into plain nested dictionaries, with vectors as lists"""
+        d = {}
+        for k in self._items:
+            v = self[k]
+            if isinstance(v, StateDict):
+                v = v.to_dict()
+            elif isinstance(v, np.ndarray):
+                v = v.tolist()
+            d[k] = v
+        return d
+
+    def __repr__(self):
+        return repr(self.to_dict())
@@ -0,0 +1,238 @@
+# Recordings of the AMR-Wind status stream
+#
+# A run coupled to AMR-Wind can record the status messages the emulator
+# receives from every wind farm ([time, wind_speed, wind_direction] +
+# turbine_powers + turbine_wind_directions), so that later runs can replay them
+# through StatusReplay (see hercules.local_coupling) without AMR-Wind, HELICS or
+# a standin. This is useful for iterating on controllers and py_sims downstream
+# of the wind farm. The replay is open loop: the control messages sent in the
+# replay do not change the recorded wind farm.
+#
+# A recording is a single binary file (little endian):
+#   magic b"HRCSTAT" | version u8 | header length u32 | header (JSON, padded
+#   with spaces to a multiple of 8 bytes) | records float64 x record width
+# The header lists the farms (name and number of turbines, in order) and the
+# time step. Each record is the emulator time followed by the status message of
+# each farm in order, all NaN for a farm whose message was missing. Records are
+# appended as the run goes, and the file is read memory-mapped; a partial record
+# at the end of the file (from an interrupted run) is ignored.
+#
+# Usage: python -m hercules.status_recording <log_csv_file> <recording_file> <farm_name>
+# converts the AMR-Wind log CSV of a farm (named as in hercules_comms) to a
+# recording.
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+import pandas as pd
+
+RECORDING_VERSION = 1
+_MAGIC = b"HRCSTAT"
+_PREFIX = struct.Struct("<7sBI")
+
+
+def status_message_length(num_turbines):
+    """Length of the status message of a farm of num_turbines turbines"""
+    return 3 + 2 * num_turbines
+
+
+class StatusRecorder:
+    """
+    Writes the status messages of the wind farms, one record per call to record.
+
+    Inputs:
+    - path: the recording file, overwritten
+    - farms: dictionary of the number of turbines of each farm, by farm name, in
+        the order of the records
+    - dt: time step of the run (s), stored in the header
+    - resume_records: if given, resume the existing recording instead, keeping
+        its first resume_records records and appending after them (for restarts
+        from a checkpoint). Its header must match farms and dt.
+    """
+
+    def __init__(self, path, farms, dt=None, resume_records=None):
+        self.path = path
+        self.farms = dict(farms)
+        self.record_width = 1 + sum(status_message_length(n) for n in self.farms.values())
+        self.n_records = 0
+
+        header = json.dumps(
+            {
+                "farms": [{"name": name, "num_turbines": n} for name, n in self.farms.items()],
+                "dt": dt,
+            }
+        ).encode()
+        header += b" " * (-(_PREFIX.size + len(header)) % 8)
+        header = _PREFIX.pack(_MAGIC, RECORDING_VERSION, len(header)) + header
+        if resume_records is None:
+            self._file = open(path, "wb")
+            self._file.write(header)
+        else:
+            self._resume(header, resume_records)
+        self._row = np.empty(self.record_width, dtype="<f8")
+
+    def _resume(self, header, resume_records):
+        # Truncate the recording after the records to keep and append from there
+        size = len(header) + 8 * self.record_width * resume_records
+        with open(self.path, "r+b") as f:
+            if f.read(len(header)) != header:
+                raise ValueError(
+                    "Cannot resume {}: its farms or time step do not match.".format(self.path)
+                )
+            if os.path.getsize(self.path) < size:
+                raise ValueError(
+                    "Cannot resume {0}: it has fewer than {1} records.".format(
+                        self.path, resume_records
+                    )
+                )
+            f.truncate(size)
+        self._file = open(self.path, "ab")
+        self.n_records = resume_records
+
+    def record(self, time, status_messages):
+        """
+        Append a record.
+
+        Inputs:
+        - time: emulator time of the messages (s)
+        - status_messages: the status message of each farm, by farm name, or None
+            for a missing message
+        """
+        row = self._row
+        row[0] = time
+        start = 1
+        for name, num_turbines in self.farms.items():
+            stop = start + status_message_length(num_turbines)
+            message = status_messages.get(name)
+            if message is None:
+                row[start:stop] = np.nan
+            elif len(message) != stop - start:
+                raise ValueError(
+                    "Status message of {} has {} values, expected {}.".format(
+                        name, len(message), stop - start
+                    )
+                )
+            else:
+                row[start:stop] = message
+            start = stop
+        self._file.write(row.tobytes())
+        self.n_records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class StatusRecording:
+    """
+    A recording written by StatusRecorder, opened memory-mapped.
+
+    Inputs:
+    - path: the recording file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, header_length = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != _MAGIC:
+                raise ValueError("{} is not a status recording.".format(path))
+            if version != RECORDING_VERSION:
+                raise ValueError(
+                    "Status recording version {} of {} is not supported.".format(version, path)
+                )
+            header = json.loads(f.read(header_length))
+        self.farms = {farm["name"]: farm["num_turbines"] for farm in header["farms"]}
+        self.farm_names = list(self.farms)
+        self.dt = header["dt"]
+
+        # Slice of each farm's status message in a record
+        self.farm_slices = {}
+        start = 1
+        for name, num_turbines in self.farms.items():
+            stop = start + status_message_length(num_turbines)
+            self.farm_slices[name] = slice(start, stop)
+            start = stop
+        self.record_width = start
+
+        offset = _PREFIX.size + header_length
+        n_records = (os.path.getsize(path) - offset) // (8 * self.record_width)
+        if n_records > 0:
+            self.records = np.memmap(
+                path, dtype="<f8", mode="r", offset=offset, shape=(n_records, self.record_width)
+            )
+        else:
+            self.records = np.zeros((0, self.record_width))
+
+    @property
+    def times(self):
+        return self.records[:, 0]
+
+    def __len__(self):
+        return len(self.records)
+
+    def find(self, time):
+        """Index of the (last) record at time, or None if there is none"""
+        times = self.times
+        index = np.searchsorted(times, time, side="right") - 1
+        if index < 0 or abs(times[index] - time) > 1e-6:
+            return None
+        return int(index)
+
+    def status_message(self, index, farm_name):
+        """The status message of farm_name in record index, as a list, or None if
+        it was missing"""
+        values = self.records[index, self.farm_slices[farm_name]]
+        if np.isnan(values).all():
+            return None
+        return [float(v) for v in values]
+
+
+def recording_from_log_files(path, log_files, dt=None):
+    """
+    Write a recording from the AMR-Wind log CSV files of a run (one per farm, with
+    columns helics_time, AMRwind_time, AMRWind_speed, AMRWind_direction, power_<i>
+    and turbine_wd_direction_<i>). The logs of all farms must have the same
+    helics_time column.
+
+    Inputs:
+    - path: the recording file
+    - log_files: the log CSV file of each farm, by farm name
+    - dt: time step of the run (s), stored in the header
+    """
+    logs = {name: pd.read_csv(log_file) for name, log_file in log_files.items()}
+    times = None
+    messages = {}
+    for name, log in logs.items():
+        power_columns = [c for c in log.columns if c.startswith("power_")]
+        wd_columns = [c for c in log.columns if c.startswith("turbine_wd_direction_")]
+        columns = ["AMRwind_time", "AMRWind_speed", "AMRWind_direction"]
+        messages[name] = log[columns + power_columns + wd_columns].to_numpy(dtype=float)
+        if times is None:
+            times = log["helics_time"].to_numpy(dtype=float)
+        elif not np.array_equal(times, log["helics_time"].to_numpy(dtype=float)):
+            raise ValueError("The logs of the wind farms do not have the same times.")
+
+    recorder = StatusRecorder(
+        path, {name: (m.shape[1] - 3) // 2 for name, m in messages.items()}, dt
+    )
+    try:
+        for i, time in enumerate(times):
+            recorder.record(time, {name: m[i] for name, m in messages.items()})
+    finally:
+        recorder.close()
+    return StatusRecording(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        raise Exception(
+            "Usage: python -m hercules.status_recording <log_csv_file> <recording_file> <farm_name>"
+        )
+    recording = recording_from_log_files(sys.argv[2], {sys.argv[3]: sys.argv[1]})
+    print("Wrote {} status records to {}".format(len(recording), recording.path))
@@ -0,0 +1,77 @@
+# Interpolation of time series at an advancing simulation time
+#
+# Standins interpolate their data (wind speed, wind direction and turbine
+# powers) at the simulation time of every step. TimeSeriesCursor holds all the
+# channels of a series in one numpy array and remembers the interval of the
+# previous lookup, so that, as simulation time advances, each lookup moves the
+# cursor forward by a step or two rather than searching the whole series, and
+# all channels are interpolated together.
+
+import numpy as np
+
+
+class TimeSeriesCursor:
+    """
+    Linear interpolation of several channels of a time series, with the same
+    results as np.interp for each channel (values are held constant outside the
+    range of times).
+
+    Lookups are fastest when times are non-decreasing between calls; an earlier
+    time (e.g. after a restart) falls back to a binary search.
+
+    Inputs:
+    - times: times of the samples, increasing
+    - values: array of shape (len(times), n_channels) (or (len(times),) for a
+        single channel). It is not copied, so it may be memory-mapped.
+    - channels: optional names of the channels
+    """
+
+    def __init__(self, times, values, channels=None):
+        self.times = np.ascontiguousarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1:
+            values = values[:, None]
+        self.values = values
+        if len(self.times) == 0 or len(self.times) != len(self.values):
+            raise ValueError("times and values must have the same, nonzero, length.")
+        if np.any(np.diff(self.times) < 0):
+            raise ValueError("times must be increasing.")
+        self.channels = list(channels) if channels is not None else None
+        self._index = 0
+
+    @classmethod
+    def from_dataframe(cls, df, columns, time_column="time"):
+        """Cursor over the given columns of a DataFrame"""
+        return cls(
+            df[time_column].to_numpy(),
+            np.ascontiguousarray(df[list(columns)].to_numpy(dtype=float)),
+            columns,
+        )
+
+    def channel_index(self, channel):
+        """Index of a named channel in the interpolated values"""
+        return self.channels.index(channel)
+
+    def interpolate(self, time):
+        """Values of all channels at time"""
+        times = self.times
+        n = len(times)
+        if time <= times[0]:
+            self._index = 0
+            return self.values[0].copy()
+        if time >= times[-1]:
+            self._index = n - 1
+            return self.values[-1].copy()
+
+        # Find i with times[i] <= time < times[i + 1], moving forward from the last lookup
+        i = self._index
+        n_forward = 0
+        while times[i] <= time and times[i + 1] <= time and n_forward < 8:
+            i += 1
+            n_forward += 1
+        if not times[i] <= time < times[i + 1]:
+            i = int(np.searchsorted(times, time, side="right")) - 1
+        self._index = i
+
+        slope = (self.values[i + 1] - self.values[i]) / (times[i + 1] - times[i])
+        return slope * (time - times[i]) + self.values[i]
@@ -0,0 +1,163 @@
+# Timing instrumentation for the Hercules emulator
+#
+# A StepTimer records how long each named phase of a time step takes (e.g. the
+# controller, each py_sim, the HELICS sync wait). Durations are measured with
+# perf_counter_ns and accumulated into histograms with logarithmically spaced
+# bins, so percentiles can be reported at any point without storing every
+# sample. When the timer is disabled, phase() returns a shared null context
+# and nothing is measured.
+
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+# Histogram bins: 8 bins per factor of two, from 100 ns to ~1.7 hours
+_BINS_PER_OCTAVE = 8
+_MIN_NS = 100
+_N_BINS = 8 * 36
+_NULL_CONTEXT = nullcontext()
+
+
+class PhaseHistogram:
+    """
+    Running histogram of the durations of one phase.
+
+    Percentiles are resolved to the upper edge of their bin, i.e. to within
+    about 9% of the true value. The count, total and maximum are exact.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(_N_BINS, dtype=np.int64)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+        # Totals since the last call to pop_window_mean
+        self._window_count = 0
+        self._window_total_ns = 0
+
+    def add(self, duration_ns):
+        if duration_ns > _MIN_NS:
+            b = int(_BINS_PER_OCTAVE * np.log2(duration_ns / _MIN_NS)) + 1
+            b = min(b, _N_BINS - 1)
+        else:
+            b = 0
+        self.counts[b] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        self._window_count += 1
+        self._window_total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, q):
+        """Duration (ns) below which a fraction q of the samples fall"""
+        if self.count == 0:
+            return np.nan
+        b = int(np.searchsorted(np.cumsum(self.counts), q * self.count))
+        upper_ns = _MIN_NS * 2.0 ** (b / _BINS_PER_OCTAVE)
+        return min(upper_ns, self.max_ns)
+
+    def pop_window_mean(self):
+        """Mean duration (ns) since the last call, NaN if no samples"""
+        if self._window_count == 0:
+            return np.nan
+        mean_ns = self._window_total_ns / self._window_count
+        self._window_count = 0
+        self._window_total_ns = 0
+        return mean_ns
+
+
+class _Phase:
+    # Context manager timing one occurrence of a phase
+    __slots__ = ["histogram", "start_ns"]
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.add(time.perf_counter_ns() - self.start_ns)
+        return False
+
+
+class StepTimer:
+    """
+    Per-phase timer for the emulator main loop.
+
+    Usage:
+        with timer.phase("controller"):
+            controller.step(main_dict)
+
+    Inputs:
+    - enabled: if False, phase() does nothing and summary() is empty
+    - phases: optional list of phase names to register up front, so that they
+        appear (in this order) in the summary and window means even before
+        they are first timed
+    """
+
+    def __init__(self, enabled=True, phases=None):
+        self.enabled = enabled
+        self.histograms = {}
+        if phases is not None:
+            self.register(phases)
+
+    def register(self, phases):
+        """Make sure a histogram exists for each of phases"""
+        for name in phases:
+            if name not in self.histograms:
+                self.histograms[name] = PhaseHistogram()
+
+    def phase(self, name):
+        """Context manager timing the enclosed block as one occurrence of phase name"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        if name not in self.histograms:
+            self.histograms[name] = PhaseHistogram()
+        return _Phase(self.histograms[name])
+
+    def summary(self):
+        """
+        Dictionary of phase name to timing statistics in milliseconds: count,
+        mean, p50, p95, max and total.
+        """
+        summary = {}
+        for name, h in self.histograms.items():
+            summary[name] = {
+                "count": h.count,
+                "mean_ms": h.total_ns / h.count / 1e6 if h.count else np.nan,
+                "p50_ms": h.percentile(0.50) / 1e6,
+                "p95_ms": h.percentile(0.95) / 1e6,
+                "max_ms": h.max_ns / 1e6 if h.count else np.nan,
+                "total_s": h.total_ns / 1e9,
+            }
+        return summary
+
+    def format_summary(self):
+        """The summary as a table of text"""
+        lines = [
+            "{:<32}{:>10}{:>12}{:>12}{:>12}{:>12}{:>12}".format(
+                "phase", "count", "mean_ms", "p50_ms", "p95_ms", "max_ms", "total_s"
+            )
+        ]
+        for name, s in self.summary().items():
+            lines.append(
+                "{:<32}{:>10d}{:>12.3f}{:>12.3f}{:>12.3f}{:>12.3f}{:>12.3f}".format(
+                    name,
+                    s["count"],
+                    s["mean_ms"],
+                    s["p50_ms"],
+                    s["p95_ms"],
+                    s["max_ms"],
+                    s["total_s"],
+                )
+            )
+        return "\n".join(lines)
+
+    def pop_window_means(self):
+        """Mean duration (ms) of each phase since the last call"""
+        return {name: h.pop_window_mean() / 1e6 for name, h in self.histograms.items()}
@@ -7,13 +7,21 @@ TODO:
 """
 
 import os
+import re
 import sys
+from concurrent.futures import as_completed, ProcessPoolExecutor
 
 import matplotlib.pyplot as plt
 import netCDF4 as ncdf
 import numpy as np
 import pandas as pd
-from hercules.amr_wind_standin import read_amr_wind_input
+from hercules.amr_wind_input import read_amr_wind_input
+from hercules.standin_data import (
+    open_standin_data_bundle,
+    save_standin_data_bundle,
+    StandinDataBundle,
+)
+from hercules.tools.synthetic_inflow import SyntheticInflow
 from hercules.utilities import load_yaml
 
 
@@ -45,9 +53,11 @@ class StandinData:
         if self.method == "user":
             self.from_user_definition(**user_inputs)
         elif self.method == "amr_actuator":
-            self.from_amr_actuators()
+            self.from_amr_actuators(**(user_inputs or {}))
         elif self.method == "amr_openfast":
             self.from_amr_openfast()
+        elif self.method == "synthetic":
+            self.from_synthetic_inflow(**(user_inputs or {}))
 
     def from_user_definition(
         self,
@@ -69,83 +79,145 @@ class StandinData:
             amr_wind_speed = np.linspace(0, 20, len(time))
             amr_wind_direction = np.linspace(200, 240, len(time))
 
-            turbine_powers = np.zeros([len(time), self.num_turbines])
-
-            for i in range(len(time)):
-                turb_powers = (
-                    np.ones(self.num_turbines) * amr_wind_speed[i] ** 3
-                    + np.random.rand(self.num_turbines) * 50
-                )
-                turb_powers[int(self.num_turbines / 2) :] = (
-                    0.75 * turb_powers[int(self.num_turbines / 2) :]
-                )
-                turb_powers = [np.min([turb_rating, tp]) for tp in turb_powers]
-                turbine_powers[i, :] = turb_powers
+            turbine_powers = (
+                amr_wind_speed[:, None] ** 3 + np.random.rand(len(time), self.num_turbines) * 50
+            )
+            turbine_powers[:, int(self.num_turbines / 2) :] *= 0.75
+            turbine_powers = np.minimum(turbine_powers, turb_rating)
 
         self.time = time
         self.amr_wind_speed = amr_wind_speed
         self.amr_wind_direction = amr_wind_direction
         self.turbine_powers = turbine_powers
 
-    def from_amr_actuators(self):
-        case_folder = self.amr_data_path
-
-        # TODO: make this more general. It might not be "actuator14400"
-        actuator_dir = os.path.join(case_folder, "post_processing/actuator14400")
+    def from_synthetic_inflow(self, bundle_path=None, chunk_size=100000, **inflow_inputs):
+        """
+        Generate synthetic inflow and turbine powers over the time of the hercules
+        input, with SyntheticInflow (see hercules.tools.synthetic_inflow).
+
+        Inputs:
+        - bundle_path: if given, the series is written to a standin data bundle at
+            this path in chunks of chunk_size steps, and read back memory-mapped, so
+            that it may be larger than memory
+        - inflow_inputs: arguments of SyntheticInflow, e.g. mean_wind_speed,
+            turbulence_intensity, gust_rate and seed
+        """
+        inflow = SyntheticInflow(
+            self.num_turbines, self.time_delta, start_time=self.time_start, **inflow_inputs
+        )
+        n_steps = len(np.arange(self.time_start, self.time_stop, self.time_delta))
+
+        if bundle_path is not None:
+            inflow.write_bundle(bundle_path, n_steps, chunk_size)
+            bundle = StandinDataBundle(bundle_path)
+            self.time = bundle.times
+            self.amr_wind_speed = bundle["amr_wind_speed"]
+            self.amr_wind_direction = bundle["amr_wind_direction"]
+            self.turbine_powers = bundle.turbine_powers
+            return
+
+        series = inflow.generate(n_steps)
+        self.time = series["time"]
+        self.amr_wind_speed = series["amr_wind_speed"]
+        self.amr_wind_direction = series["amr_wind_direction"]
+        self.turbine_powers = series["turbine_powers"]
+
+    def from_amr_actuators(
+        self,
+        actuator_dir=None,
+        time_window=None,
+        decimation=1,
+        n_workers=None,
+        bundle_path=None,
+    ):
+        # Read the wind speed, wind direction and power of each turbine from the
+        # AMR-Wind actuator netCDF files (one per turbine, found under amr_out_path
+        # unless actuator_dir is given). The files are read in a pool of n_workers
+        # processes (default: one per CPU; 1 reads them in this process), keeping
+        # only the samples with time in time_window = (start, stop) and then every
+        # decimation-th sample; the selection is applied in the netCDF reads.
+        # If bundle_path is given, each turbine is written to a standin data bundle
+        # there as soon as it is read, rather than held in memory.
+        actuator_files = find_actuator_files(self.amr_data_path, actuator_dir)
 
         # TODO: if there are a different number of actuators in the amr data files
         #       and the amr input file, raise an error. They probably do not belong
         #       to the same run
-        actuators = os.listdir(os.path.join(case_folder, actuator_dir))
-
-        actuator_data = []
-        for actuator_name in actuators:
-            rootgrp = ncdf.Dataset(
-                os.path.join(os.path.join(case_folder, actuator_dir), actuator_name),
-                "r",
-                format="NETCDF4",
-            )
-
-            rootgrp_name = list(rootgrp.groups.keys())[0]
-
-            # What is the difference between vref and vdisk?
-            # vref = rootgrp["/".join([rootgrp_name, "vref"])][:]
-            vdisk = rootgrp["/".join([rootgrp_name, "vdisk"])][:]
-
-            v_abs = np.linalg.norm(vdisk, axis=1)
-            # What direction is 0 degrees?
-            v_direction = 360 / (2 * np.pi) * np.arctan2(vdisk[:, 1], vdisk[:, 0])
 
-            time = rootgrp["/".join([rootgrp_name, "time"])][:]
-            power = rootgrp["/".join([rootgrp_name, "power"])][:]
-
-            actuator_data.append(
-                {
-                    "actuator_name": rootgrp_name,
-                    "time": time,
-                    "v_direction": v_direction,
-                    "v_abs": v_abs,
-                    "power": power,
+        # Read the times first, to allocate the outputs
+        time = _read_actuator_times(actuator_files[0], time_window, decimation)
+        n_turbines = len(actuator_files)
+        if bundle_path is not None:
+            times, values = open_standin_data_bundle(bundle_path, len(time), n_turbines)
+            times[:] = time
+        else:
+            values = np.zeros((len(time), 2 + n_turbines))
+
+        # The wind speed and direction are averaged over the turbines. They are
+        # summed in turbine order, whatever order the files are read in, so that
+        # the result does not depend on the pool; the winds of files read ahead of
+        # their turn wait in pending.
+        pending = {}
+        n_added = 0
+
+        def add_actuator(i, actuator_data):
+            nonlocal n_added
+            if not np.array_equal(actuator_data["time"], time):
+                raise ValueError(
+                    "The times of {} differ from those of {}.".format(
+                        actuator_files[i], actuator_files[0]
+                    )
+                )
+            values[:, 2 + i] = actuator_data["power"]
+            pending[i] = (actuator_data["v_abs"], actuator_data["v_direction"])
+            while n_added in pending:
+                v_abs, v_direction = pending.pop(n_added)
+                values[:, 0] += v_abs
+                values[:, 1] += v_direction
+                n_added += 1
+
+        if n_workers == 1:
+            for i, actuator_file in enumerate(actuator_files):
+                add_actuator(i, _read_actuator_file(actuator_file, time_window, decimation))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = {
+                    executor.submit(_read_actuator_file, f, time_window, decimation): i
+                    for i, f in enumerate(actuator_files)
                 }
-            )
-
-        if (actuator_data[1]["time"] == actuator_data[0]["time"]).all():
-            time = actuator_data[0]["time"]
-
-        amr_wind_speed = np.mean([ad["v_abs"] for ad in actuator_data], axis=0)
-        amr_wind_direction = np.mean([ad["v_direction"] for ad in actuator_data], axis=0)
+                for future in as_completed(futures):
+                    add_actuator(futures[future], future.result())
+        values[:, :2] /= n_turbines
 
-        powers = np.stack([ad["power"] for ad in actuator_data], axis=1)
+        if bundle_path is not None:
+            values.flush()
+            bundle = StandinDataBundle(bundle_path)
+            time = bundle.times
+            values = bundle.values
 
         self.time = time
-        self.amr_wind_speed = amr_wind_speed
-        self.amr_wind_direction = amr_wind_direction
-        self.turbine_powers = powers
+        self.amr_wind_speed = values[:, 0]
+        self.amr_wind_direction = values[:, 1]
+        self.turbine_powers = values[:, 2:]
 
     def from_amr_openfast(self):
         pass
 
-    def save(self):
+    def save(self, file_format="csv"):
+        # "csv" writes save_name in save_path; "bundle" writes a binary bundle
+        # directory named after save_name without its extension
+        if file_format == "bundle":
+            save_standin_data_bundle(
+                os.path.join(
+                    self.standin_data_save_path, os.path.splitext(self.standin_data_save_name)[0]
+                ),
+                self.time,
+                self.amr_wind_speed,
+                self.amr_wind_direction,
+                self.turbine_powers,
+            )
+            return
+
         df_dict = {
             "time": self.time,
             "amr_wind_speed": self.amr_wind_speed,
@@ -183,6 +255,89 @@ class StandinData:
         self.time_delta = hercules_input["dt"]
 
 
+def find_actuator_files(case_folder, actuator_dir=None):
+    """
+    The actuator netCDF files of an AMR-Wind run, one per turbine, in natural
+    order of their names. Unless actuator_dir (relative to case_folder) is
+    given, the directories named actuator<step> anywhere under case_folder are
+    searched, and the one with the latest step is used.
+    """
+    if actuator_dir is None:
+        actuator_dirs = []
+        for root, dirs, _ in os.walk(case_folder):
+            actuator_dirs += [
+                os.path.join(root, d) for d in dirs if re.fullmatch(r"actuator\d*", d)
+            ]
+        if not actuator_dirs:
+            raise FileNotFoundError("No actuator directory found in {}.".format(case_folder))
+        actuator_dir = max(
+            actuator_dirs,
+            key=lambda d: int(os.path.basename(d)[len("actuator") :] or -1),
+        )
+        if len(actuator_dirs) > 1:
+            print(
+                "Found {} actuator directories, using {}.".format(len(actuator_dirs), actuator_dir)
+            )
+    else:
+        actuator_dir = os.path.join(case_folder, actuator_dir)
+
+    actuator_files = sorted(
+        (os.path.join(actuator_dir, f) for f in os.listdir(actuator_dir) if f.endswith(".nc")),
+        key=_natural_key,
+    )
+    if not actuator_files:
+        raise FileNotFoundError("No actuator files found in {}.".format(actuator_dir))
+    return actuator_files
+
+
+def _natural_key(name):
+    # Sort key ordering the numbers in names by value (T2 before T10)
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def _select_samples(time, time_window, decimation):
+    # Slice of the samples with time in time_window, keeping every decimation-th one
+    start, stop = 0, len(time)
+    if time_window is not None:
+        start = int(np.searchsorted(time, time_window[0], side="left"))
+        stop = int(np.searchsorted(time, time_window[1], side="right"))
+    return slice(start, stop, int(decimation))
+
+
+def _read_actuator_times(actuator_file, time_window=None, decimation=1):
+    # The selected sample times of an actuator file
+    with ncdf.Dataset(actuator_file, "r", format="NETCDF4") as rootgrp:
+        time = rootgrp[list(rootgrp.groups.keys())[0]]["time"][:]
+    return np.asarray(time[_select_samples(time, time_window, decimation)], dtype=float)
+
+
+def _read_actuator_file(actuator_file, time_window=None, decimation=1):
+    # Read the selected samples of the time, rotor disk velocity and power of one
+    # actuator file (run in the worker processes of from_amr_actuators). Only the
+    # time is read in full; the other variables are read for the selection only.
+    with ncdf.Dataset(actuator_file, "r", format="NETCDF4") as rootgrp:
+        rootgrp_name = list(rootgrp.groups.keys())[0]
+        time = rootgrp["/".join([rootgrp_name, "time"])][:]
+        selection = _select_samples(time, time_window, decimation)
+
+        # What is the difference between vref and vdisk?
+        # vref = rootgrp["/".join([rootgrp_name, "vref"])][:]
+        vdisk = rootgrp["/".join([rootgrp_name, "vdisk"])][selection, :]
+        power = rootgrp["/".join([rootgrp_name, "power"])][selection]
+
+    v_abs = np.linalg.norm(vdisk, axis=1)
+    # What direction is 0 degrees?
+    v_direction = 360 / (2 * np.pi) * np.arctan2(vdisk[:, 1], vdisk[:, 0])
+
+    return {
+        "actuator_name": rootgrp_name,
+        "time": np.asarray(time[selection], dtype=float),
+        "v_direction": np.asarray(v_direction, dtype=float),
+        "v_abs": np.asarray(v_abs, dtype=float),
+        "power": np.asarray(power, dtype=float),
+    }
+
+
 # Example usage
 if __name__ == "__main__":
  
@@ -222,14 +377,9 @@ if __name__ == "__main__":
     amr_wind_speed = np.linspace(0, 20, len(time))
     amr_wind_direction = np.linspace(200, 240, len(time))
 
-    turbine_powers = np.zeros([len(time), num_turbines])
-    for i in range(len(time)):
-        turb_powers = (
-            np.ones(num_turbines) * amr_wind_speed[i] ** 3 + np.random.rand(num_turbines) * 50
-        )
-        turb_powers[int(num_turbines / 2) :] = 0.75 * turb_powers[int(num_turbines / 2) :]
-        turb_powers = [np.min([turb_rating, tp]) for tp in turb_powers]
-        turbine_powers[i, :] = turb_powers
+    turbine_powers = amr_wind_speed[:, None] ** 3 + np.random.rand(len(time), num_turbines) * 50
+    turbine_powers[:, int(num_turbines / 2) :] *= 0.75
+    turbine_powers = np.minimum(turbine_powers, turb_rating)
 
     my_inputs = {
         "time": time,
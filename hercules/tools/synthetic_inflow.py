@@ -0,0 +1,283 @@
+# Synthetic inflow for standin data
+#
+# Generates long, realistic series of the wind speed at each turbine, the wind
+# direction and the turbine powers, for controller studies run on standin data.
+# The wind speed is the mean wind speed plus turbulence with a Kaimal or von
+# Karman spectrum (a part shared by all turbines and a part local to each) and
+# gust events; the wind direction follows a mean-reverting random walk
+# (Ornstein-Uhlenbeck process) around the mean direction.
+#
+# Turbulence and direction are white noise filtered by a convolution kernel
+# (FFT convolution of all turbines at once), carrying the end of the noise from
+# one chunk to the next. The series can therefore be generated in chunks of any
+# size, giving the same values as in one go, and written to a standin data
+# bundle larger than memory. All randomness comes from seed.
+
+import numpy as np
+from hercules.standin_data import open_standin_data_bundle
+
+SPECTRA = ["kaimal", "von_karman"]
+
+# IEC 61400-1 turbulence length scales for hub heights above 60 m (m)
+DEFAULT_LENGTH_SCALES = {"kaimal": 8.1 * 42.0, "von_karman": 3.5 * 42.0}
+
+
+def kaimal_spectrum(frequencies, mean_wind_speed, sigma, length_scale):
+    """One-sided Kaimal power spectral density of the longitudinal wind speed
+    ((m/s)^2/Hz) at frequencies (Hz)"""
+    t = length_scale / mean_wind_speed
+    return sigma**2 * 4 * t / (1 + 6 * frequencies * t) ** (5 / 3)
+
+
+def von_karman_spectrum(frequencies, mean_wind_speed, sigma, length_scale):
+    """One-sided von Karman power spectral density of the longitudinal wind
+    speed ((m/s)^2/Hz) at frequencies (Hz)"""
+    t = length_scale / mean_wind_speed
+    return sigma**2 * 4 * t / (1 + 70.8 * (frequencies * t) ** 2) ** (5 / 6)
+
+
+def spectral_kernel(spectrum, dt, n_kernel, variance):
+    """
+    Convolution kernel of n_kernel samples which, applied to unit white noise,
+    gives a process with the shape of the power spectral density spectrum (a
+    function of frequency, Hz) at the frequencies resolved by the kernel length,
+    and the given variance.
+    """
+    frequencies = np.fft.rfftfreq(n_kernel, dt)
+    kernel = np.fft.fftshift(np.fft.irfft(np.sqrt(spectrum(frequencies)), n_kernel))
+    if variance == 0:
+        return np.zeros(n_kernel)
+    return kernel * np.sqrt(variance / np.sum(kernel**2))
+
+
+class FilteredNoise:
+    """
+    White noise filtered by a convolution kernel, for several independent
+    channels, generated in consecutive chunks.
+
+    Inputs:
+    - kernel: convolution kernel
+    - n_channels: number of independent channels
+    - rng: numpy Generator, used only by this object
+    """
+
+    def __init__(self, kernel, n_channels, rng):
+        self.kernel = np.asarray(kernel, dtype=float)
+        self.n_channels = n_channels
+        self.rng = rng
+        self._history = rng.standard_normal((len(self.kernel) - 1, n_channels))
+
+    def next(self, n):
+        """The next n samples, shape (n, n_channels)"""
+        noise = np.concatenate([self._history, self.rng.standard_normal((n, self.n_channels))])
+        n_kernel = len(self.kernel)
+        n_fft = 1 << int(np.ceil(np.log2(len(noise))))
+        filtered = np.fft.irfft(
+            np.fft.rfft(noise, n_fft, axis=0) * np.fft.rfft(self.kernel, n_fft)[:, None],
+            n_fft,
+            axis=0,
+        )[n_kernel - 1 : n_kernel - 1 + n]
+        self._history = noise[len(noise) - (n_kernel - 1) :]
+        return filtered
+
+
+class SyntheticInflow:
+    """
+    Generator of synthetic wind speeds, wind direction and turbine powers.
+
+    Consecutive calls to generate continue the series. The values do not depend
+    on how the series is split into chunks.
+
+    Inputs:
+    - n_turbines: number of turbines
+    - dt: time step (s)
+    - mean_wind_speed: mean wind speed (m/s)
+    - turbulence_intensity: standard deviation of the turbulence over the mean
+        wind speed
+    - spectrum: turbulence spectrum, "kaimal" or "von_karman"
+    - length_scale: turbulence length scale (m). Defaults to the IEC 61400-1
+        value for the spectrum.
+    - turbine_coherence: fraction of the turbulence variance shared by all
+        turbines, in [0, 1]
+    - mean_wind_direction: mean wind direction (deg)
+    - direction_std: standard deviation of the wind direction (deg)
+    - direction_time_scale: time over which the wind direction returns to the mean (s)
+    - gust_rate: mean number of gusts per hour, over the whole farm
+    - gust_amplitude: mean peak wind speed increase of a gust (m/s)
+    - gust_duration: duration of a gust (s)
+    - turbine_rating: rated power of the turbines (kW)
+    - rated_wind_speed, cut_in_wind_speed, cut_out_wind_speed: wind speeds (m/s)
+        of the turbines' power curve, which is cubic between cut in and rated
+    - kernel_duration: length of the turbulence filter (s). Turbulence at lower
+        frequencies is not represented. Defaults to 20 integral time scales, and
+        at least 600 s.
+    - start_time: time of the first step (s)
+    - seed: seed of the random numbers
+    """
+
+    def __init__(
+        self,
+        n_turbines,
+        dt,
+        mean_wind_speed=8.0,
+        turbulence_intensity=0.1,
+        spectrum="kaimal",
+        length_scale=None,
+        turbine_coherence=0.5,
+        mean_wind_direction=270.0,
+        direction_std=5.0,
+        direction_time_scale=600.0,
+        gust_rate=0.0,
+        gust_amplitude=5.0,
+        gust_duration=10.5,
+        turbine_rating=5000.0,
+        rated_wind_speed=11.4,
+        cut_in_wind_speed=3.0,
+        cut_out_wind_speed=25.0,
+        kernel_duration=None,
+        start_time=0.0,
+        seed=None,
+    ):
+        if spectrum not in SPECTRA:
+            raise ValueError("spectrum must be one of {}, received '{}'.".format(SPECTRA, spectrum))
+        if not 0 <= turbine_coherence <= 1:
+            raise ValueError("turbine_coherence must be in [0, 1].")
+        if length_scale is None:
+            length_scale = DEFAULT_LENGTH_SCALES[spectrum]
+        if kernel_duration is None:
+            kernel_duration = max(20 * length_scale / mean_wind_speed, 600.0)
+
+        self.n_turbines = n_turbines
+        self.dt = dt
+        self.mean_wind_speed = mean_wind_speed
+        self.turbine_coherence = turbine_coherence
+        self.mean_wind_direction = mean_wind_direction
+        self.gust_rate = gust_rate
+        self.gust_amplitude = gust_amplitude
+        self.gust_duration = gust_duration
+        self.turbine_rating = turbine_rating
+        self.rated_wind_speed = rated_wind_speed
+        self.cut_in_wind_speed = cut_in_wind_speed
+        self.cut_out_wind_speed = cut_out_wind_speed
+
+        # Independent random streams for each component, so that, e.g., turning
+        # on gusts does not change the turbulence
+        turbulence_rng, direction_rng, self._gust_rng = [
+            np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(3)
+        ]
+
+        # Turbulence: one shared channel and one local channel per turbine
+        spectrum_function = {"kaimal": kaimal_spectrum, "von_karman": von_karman_spectrum}[spectrum]
+        sigma = turbulence_intensity * mean_wind_speed
+        n_kernel = max(int(round(kernel_duration / dt)), 2)
+        self._turbulence = FilteredNoise(
+            spectral_kernel(
+                lambda f: spectrum_function(f, mean_wind_speed, sigma, length_scale),
+                dt,
+                n_kernel,
+                sigma**2,
+            ),
+            n_turbines + 1,
+            turbulence_rng,
+        )
+
+        # Wind direction: an exponential (Ornstein-Uhlenbeck) kernel, truncated
+        # after 10 time scales
+        a = np.exp(-dt / direction_time_scale)
+        n_direction = max(int(np.ceil(10 * direction_time_scale / dt)), 1)
+        self._direction = FilteredNoise(
+            direction_std * np.sqrt(1 - a**2) * a ** np.arange(n_direction),
+            1,
+            direction_rng,
+        )
+
+        # Gusts: start times and amplitudes of the gusts still in progress, and the
+        # start time of the next gust
+        self._gusts = np.zeros((0, 2))
+        self._next_gust_time = start_time + self._draw_gust_interval()
+
+        self.start_time = start_time
+        self.n_steps = 0
+
+    def _draw_gust_interval(self):
+        if self.gust_rate <= 0:
+            return np.inf
+        return self._gust_rng.exponential(3600.0 / self.gust_rate)
+
+    def _gust_wind_speed(self, times):
+        # Wind speed increase from the gusts at times, adding gusts starting by then
+        new_gusts = []
+        while self._next_gust_time <= times[-1]:
+            amplitude = self.gust_amplitude * self._gust_rng.uniform(0.5, 1.5)
+            new_gusts.append([self._next_gust_time, amplitude])
+            self._next_gust_time += self._draw_gust_interval()
+        if new_gusts:
+            self._gusts = np.concatenate([self._gusts, new_gusts])
+
+        # Each gust only covers a few steps, so add them over their own steps
+        gust_wind_speed = np.zeros(len(times))
+        starts = np.searchsorted(times, self._gusts[:, 0])
+        stops = np.searchsorted(times, self._gusts[:, 0] + self.gust_duration, side="right")
+        for (gust_time, amplitude), start, stop in zip(self._gusts, starts, stops):
+            tau = times[start:stop] - gust_time
+            gust_wind_speed[start:stop] += amplitude * np.sin(np.pi * tau / self.gust_duration) ** 2
+
+        # Keep the gusts not over by the end of the chunk
+        self._gusts = self._gusts[self._gusts[:, 0] + self.gust_duration > times[-1]]
+        return gust_wind_speed
+
+    def turbine_powers(self, wind_speeds):
+        """Turbine powers (kW) at the given wind speeds, from the power curve"""
+        cut_in = self.cut_in_wind_speed
+        fraction = (wind_speeds**3 - cut_in**3) / (self.rated_wind_speed**3 - cut_in**3)
+        powers = self.turbine_rating * np.clip(fraction, 0.0, 1.0)
+        powers[wind_speeds > self.cut_out_wind_speed] = 0.0
+        return powers
+
+    @property
+    def time(self):
+        """Time of the next step to generate (s)"""
+        return self.start_time + self.n_steps * self.dt
+
+    def generate(self, n_steps):
+        """
+        The next n_steps of the series, as a dictionary of arrays: time,
+        amr_wind_speed (mean over the turbines), amr_wind_direction,
+        turbine_wind_speeds and turbine_powers (both of shape (n_steps, n_turbines))
+        """
+        times = self.start_time + (self.n_steps + np.arange(n_steps)) * self.dt
+        self.n_steps += n_steps
+
+        turbulence = self._turbulence.next(n_steps)
+        c = self.turbine_coherence
+        turbine_wind_speeds = (
+            self.mean_wind_speed
+            + np.sqrt(c) * turbulence[:, :1]
+            + np.sqrt(1 - c) * turbulence[:, 1:]
+            + self._gust_wind_speed(times)[:, None]
+        )
+        np.maximum(turbine_wind_speeds, 0.0, out=turbine_wind_speeds)
+
+        wind_direction = np.mod(self.mean_wind_direction + self._direction.next(n_steps)[:, 0], 360)
+
+        return {
+            "time": times,
+            "amr_wind_speed": turbine_wind_speeds.mean(axis=1),
+            "amr_wind_direction": wind_direction,
+            "turbine_wind_speeds": turbine_wind_speeds,
+            "turbine_powers": self.turbine_powers(turbine_wind_speeds),
+        }
+
+    def write_bundle(self, path, n_steps, chunk_size=100000):
+        """Generate the next n_steps in chunks of chunk_size steps, writing them to
+        a standin data bundle at path without holding the series in memory"""
+        times, values = open_standin_data_bundle(path, n_steps, self.n_turbines)
+        for start in range(0, n_steps, chunk_size):
+            stop = min(start + chunk_size, n_steps)
+            chunk = self.generate(stop - start)
+            times[start:stop] = chunk["time"]
+            values[start:stop, 0] = chunk["amr_wind_speed"]
+            values[start:stop, 1] = chunk["amr_wind_direction"]
+            values[start:stop, 2:] = chunk["turbine_powers"]
+        times.flush()
+        values.flush()
@@ -0,0 +1,86 @@
+import os
+from pathlib import Path
+
+import pytest
+from hercules.amr_wind_input import (
+    AMRWindInput,
+    load_amr_wind_input,
+    read_amr_wind_input,
+    tokenize_amr_wind_input,
+)
+
+AMR_INPUT = Path(__file__).resolve().parent / "test_inputs" / "amr_input_florisstandin.inp"
+
+
+def test_tokenize_amr_wind_input():
+    params = tokenize_amr_wind_input(
+        "time.fixed_dt = 0.5  # Use this constant dt\n"
+        "# Actuator.labels = T09\n"
+        "Actuator.labels = T00 T01\n"
+        "incflo.physics = ABL Actuator\n"
+        "time.fixed_dt = 1.0\n"
+        "not a parameter\n"
+    )
+    assert params == {
+        "time.fixed_dt": ["1.0"],
+        "Actuator.labels": ["T00", "T01"],
+        "incflo.physics": ["ABL", "Actuator"],
+    }
+
+
+def test_AMRWindInput():
+    amr_input = AMRWindInput(AMR_INPUT.read_text())
+    assert amr_input.dt == 0.5
+    assert amr_input.stop_time == 100.0
+    assert amr_input.helics_port == 32000
+    assert amr_input.turbine_labels == ["T00", "T01"]
+    assert amr_input.num_turbines == 2
+    assert amr_input.actuator_type == "UniformCtDisk"
+    # The diameter of the actuator type in use, not of the other types in the file
+    assert amr_input.rotor_diameter == 126.0
+    assert amr_input.hub_height == 90.0
+    assert amr_input.density == 1.225
+    assert amr_input.base_positions == [(0.0, 0.0, 0.0), (1000.0, 0.0, 0.0)]
+    assert amr_input.turbine_locations == [(0.0, 0.0), (1000.0, 0.0)]
+    assert len(amr_input.thrust_coefficient) == len(amr_input.wind_speed) == 54
+
+
+def test_AMRWindInput_errors():
+    with pytest.raises(ValueError, match="base_position"):
+        AMRWindInput("Actuator.labels = T00 T01\nActuator.T00.base_position = 0.0 0.0 0.0\n")
+    with pytest.raises(ValueError, match="Broker port"):
+        AMRWindInput("helics.broker_port =\n")
+    with pytest.raises(ValueError, match="stop_time"):
+        AMRWindInput("time.fixed_dt = 0.5\n").require("dt", "stop_time")
+
+
+def test_read_amr_wind_input():
+    assert read_amr_wind_input(AMR_INPUT) == {
+        "dt": 0.5,
+        "num_turbines": 2,
+        "turbine_labels": ["T00", "T01"],
+        "rotor_diameter": 126.0,
+        "turbine_locations": [(0.0, 0.0), (1000.0, 0.0)],
+        "helics_port": 32000,
+        "stop_time": 100.0,
+    }
+
+    # Each call returns a new dictionary
+    settings = read_amr_wind_input(AMR_INPUT)
+    settings["turbine_labels"].append("T02")
+    assert read_amr_wind_input(AMR_INPUT)["turbine_labels"] == ["T00", "T01"]
+
+
+def test_load_amr_wind_input_memoized(tmp_path):
+    amr_input_file = tmp_path / "amr_input.inp"
+    amr_input_file.write_text(AMR_INPUT.read_text())
+    amr_input = load_amr_wind_input(amr_input_file)
+    assert load_amr_wind_input(str(amr_input_file)) is amr_input
+
+    # An edited file is read again
+    amr_input_file.write_text(AMR_INPUT.read_text().replace("32000", "32001"))
+    stat = os.stat(amr_input_file)
+    os.utime(amr_input_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    edited = load_amr_wind_input(amr_input_file)
+    assert edited is not amr_input
+    assert edited.helics_port == 32001
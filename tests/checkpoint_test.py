@@ -0,0 +1,68 @@
+import pickle
+
+import numpy as np
+import pytest
+from hercules.checkpoint import Checkpointer, load_checkpoint, write_atomic
+from hercules.output_reduction import OutputReducer
+from hercules.python_simulators.battery import Battery
+
+
+def test_write_atomic(tmp_path):
+    filename = tmp_path / "checkpoints" / "state.pkl"
+    write_atomic(filename, b"first")
+    write_atomic(filename, b"second")
+    assert filename.read_bytes() == b"second"
+    assert list(filename.parent.iterdir()) == [filename]
+
+
+def test_Checkpointer(tmp_path):
+    filename = tmp_path / "checkpoint.pkl"
+    checkpointer = Checkpointer(filename)
+
+    state = {"time": 10.0, "values": [1.0, 2.0]}
+    checkpointer.save(state)
+
+    # The state is snapshot when saved, so later changes are not checkpointed
+    state["values"].append(3.0)
+    checkpointer.wait()
+    assert checkpointer.n_saved == 1
+    assert load_checkpoint(filename) == {"time": 10.0, "values": [1.0, 2.0]}
+
+    # Files that are not checkpoints are rejected
+    with open(tmp_path / "other.pkl", "wb") as f:
+        pickle.dump([1, 2, 3], f)
+    with pytest.raises(ValueError):
+        load_checkpoint(tmp_path / "other.pkl")
+
+
+def test_Checkpointer_restores_py_sim_state(tmp_path):
+    # Checkpoint a battery and an output reducer part way through and check that
+    # both continue exactly as the originals do
+    battery_dict = {
+        "py_sim_type": "LIB",
+        "energy_capacity": 100.0,
+        "charge_rate": 50.0,
+        "discharge_rate": 50.0,
+        "max_SOC": 0.9,
+        "min_SOC": 0.1,
+        "initial_conditions": {"SOC": 0.5},
+    }
+    battery = Battery(battery_dict, 1.0)
+    reducer = OutputReducer("battery", ["soc"], dt=1.0, window=4.0, stats=["mean", "max"])
+    reducer.set_columns(["time", "soc"])
+
+    def step(battery, reducer, t):
+        inputs = {"py_sims": {"inputs": {"battery_signal": 20.0, "available_power": 100.0}}}
+        outputs = battery.step(inputs)
+        return reducer.add(t, np.array([t, outputs["soc"]]))
+
+    for t in range(6):
+        step(battery, reducer, float(t))
+
+    checkpointer = Checkpointer(tmp_path / "checkpoint.pkl", background=False)
+    checkpointer.save({"battery": battery, "reducer": reducer})
+    state = load_checkpoint(tmp_path / "checkpoint.pkl")
+
+    for t in range(6, 12):
+        expected = step(battery, reducer, float(t))
+        assert step(state["battery"], state["reducer"], float(t)) == expected
@@ -1,6 +1,16 @@
+import copy
+import inspect
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 from hercules.controller_standin import ControllerStandin
-from hercules.emulator import Emulator
+from hercules.emulator import Emulator, RUN_OPTIONS
 from hercules.py_sims import PySims
+from hercules.status_recording import StatusRecording
+
+TEST_INPUTS = Path(__file__).resolve().parent / "test_inputs"
 
 # Copy data from hercules_input.yaml into input_dict
 test_input_dict = {
@@ -11,8 +21,7 @@ test_input_dict = {
         "amr_wind": {
             "test_farm": {
                 "type": "amr_wind",
-                # requires running pytest from the top level directory
-                "amr_wind_input_file": "tests/test_inputs/amr_input_florisstandin.inp",
+                "amr_wind_input_file": str(TEST_INPUTS / "amr_input_florisstandin.inp"),
             }
         },
         "helics": {
@@ -55,9 +64,15 @@ test_input_dict = {
     },
 }
 
-def test_Emulator_instantiation():
-    
-    
+# Emulator adds to the dictionaries it is given, so tests that build their own
+# inputs start from this copy
+base_input_dict = copy.deepcopy(test_input_dict)
+
+
+def test_Emulator_instantiation(tmp_path, monkeypatch):
+    # The emulator writes its logs to the working directory
+    monkeypatch.chdir(tmp_path)
+
     controller = ControllerStandin(test_input_dict)
     py_sims = PySims(test_input_dict)
     
@@ -65,10 +80,25 @@ def test_Emulator_instantiation():
 
     # Check default settings
     assert emulator.output_file == "outputs/hercules_output.csv"
+    assert emulator.output_format == "csv"
+    assert emulator.output_flush_interval == 100
+    assert emulator.output_async
+    assert emulator.output_backpressure == "block"
+    assert emulator.message_codec == "text"
+    assert emulator.verbose
+    assert not emulator.timing
+    assert "timing" not in emulator.main_dict
+    assert emulator.coupling == "helics"
+    assert emulator.local_coupling is None
+    assert emulator.output_reducers == []
+    assert emulator.checkpoint_interval is None
+    assert emulator.restart_file is None
+    assert not emulator.state_store
     assert emulator.external_data_all == {}
+    emulator.close_outputs()
 
     test_input_dict_2 = test_input_dict.copy()
-    test_input_dict_2["external_data_file"] = "tests/test_inputs/external_data.csv"
+    test_input_dict_2["external_data_file"] = str(TEST_INPUTS / "external_data.csv")
     test_input_dict_2["output_file"] = "test_output.csv"
     test_input_dict_2["dt"] = 0.5
 
@@ -80,3 +110,138 @@ def test_Emulator_instantiation():
     assert emulator.external_data_all["power_reference"][-1] == 3000
 
     assert emulator.output_file == "test_output.csv"
+    emulator.close_outputs()
+
+
+def test_Emulator_multiple_farms(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    input_dict = copy.deepcopy(base_input_dict)
+    input_dict["hercules_comms"]["amr_wind"]["test_farm_2"] = {
+        "type": "amr_wind",
+        "amr_wind_input_file": str(TEST_INPUTS / "amr_input_florisstandin.inp"),
+        "message_codec": "binary",
+    }
+    controller = ControllerStandin(input_dict)
+    py_sims = PySims(input_dict)
+
+    emulator = Emulator(controller, py_sims, input_dict)
+
+    # Each farm has its own topics, codec and turbine outputs
+    assert emulator.amr_wind_names == ["test_farm", "test_farm_2"]
+    assert emulator.farm_topics["test_farm_2"] == ("control_test_farm_2", "status_test_farm_2")
+    helics_topics = emulator.helics_config_dict["helics"]
+    assert helics_topics["publication_topics"] == ["control_test_farm", "control_test_farm_2"]
+    assert helics_topics["subscription_topics"] == ["status_test_farm", "status_test_farm_2"]
+    assert emulator.message_codecs == {"test_farm": "text", "test_farm_2": "binary"}
+    for name in emulator.amr_wind_names:
+        farm_dict = emulator.main_dict["hercules_comms"]["amr_wind"][name]
+        assert farm_dict["turbine_powers"] == [0.0] * farm_dict["num_turbines"]
+    emulator.close_outputs()
+
+
+def test_Emulator_run_options_not_logged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    input_dict = copy.deepcopy(base_input_dict)
+    input_dict["verbose"] = False
+    input_dict["hercules_comms"]["helics"]["config"]["stoptime"] = 3
+    input_dict["hercules_comms"]["amr_wind"]["test_farm"].update(
+        {
+            "coupling": "local",
+            "amr_standin_data_file": str(TEST_INPUTS / "amr_standin_data.csv"),
+            "smoothing_coefficient": 0.5,
+        }
+    )
+    input_dict.update(
+        {
+            "step_deadline": 10.0,
+            "output_queue_size": 50,
+            "output_flush_interval": 10,
+            "checkpoint_interval": 100,
+            "timing": True,
+            "external_data_file": str(TEST_INPUTS / "external_data.csv"),
+            "external_data_chunksize": 1000,
+        }
+    )
+    emulator = Emulator(ControllerStandin(input_dict), PySims(input_dict), input_dict)
+    emulator.run_local()
+
+    columns = pd.read_csv(emulator.output_file).columns
+    assert "dt" in columns
+    for key in RUN_OPTIONS:
+        assert key not in columns
+    assert "hercules_comms.amr_wind.test_farm.smoothing_coefficient" not in columns
+
+    # RUN_OPTIONS lists every optional key the emulator reads from the input file
+    source = inspect.getsource(Emulator)
+    read_keys = set(re.findall(r'"(\w+)" in (?:input_dict|self\.main_dict)\b', source))
+    assert read_keys == set(RUN_OPTIONS)
+
+
+def test_Emulator_record_and_replay(tmp_path, monkeypatch):
+    # Record the status messages of a locally coupled standin, then replay them
+    monkeypatch.chdir(tmp_path)
+
+    def run(farm_inputs, extra_inputs, output_file):
+        input_dict = copy.deepcopy(base_input_dict)
+        input_dict["verbose"] = False
+        input_dict["output_file"] = str(tmp_path / output_file)
+        input_dict["hercules_comms"]["helics"]["config"]["stoptime"] = 5
+        input_dict["hercules_comms"]["amr_wind"]["test_farm"].update(farm_inputs)
+        input_dict.update(extra_inputs)
+        emulator = Emulator(ControllerStandin(input_dict), PySims(input_dict), input_dict)
+        emulator.run_local()
+        return pd.read_csv(tmp_path / output_file)
+
+    recording_file = tmp_path / "status.rec"
+    standin_inputs = {
+        "coupling": "local",
+        "amr_standin_data_file": str(TEST_INPUTS / "amr_standin_data.csv"),
+    }
+    recorded = run(standin_inputs, {"record_status_file": str(recording_file)}, "recorded.csv")
+    recording = StatusRecording(recording_file)
+    assert recording.farms == {"test_farm": 2}
+    assert len(recording) == len(recorded) + 1
+
+    # The replay needs no standin
+    replayed = run({}, {"replay_status_file": str(recording_file)}, "replayed.csv")
+    pd.testing.assert_frame_equal(
+        replayed.drop(columns="clock_time"), recorded.drop(columns="clock_time")
+    )
+
+    # A restart from a checkpoint resumes the recording
+    checkpoint_inputs = {
+        "record_status_file": str(recording_file),
+        "checkpoint_interval": 4,
+        "checkpoint_file": str(tmp_path / "checkpoint.pkl"),
+    }
+    run(standin_inputs, checkpoint_inputs, "checkpointed.csv")
+    checkpoint_inputs["restart_file"] = checkpoint_inputs["checkpoint_file"]
+    run(standin_inputs, checkpoint_inputs, "checkpointed.csv")
+    np.testing.assert_array_equal(StatusRecording(recording_file).records, recording.records)
+
+
+def test_Emulator_state_store(tmp_path, monkeypatch):
+    # Holding main_dict in a state store does not change the outputs
+    monkeypatch.chdir(tmp_path)
+
+    def run(state_store):
+        input_dict = copy.deepcopy(base_input_dict)
+        input_dict["verbose"] = False
+        input_dict["state_store"] = state_store
+        input_dict["output_file"] = "output_{}.csv".format(state_store)
+        input_dict["hercules_comms"]["helics"]["config"]["stoptime"] = 5
+        input_dict["hercules_comms"]["amr_wind"]["test_farm"].update(
+            {
+                "coupling": "local",
+                "amr_standin_data_file": str(TEST_INPUTS / "amr_standin_data.csv"),
+            }
+        )
+        emulator = Emulator(ControllerStandin(input_dict), PySims(input_dict), input_dict)
+        emulator.run_local()
+        return emulator, pd.read_csv(emulator.output_file).drop(columns="clock_time")
+
+    emulator, outputs = run(True)
+    pd.testing.assert_frame_equal(outputs, run(False)[1])
+    farm_dict = emulator.main_dict["hercules_comms"]["amr_wind"]["test_farm"]
+    assert isinstance(farm_dict["turbine_powers"], list)
+    assert farm_dict.field("turbine_yaw_angles") is not None
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from hercules.external_signals import ExternalSignals
+
+EXTERNAL_DATA = Path(__file__).resolve().parent / "test_inputs" / "external_data.csv"
+
+
+def test_ExternalSignals():
+    external_signals = ExternalSignals(EXTERNAL_DATA, 0, 100, 0.5)
+
+    assert list(external_signals.keys()) == ["time", "power_reference"]
+    assert external_signals["power_reference"][0] == 1000
+    assert external_signals["power_reference"][1] == 1500
+    assert external_signals["power_reference"][2] == 2000
+    assert external_signals["power_reference"][-1] == 3000
+    assert external_signals["time"][-1] == 100.5
+
+    # Lookup by time, tolerant of floating point error in the time
+    assert external_signals.get_signals(0.5) == {"time": 0.5, "power_reference": 1500.0}
+    assert external_signals.get_signals(0.1 + 0.2 + 0.2) == external_signals.get_signals(0.5)
+    assert external_signals.get_row(1000.0)[0] == 100.5
+
+
+def test_ExternalSignals_chunked(tmp_path):
+    # Irregularly sampled data file with two signals
+    rng = np.random.default_rng(0)
+    time = np.sort(rng.uniform(-5, 120, 200))
+    df = pd.DataFrame(
+        {"time": time, "price": rng.normal(size=200), "power_reference": rng.normal(size=200)}
+    )
+    filename = tmp_path / "external_data.csv"
+    df.to_csv(filename, index=False)
+
+    times = np.arange(0, 100 + 2 * 0.25, 0.25)
+    external_signals = ExternalSignals(
+        filename, 0, 100, 0.25, chunksize=7, memmap_file=tmp_path / "external_signals.npy"
+    )
+    assert isinstance(external_signals.data, np.memmap)
+
+    # Chunked interpolation matches interpolating the whole file at once
+    for c in ["price", "power_reference"]:
+        assert np.allclose(external_signals[c], np.interp(times, df.time, df[c]))
+
+    # The memory-mapped signals are saved as a .npy file
+    assert np.allclose(np.load(tmp_path / "external_signals.npy"), external_signals.data)
+
+
+def test_ExternalSignals_no_time(tmp_path):
+    filename = tmp_path / "external_data.csv"
+    pd.DataFrame({"t": [0.0, 1.0], "price": [1.0, 2.0]}).to_csv(filename, index=False)
+    with pytest.raises(ValueError):
+        ExternalSignals(filename, 0, 10, 1)
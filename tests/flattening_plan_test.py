@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from hercules.flattening_plan import FlatteningPlan, StaleFlatteningPlan
+from hercules.state_store import StateStore
+
+
+def make_main_dict():
+    return {
+        "time": 0.0,
+        "name": "test",
+        "hercules_comms": {
+            "amr_wind": {
+                "wind_farm_0": {
+                    "num_turbines": 2,
+                    "turbine_labels": ["T00", "T01"],
+                    "turbine_powers": [1000.0, 800.0],
+                    "turbine_power_setpoints": [None, 500.0],
+                }
+            }
+        },
+        "py_sims": {
+            "battery_0": {"object": object(), "outputs": {"power": 1.0, "soc": 0.5}},
+            "inputs": {"available_power": np.float64(1800.0)},
+        },
+    }
+
+
+def test_FlatteningPlan_columns():
+    plan = FlatteningPlan(make_main_dict())
+
+    assert plan.columns == [
+        "time",
+        "hercules_comms.amr_wind.wind_farm_0.num_turbines",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_powers.000",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_powers.001",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_power_setpoints.000",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_power_setpoints.001",
+        "py_sims.battery_0.outputs.power",
+        "py_sims.battery_0.outputs.soc",
+        "py_sims.inputs.available_power",
+    ]
+    assert plan.added_keys == []
+    assert plan.removed_keys == []
+
+    # Excluded keys are left out with everything below them
+    plan = FlatteningPlan(make_main_dict(), exclude=["time", "py_sims.battery_0"])
+    assert plan.columns[0] == "hercules_comms.amr_wind.wind_farm_0.num_turbines"
+    assert plan.columns[-1] == "py_sims.inputs.available_power"
+    assert len(plan.columns) == 6
+
+
+def test_FlatteningPlan_gather():
+    main_dict = make_main_dict()
+    plan = FlatteningPlan(main_dict)
+
+    row = plan.gather(main_dict)
+    assert np.allclose(
+        row, [0.0, 2, 1000.0, 800.0, np.nan, 500.0, 1.0, 0.5, 1800.0], equal_nan=True
+    )
+
+    # Values are picked up from replaced lists and arrays
+    main_dict["time"] = 1.0
+    main_dict["hercules_comms"]["amr_wind"]["wind_farm_0"]["turbine_powers"] = np.array([5, 6])
+    main_dict["hercules_comms"]["amr_wind"]["wind_farm_0"]["turbine_power_setpoints"] = [1, None]
+    row = plan.gather(main_dict)
+    assert row[0] == 1.0
+    assert (row[2:4] == [5, 6]).all()
+    assert row[4] == 1 and np.isnan(row[5])
+
+    # The same buffer is reused each step
+    assert plan.gather(main_dict) is row
+
+
+def test_FlatteningPlan_stale():
+    main_dict = make_main_dict()
+    plan = FlatteningPlan(main_dict)
+
+    # Added key
+    main_dict["py_sims"]["battery_0"]["outputs"]["reject"] = 0.0
+    with pytest.raises(StaleFlatteningPlan):
+        plan.gather(main_dict)
+
+    # Removed key and changed list length
+    del main_dict["py_sims"]["battery_0"]["outputs"]["soc"]
+    main_dict["hercules_comms"]["amr_wind"]["wind_farm_0"]["turbine_powers"] = [1.0, 2.0, 3.0]
+    with pytest.raises(StaleFlatteningPlan):
+        plan.gather(main_dict)
+
+    # Rebuilding against the existing columns keeps the column order and reports changes
+    plan = FlatteningPlan(main_dict, columns=plan.columns)
+    assert plan.added_keys == [
+        "hercules_comms.amr_wind.wind_farm_0.turbine_powers.002",
+        "py_sims.battery_0.outputs.reject",
+    ]
+    assert plan.removed_keys == ["py_sims.battery_0.outputs.soc"]
+
+    row = plan.gather(main_dict)
+    assert len(row) == 9
+    assert (row[2:4] == [1.0, 2.0]).all()
+    assert np.isnan(row[7])
+
+
+def test_FlatteningPlan_state_store():
+    plain = make_main_dict()
+    main_dict = StateStore.from_dict(make_main_dict())
+
+    # Same columns and values as for the plain dictionary
+    plan = FlatteningPlan(main_dict)
+    assert plan.columns == FlatteningPlan(plain).columns
+    np.testing.assert_array_equal(plan.gather(main_dict), FlatteningPlan(plain).gather(plain))
+
+    farm = main_dict["hercules_comms"]["amr_wind"]["wind_farm_0"]
+    farm["turbine_powers"] = [900.0, 700.0]
+    farm["turbine_power_setpoints"] = [400.0, None]
+    row = plan.gather(main_dict)
+    assert row[2:6].tolist()[:3] == [900.0, 700.0, 400.0]
+    assert np.isnan(row[5])
+
+    # A change of layout makes the plan stale
+    farm["turbine_powers"] = [900.0, 700.0, 500.0]
+    with pytest.raises(StaleFlatteningPlan):
+        plan.gather(main_dict)
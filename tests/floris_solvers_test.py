@@ -0,0 +1,328 @@
+import numpy as np
+import pytest
+from floris import FlorisModel
+from hercules.floris_solvers import (
+    FlorisBatchSolver,
+    FlorisIncrementalSolver,
+    FlorisLookahead,
+    FlorisPowerTable,
+    FlorisSolveCache,
+    heterogeneous_inflow_key,
+    operation_is_default,
+)
+
+
+def make_fmodel():
+    fmodel = FlorisModel(FlorisModel.get_defaults())
+    fmodel.set(
+        layout_x=[0.0, 630.0, 1260.0],
+        layout_y=[0.0, 0.0, 0.0],
+        wind_speeds=[8.0],
+        wind_directions=[270.0],
+        turbulence_intensities=[0.06],
+    )
+    return fmodel
+
+
+def solve(fmodel, wind_speed, wind_direction, yaw_angles=None, power_setpoints=None):
+    fmodel = fmodel.copy()
+    fmodel.set(
+        wind_speeds=[wind_speed],
+        wind_directions=[wind_direction],
+        yaw_angles=yaw_angles,
+        power_setpoints=power_setpoints,
+    )
+    fmodel.run()
+    return fmodel.get_turbine_powers().flatten() / 1000
+
+
+def test_operation_is_default():
+    assert operation_is_default(None, None)
+    assert operation_is_default(np.zeros((1, 3)), np.full((1, 3), 1e12))
+    assert not operation_is_default(np.array([[0.0, 5.0, 0.0]]), None)
+    assert not operation_is_default(None, np.array([[1e12, 2e6, 1e12]]))
+
+
+def test_FlorisPowerTable():
+    fmodel = make_fmodel()
+    table = FlorisPowerTable(
+        fmodel,
+        wind_speeds=np.arange(4.0, 12.1, 1.0),
+        wind_directions=np.arange(0.0, 360.0, 2.0),
+        batch_size=100,
+    )
+    assert table.powers.shape == (9, 180, 3)
+    assert table.periodic
+
+    # Matches FLORIS at grid points, including waked directions
+    for ws, wd in [(8.0, 270.0), (6.0, 90.0), (11.0, 0.0)]:
+        np.testing.assert_allclose(table.get_turbine_powers(ws, wd), solve(fmodel, ws, wd))
+
+    # Interpolates between grid points, and across 360 deg
+    expected = 0.5 * (solve(fmodel, 8.0, 270.0) + solve(fmodel, 9.0, 270.0))
+    np.testing.assert_allclose(table.get_turbine_powers(8.5, 270.0), expected)
+    expected = 0.5 * (solve(fmodel, 8.0, 358.0) + solve(fmodel, 8.0, 0.0))
+    np.testing.assert_allclose(table.get_turbine_powers(8.0, 359.0), expected)
+    np.testing.assert_allclose(table.get_turbine_powers(8.0, -1.0), expected)
+
+    # Outside the grid
+    assert table.get_turbine_powers(3.0, 270.0) is None
+    assert table.get_turbine_powers(12.5, 270.0) is None
+
+    # The model is not changed
+    assert fmodel.core.flow_field.n_findex == 1
+
+
+def test_FlorisPowerTable_sector():
+    table = FlorisPowerTable(
+        make_fmodel(), wind_speeds=[6.0, 8.0], wind_directions=[260.0, 270.0, 280.0]
+    )
+    assert not table.periodic
+    assert table.get_turbine_powers(7.0, 265.0) is not None
+    assert table.get_turbine_powers(7.0, 285.0) is None
+
+    with pytest.raises(ValueError):
+        FlorisPowerTable(make_fmodel(), wind_speeds=[8.0])
+
+
+def test_FlorisPowerTable_cache(tmp_path, monkeypatch):
+    cache_file = tmp_path / "tables" / "power_table.npz"
+    wind_speeds = [6.0, 8.0, 10.0]
+    wind_directions = [260.0, 270.0, 280.0]
+
+    table = FlorisPowerTable(make_fmodel(), wind_speeds, wind_directions, cache_file=cache_file)
+    assert cache_file.exists()
+
+    # A cached table is loaded without solving FLORIS
+    solve_table = FlorisPowerTable._solve
+    monkeypatch.setattr(FlorisPowerTable, "_solve", None)
+    cached = FlorisPowerTable(make_fmodel(), wind_speeds, wind_directions, cache_file=cache_file)
+    np.testing.assert_array_equal(cached.powers, table.powers)
+    monkeypatch.setattr(FlorisPowerTable, "_solve", solve_table)
+
+    # A different model is solved again and replaces the cache
+    fmodel = make_fmodel()
+    fmodel.set(layout_x=[0.0, 500.0, 1000.0], layout_y=[0.0, 0.0, 0.0])
+    other = FlorisPowerTable(fmodel, wind_speeds, wind_directions, cache_file=cache_file)
+    assert other.key != table.key
+    np.testing.assert_allclose(other.get_turbine_powers(8.0, 270.0), solve(fmodel, 8.0, 270.0))
+    assert str(np.load(cache_file)["key"]) == other.key
+
+
+def test_FlorisSolveCache():
+    cache = FlorisSolveCache(max_size=2, wind_speed_tolerance=0.1, wind_direction_tolerance=1.0)
+    yaw = np.zeros((1, 3))
+    setpoints = np.full((1, 3), 1e12)
+
+    key = cache.make_key(8.0, 270.0, yaw, setpoints)
+    assert cache.get(key) is None
+    cache.put(key, [1.0, 2.0, 3.0])
+
+    # Inputs within the tolerances share the entry
+    np.testing.assert_array_equal(cache.get(cache.make_key(8.02, 270.3, yaw, setpoints)), [1, 2, 3])
+    np.testing.assert_array_equal(cache.get(cache.make_key(8.0, -90.0, yaw, setpoints)), [1, 2, 3])
+    assert cache.get(cache.make_key(8.2, 270.0, yaw, setpoints)) is None
+    assert cache.get(cache.make_key(8.0, 270.0, yaw + [[0.0, 5.0, 0.0]], setpoints)) is None
+    assert cache.get(cache.make_key(8.0, 270.0, yaw, setpoints * 0.5)) is None
+    assert (cache.hits, cache.misses) == (2, 4)
+    assert "2 hits, 4 misses" in cache.format_summary()
+
+    # The least recently used entry is evicted
+    key_b = cache.make_key(9.0, 270.0, yaw, setpoints)
+    key_c = cache.make_key(10.0, 270.0, yaw, setpoints)
+    cache.put(key_b, [4.0, 5.0, 6.0])
+    cache.get(key)
+    cache.put(key_c, [7.0, 8.0, 9.0])
+    assert len(cache) == 2
+    assert cache.get(key_b) is None
+    assert cache.get(key) is not None
+
+    with pytest.raises(ValueError):
+        FlorisSolveCache(max_size=0)
+    with pytest.raises(ValueError):
+        FlorisSolveCache(yaw_tolerance=-1.0)
+
+
+def test_heterogeneous_inflow_key():
+    config = {"x": [0.0, 100.0], "y": [0.0, 100.0], "speed_multipliers": [[1.0, 1.1]]}
+    assert heterogeneous_inflow_key(None) is None
+    assert heterogeneous_inflow_key(config) == heterogeneous_inflow_key(dict(config))
+    other = dict(config, speed_multipliers=[[1.0, 1.2]])
+    assert heterogeneous_inflow_key(other) != heterogeneous_inflow_key(config)
+
+
+def test_FlorisBatchSolver():
+    fmodel = make_fmodel()
+    solver = FlorisBatchSolver(fmodel, parallel={"max_workers": 2, "min_batch_size": 4})
+    yaw = np.array([[10.0, 0.0, 0.0]])
+
+    # Batches of at least min_batch_size conditions are solved in parallel
+    for wind_directions in [[270.0, 275.0], [260.0, 265.0, 270.0, 275.0, 280.0]]:
+        wind_speeds = np.full(len(wind_directions), 8.0)
+        powers = solver.solve(wind_speeds, wind_directions, 0.06, yaw_misalignments=yaw)
+        for i, wd in enumerate(wind_directions):
+            np.testing.assert_allclose(powers[i], solve(fmodel, 8.0, wd, yaw_angles=yaw))
+    assert solver.n_parallel_runs == 1
+
+    # Operation is reset between batches
+    np.testing.assert_allclose(solver.solve([8.0], [270.0], 0.06)[0], solve(fmodel, 8.0, 270.0))
+
+
+def test_FlorisLookahead():
+    fmodel = make_fmodel()
+    times = np.arange(0.0, 10.0, 0.5)
+    wind_speeds = np.linspace(6.0, 10.0, len(times))
+    wind_directions = np.linspace(260.0, 280.0, len(times))
+    lookahead = FlorisLookahead(
+        fmodel, times, wind_speeds, wind_directions, chunk_size=8, resolve_steps=3
+    )
+    default_yaw = np.zeros((1, 3))
+    default_setpoints = np.full((1, 3), 1e12)
+
+    # Default operation is solved in chunks
+    for i in [0, 1, 7, 8]:
+        np.testing.assert_allclose(
+            lookahead.get_turbine_powers(times[i], default_yaw, default_setpoints),
+            solve(fmodel, wind_speeds[i], wind_directions[i]),
+        )
+    assert (lookahead.n_runs, lookahead.n_steps_solved) == (2, 16)
+    assert lookahead.get_turbine_powers(0.25, default_yaw, default_setpoints) is None
+
+    # A change of operation solves its step alone, then the steps ahead
+    yaw = np.array([[10.0, 0.0, 0.0]])
+    for i in [9, 10, 11, 12]:
+        np.testing.assert_allclose(
+            lookahead.get_turbine_powers(times[i], yaw, default_setpoints),
+            solve(fmodel, wind_speeds[i], wind_directions[i], yaw_angles=yaw),
+        )
+    assert lookahead.n_runs == 4
+
+    # Returning to default operation re-solves the steps solved with the yaw misalignment
+    np.testing.assert_allclose(
+        lookahead.get_turbine_powers(times[13], default_yaw, default_setpoints),
+        solve(fmodel, wind_speeds[13], wind_directions[13]),
+    )
+    assert lookahead.n_runs == 5
+
+    setpoints = np.array([[1e12, 1e6, 1e12]])
+    np.testing.assert_allclose(
+        lookahead.get_turbine_powers(times[19], default_yaw, setpoints),
+        solve(fmodel, wind_speeds[19], wind_directions[19], power_setpoints=setpoints),
+    )
+    assert lookahead.n_steps_solved == 8 + 8 + 1 + 3 + 1 + 1
+
+    # An operation changing every step is solved one step at a time
+    n_steps_solved = lookahead.n_steps_solved
+    for i in range(4):
+        yaw = np.array([[float(i), 0.0, 0.0]])
+        np.testing.assert_allclose(
+            lookahead.get_turbine_powers(times[i], yaw, default_setpoints),
+            solve(fmodel, wind_speeds[i], wind_directions[i], yaw_angles=yaw),
+        )
+    assert lookahead.n_steps_solved == n_steps_solved + 4
+    lookahead.get_turbine_powers(times[4], yaw, default_setpoints)
+    assert lookahead.n_steps_solved == n_steps_solved + 4 + 3
+
+
+def test_FlorisLookahead_parallel():
+    fmodel = make_fmodel()
+    times = np.arange(0.0, 10.0, 0.5)
+    wind_speeds = np.linspace(6.0, 10.0, len(times))
+    wind_directions = np.linspace(260.0, 280.0, len(times))
+    lookahead = FlorisLookahead(
+        fmodel,
+        times,
+        wind_speeds,
+        wind_directions,
+        chunk_size=8,
+        resolve_steps=3,
+        parallel={"max_workers": 2},
+    )
+    default_setpoints = np.full((1, 3), 1e12)
+
+    # Batches of resolve_steps steps are solved in parallel, steps solved alone are not
+    lookahead.get_turbine_powers(times[0], np.zeros((1, 3)), default_setpoints)
+    assert lookahead.solver.n_parallel_runs == 1
+    yaw = np.array([[10.0, 0.0, 0.0]])
+    lookahead.get_turbine_powers(times[1], yaw, default_setpoints)
+    assert lookahead.solver.n_parallel_runs == 1
+    np.testing.assert_allclose(
+        lookahead.get_turbine_powers(times[2], yaw, default_setpoints),
+        solve(fmodel, wind_speeds[2], wind_directions[2], yaw_angles=yaw),
+    )
+    assert lookahead.solver.n_parallel_runs == 2
+
+
+def test_FlorisIncrementalSolver():
+    # A 4 x 4 farm without the GCH transverse velocities, so that wakes stay in their cones
+    floris_dict = FlorisModel.get_defaults()
+    floris_dict["wake"]["enable_secondary_steering"] = False
+    floris_dict["wake"]["enable_yaw_added_recovery"] = False
+    floris_dict["wake"]["enable_transverse_velocities"] = False
+    fmodel = FlorisModel(floris_dict)
+    x, y = np.meshgrid(np.arange(4) * 630.0, np.arange(4) * 1260.0)
+    fmodel.set(
+        layout_x=x.ravel(),
+        layout_y=y.ravel(),
+        wind_speeds=[8.0],
+        wind_directions=[270.0],
+        turbulence_intensities=[0.06],
+    )
+    solver = FlorisIncrementalSolver(fmodel)
+
+    # Rows are 2 km apart, so at 270 deg wakes only reach the turbines behind in the same row
+    influence = solver.influence(270.0)
+    assert influence[0, 1] and influence[0, 3] and not influence[1, 0]
+    assert not influence[0, 4:].any()
+
+    yaw = np.zeros((1, 16))
+    setpoints = np.full((1, 16), 1e12)
+    powers = solver.solve(8.0, 270.0, yaw, setpoints)
+    np.testing.assert_allclose(powers, solve(fmodel, 8.0, 270.0))
+    assert (solver.n_full, solver.n_incremental) == (1, 0)
+
+    # Yawing the second turbine of the first row re-solves that row only
+    yaw[0, 1] = 20.0
+    powers_yawed = solver.solve(8.0, 270.0, yaw, setpoints)
+    np.testing.assert_allclose(powers_yawed, solve(fmodel, 8.0, 270.0, yaw_angles=yaw))
+    assert (solver.n_full, solver.n_incremental) == (1, 1)
+    np.testing.assert_array_equal(powers_yawed[4:], powers[4:])
+    assert powers_yawed[1] < powers[1]
+    assert powers_yawed[2] > powers[2]
+
+    # Repeating the step reuses the powers
+    np.testing.assert_array_equal(solver.solve(8.0, 270.0, yaw, setpoints), powers_yawed)
+    assert solver.n_reused == 1
+
+    # A change of wind condition, or of most of the farm, solves the whole farm
+    solver.solve(9.0, 270.0, yaw, setpoints)
+    assert solver.n_full == 2
+    setpoints[0, :12] = 2e6
+    np.testing.assert_allclose(
+        solver.solve(9.0, 270.0, yaw, setpoints),
+        solve(fmodel, 9.0, 270.0, yaw_angles=yaw, power_setpoints=setpoints),
+    )
+    assert solver.n_full == 3
+
+    # Wind conditions within the tolerances count as unchanged
+    n_reused = solver.n_reused
+    solver.solve(9.0 + 1e-4, 270.0 - 1e-4, yaw, setpoints)
+    assert (solver.n_full, solver.n_reused) == (3, n_reused + 1)
+    exact = FlorisIncrementalSolver(fmodel, wind_speed_tolerance=0, wind_direction_tolerance=0)
+    exact.solve(9.0, 270.0, yaw, setpoints)
+    exact.solve(9.0 + 1e-4, 270.0, yaw, setpoints)
+    assert exact.n_full == 2
+
+    # Slowly drifting wind solves the whole farm again once it has drifted by more than the
+    # tolerances from the wind of the last full solve, not only from the previous step
+    n_full = solver.n_full
+    wind_speeds = 9.0 + 0.004 * np.arange(1, 11)
+    for i, wind_speed in enumerate(wind_speeds):
+        yaw[0, 1] = 20.0 + 5.0 * (i % 2)
+        powers = solver.solve(wind_speed, 270.0, yaw, setpoints)
+    assert solver.n_full == n_full + 3
+    np.testing.assert_allclose(
+        powers,
+        solve(fmodel, wind_speeds[-1], 270.0, yaw_angles=yaw, power_setpoints=setpoints),
+        rtol=2e-3,
+    )
@@ -4,6 +4,7 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 from floris import FlorisModel
+from hercules import floris_standin as floris_standin_module
 from hercules.amr_wind_standin import AMRWindStandin
 from hercules.floris_standin import (
     construct_floris_from_amr_input,
@@ -39,6 +40,31 @@ def test_construct_floris_from_amr_input():
     assert isinstance(fmodel_test, FlorisModel)
 
 
+def test_construct_floris_from_amr_input_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(floris_standin_module, "_floris_model_cache", {})
+    fmodel = construct_floris_from_amr_input(AMR_INPUT, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("floris_model_*.pkl"))) == 1
+
+    # Later calls load the model from the cache, in memory or on disk, as a new object
+    def fail(*args):
+        raise AssertionError("The model should not be constructed again.")
+
+    monkeypatch.setattr(floris_standin_module, "_construct_floris", fail)
+    fmodel_memory = construct_floris_from_amr_input(AMR_INPUT, cache_dir=tmp_path)
+    monkeypatch.setattr(floris_standin_module, "_floris_model_cache", {})
+    fmodel_disk = construct_floris_from_amr_input(AMR_INPUT, cache_dir=tmp_path)
+    for fmodel_cached in [fmodel_memory, fmodel_disk]:
+        assert fmodel_cached is not fmodel
+        assert fmodel_cached.core.as_dict() == fmodel.core.as_dict()
+
+    # A changed input file is constructed again
+    monkeypatch.undo()
+    amr_input = tmp_path / "amr_input.inp"
+    amr_input.write_text(AMR_INPUT.read_text() + "\n# A comment\n")
+    construct_floris_from_amr_input(amr_input, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("floris_model_*.pkl"))) == 2
+
+
 def test_FlorisStandin_instantiation():
     # Check instantiates correctly
     floris_standin = FlorisStandin(CONFIG, AMR_INPUT)
@@ -386,3 +412,19 @@ def test_FlorisStandin_with_bad_heterogeneous_inflow():
 
     # Delete the bad file
     AMR_EXTERNAL_DATA_HET_BAD.unlink()
+
+
+def test_FlorisStandin_step_budget():
+    # With a budget too small for any solve, steps after the first reuse the first solution
+    floris_standin = FlorisStandin(
+        CONFIG, AMR_INPUT, smoothing_coefficient=0.0, step_budget=1e-9
+    )
+    turbine_powers = floris_standin.get_step(1.0)[2]
+    assert floris_standin.n_degraded_steps == 0
+
+    turbine_powers_fallback = floris_standin.get_step(2.0, yaw_angles=[230.0, 240.0])[2]
+    assert floris_standin.n_degraded_steps == 1
+    assert turbine_powers_fallback == turbine_powers
+
+    # The yaw angles are kept for the next solve
+    assert (floris_standin.fmodel.core.farm.yaw_angles == [[10.0, 0.0]]).all()
@@ -0,0 +1,111 @@
+from pathlib import Path
+
+import netCDF4 as ncdf
+import numpy as np
+import pytest
+from hercules.standin_data import StandinDataBundle
+from hercules.tools.generate_amr_standin_data import find_actuator_files, StandinData
+
+AMR_INPUT = Path(__file__).resolve().parent / "test_inputs" / "amr_input_florisstandin.inp"
+
+HERCULES_INPUT = """
+dt: 0.5
+hercules_comms:
+  helics:
+    config:
+      starttime: 0
+      stoptime: 10
+"""
+
+
+def write_actuator_file(path, name, time, vdisk, power):
+    with ncdf.Dataset(path, "w", format="NETCDF4") as rootgrp:
+        group = rootgrp.createGroup(name)
+        group.createDimension("num_time_steps", None)
+        group.createDimension("ndim", 3)
+        group.createVariable("time", "f8", ("num_time_steps",))[:] = time
+        group.createVariable("vdisk", "f8", ("num_time_steps", "ndim"))[:] = vdisk
+        group.createVariable("power", "f8", ("num_time_steps",))[:] = power
+
+
+def make_amr_output(case_folder, n_turbines=3, n_times=40):
+    # An earlier actuator directory, from before a restart, and the one to use
+    time = np.arange(n_times) * 0.5
+    old_dir = case_folder / "post_processing" / "actuator00000"
+    actuator_dir = case_folder / "post_processing" / "actuator14400"
+    old_dir.mkdir(parents=True)
+    actuator_dir.mkdir(parents=True)
+    write_actuator_file(old_dir / "T0.nc", "T0", time[:5], np.ones((5, 3)), np.zeros(5))
+    vdisks = []
+    powers = []
+    for i in range(n_turbines):
+        angle = np.deg2rad(10.0 * i) + 0.01 * time
+        vdisk = np.column_stack([np.cos(angle), np.sin(angle), 0 * time]) * (8.0 + i)
+        power = 1000.0 * i + time
+        write_actuator_file(actuator_dir / "T{}.nc".format(i), "T{}".format(i), time, vdisk, power)
+        vdisks.append(vdisk)
+        powers.append(power)
+    return time, np.array(vdisks), np.column_stack(powers)
+
+
+def make_standin_data(tmp_path):
+    herc_input = tmp_path / "hercules_input.yaml"
+    herc_input.write_text(HERCULES_INPUT)
+    return StandinData(
+        method="amr_actuator",
+        amr_inp_path=AMR_INPUT,
+        amr_out_path=tmp_path / "amr_output",
+        herc_inp_path=herc_input,
+        save_path=tmp_path,
+    )
+
+
+def test_find_actuator_files(tmp_path):
+    make_amr_output(tmp_path, n_turbines=11)
+    files = find_actuator_files(tmp_path)
+    assert [Path(f).name for f in files] == ["T{}.nc".format(i) for i in range(11)]
+    assert len(find_actuator_files(tmp_path, "post_processing/actuator00000")) == 1
+    with pytest.raises(FileNotFoundError):
+        find_actuator_files(tmp_path / "post_processing" / "actuator14400" / "missing")
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_from_amr_actuators(tmp_path, n_workers):
+    time, vdisks, powers = make_amr_output(tmp_path / "amr_output")
+    standin_data = make_standin_data(tmp_path)
+    standin_data.generate_standin_data(
+        {"time_window": (2.0, 15.0), "decimation": 3, "n_workers": n_workers}
+    )
+
+    selection = slice(4, 31, 3)
+    np.testing.assert_array_equal(standin_data.time, time[selection])
+    np.testing.assert_allclose(
+        standin_data.amr_wind_speed, np.mean(np.linalg.norm(vdisks, axis=2), axis=0)[selection]
+    )
+    directions = np.rad2deg(np.arctan2(vdisks[:, :, 1], vdisks[:, :, 0]))
+    np.testing.assert_allclose(
+        standin_data.amr_wind_direction, np.mean(directions, axis=0)[selection]
+    )
+    np.testing.assert_allclose(standin_data.turbine_powers, powers[selection])
+
+
+def test_from_amr_actuators_reproducible(tmp_path):
+    # The averages over the turbines do not depend on the order the files are read in
+    make_amr_output(tmp_path / "amr_output", n_turbines=8)
+    serial = make_standin_data(tmp_path)
+    serial.from_amr_actuators(n_workers=1)
+    pooled = make_standin_data(tmp_path)
+    pooled.from_amr_actuators(n_workers=4)
+    np.testing.assert_array_equal(pooled.amr_wind_speed, serial.amr_wind_speed)
+    np.testing.assert_array_equal(pooled.amr_wind_direction, serial.amr_wind_direction)
+
+
+def test_from_amr_actuators_bundle(tmp_path):
+    time, vdisks, powers = make_amr_output(tmp_path / "amr_output")
+    standin_data = make_standin_data(tmp_path)
+    standin_data.from_amr_actuators(n_workers=1, bundle_path=tmp_path / "bundle")
+
+    bundle = StandinDataBundle(tmp_path / "bundle")
+    np.testing.assert_array_equal(bundle.times, time)
+    np.testing.assert_allclose(bundle.turbine_powers, powers)
+    np.testing.assert_allclose(bundle["amr_wind_speed"], standin_data.amr_wind_speed)
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from hercules.heterogeneous_inflow import (
+    HeterogeneousInflowSeries,
+    parse_heterogeneous_inflow_config,
+)
+
+AMR_EXTERNAL_DATA_HET = Path(__file__).resolve().parent / "test_inputs" / "amr_standin_data_het.csv"
+
+
+def test_parse_heterogeneous_inflow_config():
+    config = parse_heterogeneous_inflow_config(
+        "{'x': [0.0, 1.0], 'y': [0.0, 1.0], 'speed_multipliers': [[1.0, 0.9]]}"
+    )
+    assert config["speed_multipliers"] == [[1.0, 0.9]]
+
+    # Only literals are accepted
+    with pytest.raises(ValueError):
+        parse_heterogeneous_inflow_config("__import__('os').getcwd()")
+    with pytest.raises(ValueError):
+        parse_heterogeneous_inflow_config("[1.0, 2.0]")
+
+
+def test_HeterogeneousInflowSeries():
+    df = pd.read_csv(AMR_EXTERNAL_DATA_HET)
+    series = HeterogeneousInflowSeries(df["time"], df["heterogeneous_inflow_config"])
+    np.testing.assert_array_equal(series.x, [-2000.0, -2000.0, 2000.0, 2000.0])
+    np.testing.assert_array_equal(series.y, [-2000.0, 2000.0, -2000.0, 2000.0])
+    assert series.speed_multipliers.shape == (len(df), 4)
+
+    np.testing.assert_allclose(series.get_config(0.0)["speed_multipliers"], [[0.8, 0.9, 0.9, 1.0]])
+    np.testing.assert_allclose(
+        series.get_config(2.0)["speed_multipliers"], [[0.9, 0.95, 0.95, 1.0]]
+    )
+    np.testing.assert_allclose(series.get_config(4.0)["speed_multipliers"], [[1.0, 1.0, 1.0, 1.0]])
+
+    # Held at the ends
+    np.testing.assert_allclose(series.get_config(-1.0)["speed_multipliers"], [[0.8, 0.9, 0.9, 1.0]])
+    np.testing.assert_allclose(
+        series.get_config(1.0e6)["speed_multipliers"], series.speed_multipliers[-1:]
+    )
+
+    # The returned speed multipliers do not alias the series
+    series.get_config(0.0)["speed_multipliers"][0, 0] = 5.0
+    assert series.speed_multipliers[0, 0] == 0.8
+
+
+def test_HeterogeneousInflowSeries_bad_configs():
+    x = [0.0, 0.0, 1.0, 1.0]
+    y = [0.0, 1.0, 0.0, 1.0]
+
+    # Extra keys are ignored
+    configs = [
+        {"x": x, "y": y, "speed_multipliers": [[1.0, 1.0, 1.0, 0.8]], "bad_key": 0.0},
+        {"x": x, "y": y, "speed_multipliers": [[1.0, 1.0, 1.0, 1.0]], "bad_key": 0.0},
+    ]
+    series = HeterogeneousInflowSeries([0.0, 1.0], configs)
+    np.testing.assert_allclose(series.get_config(0.5)["speed_multipliers"], [[1, 1, 1, 0.9]])
+
+    # Missing keys or changing points give homogeneous inflow
+    with pytest.warns(UserWarning):
+        series = HeterogeneousInflowSeries([0.0, 1.0], [{"x": x, "y": y}] * 2)
+    np.testing.assert_array_equal(series.get_config(0.5)["speed_multipliers"], [[1, 1, 1, 1]])
+
+    configs[1] = dict(configs[1], x=[0.0, 0.0, 2.0, 2.0])
+    with pytest.warns(UserWarning):
+        series = HeterogeneousInflowSeries([0.0, 1.0], configs)
+    np.testing.assert_array_equal(series.get_config(0.5)["speed_multipliers"], [[1, 1, 1, 1]])
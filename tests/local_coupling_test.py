@@ -0,0 +1,135 @@
+import os
+
+import pytest
+from hercules.local_coupling import (
+    check_coupling,
+    farm_topics,
+    LocalStandinCoupling,
+    LocalStandinGroup,
+    make_local_standin,
+    StandinPool,
+)
+
+
+class EchoStandin:
+    # Minimal standin whose turbine powers echo the power setpoints it receives
+    num_turbines = 2
+
+    def parse_control_message(self, message_from_server):
+        if message_from_server is None or len(message_from_server) < 3 + 2 * self.num_turbines:
+            return None, None
+        return message_from_server[3:5], message_from_server[5:7]
+
+    def get_step(self, sim_time_s, yaw_angles=None, power_setpoints=None):
+        if power_setpoints is None:
+            power_setpoints = [0.0, 0.0]
+        return 8.0, 270.0, list(power_setpoints), [270.0, 270.0]
+
+    def build_status_message(self, sim_time_s, ws, wd, turbine_powers, turbine_wds):
+        return [float(v) for v in [sim_time_s, ws, wd] + turbine_powers + turbine_wds]
+
+    def get_state(self):
+        return {"pid": os.getpid()}
+
+    def set_state(self, state):
+        pass
+
+
+def make_echo_standin(farm_dict, dt, stoptime):
+    if farm_dict.get("fail"):
+        raise ValueError("Bad farm")
+    return EchoStandin()
+
+
+def test_LocalStandinCoupling():
+    coupling = LocalStandinCoupling(EchoStandin())
+    assert coupling.get_status() is None
+
+    # Without a control message, the standin runs with its defaults
+    coupling.step(0.0)
+    assert coupling.get_status() == [0.0, 8.0, 270.0, 0.0, 0.0, 270.0, 270.0]
+
+    # The latest control message is used on the next step
+    coupling.publish_control([-1, -1, -1])
+    coupling.publish_control([1.0, 8.0, 270.0, 270.0, 270.0, 1000.0, 2000.0])
+    coupling.step(1.0)
+    assert coupling.get_status() == [1.0, 8.0, 270.0, 1000.0, 2000.0, 270.0, 270.0]
+
+
+def test_LocalStandinGroup():
+    group = LocalStandinGroup(
+        {name: LocalStandinCoupling(EchoStandin()) for name in ["farm_0", "farm_1"]}
+    )
+    group.publish_control("farm_1", [1.0, 8.0, 270.0, 270.0, 270.0, 1000.0, 2000.0])
+    group.step(1.0)
+    assert group.get_status("farm_0") == [1.0, 8.0, 270.0, 0.0, 0.0, 270.0, 270.0]
+    assert group.get_status("farm_1") == [1.0, 8.0, 270.0, 1000.0, 2000.0, 270.0, 270.0]
+
+    state = group.get_state()
+    group.step(2.0)
+    group.set_state(state)
+    assert group.get_status("farm_1")[0] == 1.0
+
+
+def test_StandinPool():
+    farm_dicts = {"farm_{}".format(i): {} for i in range(3)}
+    pool = StandinPool(farm_dicts, 1.0, 10.0, n_workers=2, make_standin=make_echo_standin)
+    try:
+        assert pool.get_status("farm_0") is None
+
+        # Each farm's standin receives its own control message
+        for i in range(3):
+            setpoints = [1000.0 * i, 2000.0 * i]
+            pool.publish_control("farm_{}".format(i), [1.0, 8.0, 270.0, 270.0, 270.0] + setpoints)
+        pool.step(1.0)
+        for i in range(3):
+            assert pool.get_status("farm_{}".format(i)) == (
+                [1.0, 8.0, 270.0, 1000.0 * i, 2000.0 * i, 270.0, 270.0]
+            )
+
+        # The standins run in two worker processes, farms 0 and 2 in the same one
+        state = pool.get_state()
+        pids = {name: state[name]["standin"]["pid"] for name in farm_dicts}
+        assert pids["farm_0"] == pids["farm_2"] != pids["farm_1"]
+        assert os.getpid() not in pids.values()
+
+        # Restoring a state restores the messages
+        pool.step(2.0)
+        pool.set_state(state)
+        assert pool.get_status("farm_1")[0] == 1.0
+    finally:
+        pool.close()
+
+    # Errors in the workers are raised in the emulator's process
+    with pytest.raises(RuntimeError, match="Bad farm"):
+        StandinPool({"farm_0": {"fail": True}}, 1.0, 10.0, make_standin=make_echo_standin)
+
+
+def test_coupling_options():
+    assert check_coupling("local") == "local"
+    assert farm_topics() == ("control", "status")
+    assert farm_topics("wind_farm_1") == ("control_wind_farm_1", "status_wind_farm_1")
+    with pytest.raises(ValueError):
+        check_coupling("zmq")
+
+    with pytest.raises(ValueError):
+        make_local_standin(
+            {"amr_wind_input_file": "amr_input.inp", "standin": "openfast"}, 1.0, 10.0
+        )
+
+
+def test_make_local_standin_options():
+    # FLORIS standin options of the farm's entry are passed on; others take defaults
+    standin = make_local_standin(
+        {
+            "amr_wind_input_file": "tests/test_inputs/amr_input_florisstandin.inp",
+            "amr_standin_data_file": "tests/test_inputs/amr_standin_data.csv",
+            "smoothing_coefficient": 0.0,
+            "type": "amr_wind",
+        },
+        0.5,
+        10.0,
+        verbose=False,
+    )
+    assert standin.smoothing_coefficient == 0.0
+    assert not standin.verbose
@@ -0,0 +1,57 @@
+import base64
+
+import numpy as np
+import pytest
+from hercules.message_codec import (
+    BINARY,
+    BINARY_PREFIX,
+    check_codec,
+    decode_binary_message,
+    decode_message,
+    encode_message,
+    is_binary_message,
+    TEXT,
+)
+
+
+def test_text_round_trip():
+    values = [1.0, 8.0, 240.0, 1000.0, 2000.0]
+    message = encode_message(values, TEXT)
+    assert message == str(values)
+    assert not is_binary_message(message)
+    assert decode_message(message) == values
+
+
+def test_binary_round_trip():
+    values = [1.0, 8.0, 240.0, 1000.0, 2000.0, 240.5, 241.25]
+    message = encode_message(values, BINARY, field_lengths=[3, 2, 2], n_turbines=2)
+    assert is_binary_message(message)
+    assert decode_message(message) == values
+
+    array, n_turbines, field_lengths = decode_binary_message(message)
+    assert n_turbines == 2
+    assert field_lengths == [3, 2, 2]
+    np.testing.assert_array_equal(array, values)
+
+    # Numpy arrays encode the same as lists
+    assert encode_message(np.array(values), BINARY, [3, 2, 2], 2) == message
+
+    # None is sent as NaN and decoded back to None
+    message = encode_message([0.0, None, 2.0], BINARY)
+    assert decode_message(message) == [0.0, None, 2.0]
+
+
+def test_binary_errors():
+    with pytest.raises(ValueError):
+        check_codec("json")
+
+    with pytest.raises(ValueError):
+        encode_message([1.0, 2.0], BINARY, field_lengths=[3])
+
+    # Messages from an unknown codec version are rejected
+    message = encode_message([1.0], BINARY)
+    raw = bytearray(base64.b64decode(message[len(BINARY_PREFIX) :]))
+    raw[4] = 99
+    bad = BINARY_PREFIX + base64.b64encode(bytes(raw)).decode("ascii")
+    with pytest.raises(ValueError):
+        decode_message(bad)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from hercules.output_reduction import match_columns, OutputReducer
+
+COLUMNS = [
+    "time",
+    "py_sims.battery_0.outputs.power",
+    "py_sims.battery_0.outputs.soc",
+    "py_sims.battery_00.outputs.power",
+    "hercules_comms.amr_wind.wind_farm_0.turbine_powers.000",
+    "hercules_comms.amr_wind.wind_farm_0.turbine_powers.001",
+]
+
+
+def test_match_columns():
+    assert match_columns(COLUMNS, ["py_sims.battery_0"]) == [1, 2]
+    assert match_columns(COLUMNS, ["time", "hercules_comms.amr_wind"]) == [0, 4, 5]
+    assert match_columns(COLUMNS, ["py_sims.solar"]) == []
+
+
+def test_OutputReducer_every():
+    reducer = OutputReducer("battery", ["py_sims.battery_0"], dt=1.0, every=3)
+    assert reducer.set_columns(COLUMNS) == [
+        "time",
+        "py_sims.battery_0.outputs.power",
+        "py_sims.battery_0.outputs.soc",
+    ]
+
+    rows = []
+    for t in range(7):
+        out = reducer.add(float(t), np.arange(6, dtype=float) + t)
+        if out is not None:
+            rows.append(out)
+    assert [r[0] for r in rows] == [0.0, 3.0, 6.0]
+    assert rows[1] == [3.0, 4.0, 5.0]
+    assert reducer.finish() is None
+
+    # time is always the first column, and is not repeated for a "time" key
+    reducer = OutputReducer("battery", ["time", "py_sims.battery_0"], dt=1.0, every=1)
+    assert reducer.set_columns(COLUMNS)[:2] == ["time", "py_sims.battery_0.outputs.power"]
+    assert len(reducer.columns) == 3
+
+
+def test_OutputReducer_window():
+    reducer = OutputReducer(
+        "turbines",
+        ["hercules_comms.amr_wind"],
+        dt=0.5,
+        window=2.0,
+        stats=["mean", "min", "max", "last"],
+    )
+    columns = reducer.set_columns(COLUMNS)
+    assert columns[:5] == [
+        "time",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_powers.000.mean",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_powers.000.min",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_powers.000.max",
+        "hercules_comms.amr_wind.wind_farm_0.turbine_powers.000.last",
+    ]
+
+    rows = []
+    for k, p in enumerate([1.0, 3.0, np.nan, 4.0, 10.0, 20.0]):
+        row = np.zeros(6)
+        row[4] = p
+        row[5] = -p
+        out = reducer.add(0.5 * k, row)
+        if out is not None:
+            rows.append(out)
+
+    # One full window of 4 steps (NaN ignored), then a partial window on finish
+    assert len(rows) == 1
+    assert rows[0][0] == 1.5
+    assert rows[0][1:5] == [8.0 / 3, 1.0, 4.0, 4.0]
+    assert rows[0][5:9] == [-8.0 / 3, -4.0, -1.0, -4.0]
+    assert reducer.finish() == [2.5, 15.0, 10.0, 20.0, 20.0, -15.0, -20.0, -10.0, -20.0]
+
+
+def test_OutputReducer_errors():
+    with pytest.raises(ValueError):
+        OutputReducer("g", ["time"], dt=1.0)
+    with pytest.raises(ValueError):
+        OutputReducer("g", ["time"], dt=1.0, every=2, window=10.0)
+    with pytest.raises(ValueError):
+        OutputReducer("g", ["time"], dt=0.3, window=1.0)
+    with pytest.raises(ValueError):
+        OutputReducer("g", ["time"], dt=1.0, window=10.0, stats=["median"])
@@ -0,0 +1,175 @@
+import datetime as dt
+import threading
+
+import pandas as pd
+import pytest
+from hercules.output_writer import (
+    AsyncOutputWriter,
+    CSVOutputWriter,
+    infer_output_format,
+    make_output_writer,
+    ParquetOutputWriter,
+)
+
+
+def test_make_output_writer(tmp_path):
+    assert isinstance(make_output_writer(tmp_path / "out.csv"), CSVOutputWriter)
+    assert isinstance(make_output_writer(tmp_path / "out.parquet"), ParquetOutputWriter)
+    assert isinstance(make_output_writer(tmp_path / "out.dat", "parquet"), ParquetOutputWriter)
+    assert infer_output_format("outputs/hercules_output.csv") == "csv"
+
+    with pytest.raises(ValueError):
+        make_output_writer(tmp_path / "out.csv", "xlsx")
+
+    with pytest.raises(ValueError):
+        make_output_writer(tmp_path / "out.csv", flush_interval=0)
+
+
+def test_CSVOutputWriter_batching(tmp_path):
+    filename = tmp_path / "out.csv"
+    writer = CSVOutputWriter(filename, flush_interval=3)
+    writer.write_header(["time", "a.000", "a.001"])
+
+    # Rows are held in memory until flush_interval is reached
+    writer.write_row([0.0, 1.0, 2.0])
+    writer.write_row([1.0, 3.0, 4.0])
+    assert writer.rows_written == 0
+    assert len(pd.read_csv(filename)) == 0
+
+    writer.write_row([2.0, 5.0, 6.0])
+    assert writer.rows_written == 3
+
+    # Remaining rows are written on close
+    writer.write_row([3.0, 7.0, 8.0])
+    writer.close()
+    assert writer.rows_written == 4
+
+    df = pd.read_csv(filename)
+    assert list(df.columns) == ["time", "a.000", "a.001"]
+    assert df["a.001"].to_list() == [2.0, 4.0, 6.0, 8.0]
+
+    # The header can only be written once
+    with pytest.raises(RuntimeError):
+        writer.write_header(["time"])
+
+
+def test_ParquetOutputWriter(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    filename = tmp_path / "out.parquet"
+    writer = ParquetOutputWriter(filename, flush_interval=2)
+    writer.write_header(["time", "power", "clock_time"])
+    for i in range(5):
+        writer.write_row([float(i), 10 * i, dt.datetime.now()])
+    writer.close()
+
+    df = pd.read_parquet(filename)
+    assert list(df.columns) == ["time", "power", "clock_time"]
+    assert df["power"].to_list() == [0.0, 10.0, 20.0, 30.0, 40.0]
+    assert pd.api.types.is_datetime64_any_dtype(df["clock_time"])
+
+
+def test_AsyncOutputWriter(tmp_path):
+    filename = tmp_path / "out.csv"
+    writer = AsyncOutputWriter(CSVOutputWriter(filename, flush_interval=10))
+    writer.write_header(["time", "power"])
+    for i in range(25):
+        writer.write_row([float(i), 2.0 * i])
+
+    # flush waits for the writer thread to write all queued rows
+    writer.flush()
+    assert writer.rows_written == 25
+    assert len(pd.read_csv(filename)) == 25
+
+    writer.write_row([25.0, 50.0])
+    writer.close()
+    df = pd.read_csv(filename)
+    assert df["power"].to_list() == [2.0 * i for i in range(26)]
+
+    with pytest.raises(ValueError):
+        AsyncOutputWriter(CSVOutputWriter(filename), backpressure="wait")
+
+
+class SlowWriter(CSVOutputWriter):
+    # Writer that holds the writer thread until released
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.release = threading.Event()
+
+    def _write_rows(self, rows):
+        self.release.wait()
+        super()._write_rows(rows)
+
+
+def test_AsyncOutputWriter_backpressure(tmp_path):
+    # Drop: rows arriving while the queue is full are discarded
+    writer = AsyncOutputWriter(SlowWriter(tmp_path / "drop.csv"), 2, "drop")
+    writer.write_header(["time"])
+    for i in range(10):
+        writer.write_row([i])
+    writer.writer.release.set()
+    writer.close()
+    assert writer.rows_dropped > 0
+    assert writer.rows_written + writer.rows_dropped == 10
+
+    # Coalesce: rows arriving while the queue is full replace the latest queued row
+    writer = AsyncOutputWriter(SlowWriter(tmp_path / "coalesce.csv"), 2, "coalesce")
+    writer.write_header(["time"])
+    for i in range(10):
+        writer.write_row([i])
+    writer.writer.release.set()
+    writer.close()
+    assert writer.rows_coalesced > 0
+    assert writer.rows_written + writer.rows_coalesced == 10
+    assert pd.read_csv(tmp_path / "coalesce.csv")["time"].iloc[-1] == 9
+
+
+class FailingWriter(CSVOutputWriter):
+    def _write_rows(self, rows):
+        raise OSError("disk full")
+
+
+def test_AsyncOutputWriter_error(tmp_path):
+    writer = AsyncOutputWriter(FailingWriter(tmp_path / "out.csv"))
+    writer.write_header(["time"])
+    writer.write_row([0.0])
+    with pytest.raises(RuntimeError):
+        writer.flush()
+
+
+def test_OutputWriter_resume(tmp_path):
+    # CSV: keep the first rows and discard any written after the checkpoint
+    filename = tmp_path / "out.csv"
+    writer = CSVOutputWriter(filename)
+    writer.write_header(["time", "power"])
+    for i in range(5):
+        writer.write_row([float(i), 2.0 * i])
+    writer.close()
+
+    writer = CSVOutputWriter(filename, resume_rows=3)
+    writer.write_header(["time", "power"])
+    assert writer.rows_written == 3
+    writer.write_row([3.0, -1.0])
+    writer.close()
+    df = pd.read_csv(filename)
+    assert df["power"].to_list() == [0.0, 2.0, 4.0, -1.0]
+
+    with pytest.raises(ValueError):
+        CSVOutputWriter(filename, resume_rows=2).write_header(["time", "wind_speed"])
+    with pytest.raises(ValueError):
+        CSVOutputWriter(filename, resume_rows=10).write_header(["time", "power"])
+
+    # Parquet
+    pytest.importorskip("pyarrow")
+    filename = tmp_path / "out.parquet"
+    writer = make_output_writer(filename)
+    writer.write_header(["time", "power"])
+    for i in range(5):
+        writer.write_row([float(i), 2.0 * i])
+    writer.close()
+
+    writer = make_output_writer(filename, resume_rows=3)
+    writer.write_header(["time", "power"])
+    writer.write_row([3.0, -1.0])
+    writer.close()
+    assert pd.read_parquet(filename)["power"].to_list() == [0.0, 2.0, 4.0, -1.0]
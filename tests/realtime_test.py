@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+import pytest
+from hercules.realtime import RealTimeScheduler, StepBudget
+from hercules.timing import StepTimer
+
+
+def test_RealTimeScheduler_pacing():
+    scheduler = RealTimeScheduler(dt=1.0, real_time_factor=20.0)
+    assert scheduler.step_deadline == 0.05
+
+    start = time.perf_counter()
+    scheduler.start()
+    for _ in range(4):
+        scheduler.begin_step()
+        assert 0.0 < scheduler.time_remaining() <= 0.05
+        assert scheduler.end_step() == 0.0
+        scheduler.wait()
+    # Four steps on 50 ms boundaries
+    assert time.perf_counter() - start >= 0.2
+    assert scheduler.n_overruns == 0
+
+
+def test_RealTimeScheduler_overruns():
+    timer = StepTimer(phases=["step", "controller", "py_sims"])
+    scheduler = RealTimeScheduler(dt=1.0, pacing=False, step_deadline=0.02, timer=timer)
+    scheduler.start()
+
+    for sleep_s in [0.0, 0.04, 0.0]:
+        scheduler.begin_step()
+        with timer.phase("step"):
+            with timer.phase("controller"):
+                pass
+            with timer.phase("py_sims"):
+                time.sleep(sleep_s)
+        overrun = scheduler.end_step()
+        scheduler.wait()
+    assert overrun == 0.0
+    assert scheduler.n_steps == 3
+    assert scheduler.n_overruns == 1
+    assert scheduler.max_overrun >= 0.02
+
+    # The overrun is attributed to the slow phase
+    assert scheduler.overrun_worst_phase_counts == {"py_sims": 1}
+    assert scheduler.overrun_phase_times["py_sims"] >= 0.04
+    assert "step" not in scheduler.overrun_phase_times
+    assert "1 of 3 steps overran" in scheduler.format_summary()
+
+    # Time in nested phases is attributed to them, not also to their parent
+    scheduler.begin_step()
+    with timer.phase("step"):
+        with timer.phase("py_sims"):
+            with timer.phase("py_sims.battery"):
+                time.sleep(0.04)
+    scheduler.end_step()
+    assert scheduler.overrun_worst_phase_counts == {"py_sims": 1, "py_sims.battery": 1}
+    assert scheduler.step_phase_times["py_sims.battery"] >= 0.04
+    assert scheduler.step_phase_times.get("py_sims", 0.0) < 0.01
+
+    # Without a deadline, steps are not checked
+    scheduler = RealTimeScheduler(dt=1.0, pacing=False)
+    scheduler.begin_step()
+    assert scheduler.time_remaining() == np.inf
+    assert scheduler.end_step() == 0.0
+
+    with pytest.raises(ValueError):
+        RealTimeScheduler(dt=1.0, step_deadline=0.0)
+
+
+def test_RealTimeScheduler_late_step():
+    # After a late step the next step is due immediately, and the one after a period later
+    scheduler = RealTimeScheduler(dt=0.05)
+    scheduler.start()
+    scheduler.begin_step()
+    time.sleep(0.08)
+    scheduler.end_step()
+    start = time.perf_counter()
+    scheduler.wait()
+    assert time.perf_counter() - start < 0.01
+    scheduler.begin_step()
+    scheduler.end_step()
+    scheduler.wait()
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_StepBudget():
+    budget = StepBudget(0.05, smoothing=0.5)
+    budget.start()
+    assert budget.can_afford("solve")
+
+    budget.record("solve", 0.02)
+    assert budget.can_afford("solve")
+    budget.record("solve", 0.1)
+    assert budget.costs["solve"] == pytest.approx(0.06)
+    assert not budget.can_afford("solve")
+
+    time.sleep(0.04)
+    budget.record("solve", 0.02)
+    assert not budget.can_afford("solve")
+    budget.start()
+    assert budget.can_afford("solve")
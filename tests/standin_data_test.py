@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hercules.standin_data import (
+    convert_csv_to_bundle,
+    is_standin_data_bundle,
+    load_standin_data,
+    save_standin_data_bundle,
+    standin_data_cursor,
+    StandinDataBundle,
+)
+
+
+def make_standin_csv(csv_file, n_times=25, n_turbines=3):
+    times = np.arange(n_times) * 0.5
+    df = pd.DataFrame({"time": times, "amr_wind_speed": 8.0 + np.sin(times)})
+    df["amr_wind_direction"] = 270.0 + times
+    # Turbine columns out of order, and the unnamed index column of DataFrame.to_csv
+    for i in reversed(range(n_turbines)):
+        df["turbine_power_{}".format(i)] = 1000.0 * (i + 1) + times
+    df.to_csv(csv_file)
+    return df
+
+
+def test_convert_csv_to_bundle(tmp_path):
+    csv_file = tmp_path / "amr_standin_data.csv"
+    df = make_standin_csv(csv_file)
+
+    bundle = convert_csv_to_bundle(csv_file, tmp_path / "amr_standin_data", chunksize=7)
+    assert is_standin_data_bundle(tmp_path / "amr_standin_data")
+    assert not is_standin_data_bundle(csv_file)
+    assert bundle.channels == [
+        "amr_wind_speed",
+        "amr_wind_direction",
+        "turbine_power_0",
+        "turbine_power_1",
+        "turbine_power_2",
+    ]
+    np.testing.assert_array_equal(bundle["time"], df["time"])
+    for column in bundle.channels:
+        np.testing.assert_array_equal(bundle[column], df[column])
+    assert bundle.turbine_powers.shape == (25, 3)
+
+    # Rows are counted as pandas reads them, here with a quoted field spanning lines
+    df_notes = df.assign(note="")
+    df_notes.loc[3, "note"] = "first line\nsecond line"
+    df_notes.to_csv(tmp_path / "notes.csv", index=False)
+    bundle_notes = convert_csv_to_bundle(tmp_path / "notes.csv", tmp_path / "notes", chunksize=7)
+    assert len(bundle_notes) == 25
+    np.testing.assert_array_equal(bundle_notes["time"], df["time"])
+
+    # The bundle is memory-mapped
+    loaded = load_standin_data(tmp_path / "amr_standin_data")
+    assert isinstance(loaded, StandinDataBundle)
+    assert isinstance(loaded.values, np.memmap)
+
+    # Cursors over a bundle and over the CSV give the same values
+    columns = ["amr_wind_speed", "amr_wind_direction", "turbine_power_0"]
+    cursor_bundle = standin_data_cursor(loaded, columns)
+    cursor_csv = standin_data_cursor(load_standin_data(csv_file), columns)
+    assert np.shares_memory(cursor_bundle.values, loaded.values)
+    for t in [0.0, 0.25, 3.3, 20.0]:
+        np.testing.assert_allclose(cursor_bundle.interpolate(t), cursor_csv.interpolate(t))
+    np.testing.assert_allclose(
+        standin_data_cursor(loaded, ["turbine_power_2"]).interpolate(1.25), [3001.25]
+    )
+
+
+def test_save_standin_data_bundle(tmp_path):
+    times = [0.0, 1.0, 2.0]
+    save_standin_data_bundle(
+        tmp_path / "bundle", times, [8.0, 9.0, 10.0], [270.0, 271.0, 272.0], np.ones((3, 2))
+    )
+    bundle = StandinDataBundle(tmp_path / "bundle")
+    assert bundle.columns == [
+        "time",
+        "amr_wind_speed",
+        "amr_wind_direction",
+        "turbine_power_0",
+        "turbine_power_1",
+    ]
+    np.testing.assert_array_equal(bundle["amr_wind_direction"], [270.0, 271.0, 272.0])
+    with pytest.raises(KeyError):
+        bundle["turbine_power_2"]
+
+
+def test_convert_csv_to_bundle_errors(tmp_path):
+    csv_file = tmp_path / "bad.csv"
+    pd.DataFrame({"time": [0.0], "amr_wind_speed": [8.0]}).to_csv(csv_file)
+    with pytest.raises(ValueError):
+        convert_csv_to_bundle(csv_file, tmp_path / "bad")
+
+    pd.DataFrame(
+        {
+            "time": [0.0],
+            "amr_wind_speed": [8.0],
+            "amr_wind_direction": [270.0],
+            "heterogeneous_inflow_config": ["{}"],
+        }
+    ).to_csv(csv_file)
+    with pytest.raises(ValueError):
+        convert_csv_to_bundle(csv_file, tmp_path / "bad")
@@ -0,0 +1,125 @@
+import pickle
+
+import numpy as np
+import pytest
+from hercules.state_store import StateDict, StateStore
+
+
+def make_main_dict():
+    return {
+        "time": 0.0,
+        "dt": 1,
+        "hercules_comms": {
+            "amr_wind": {
+                "wind_farm_0": {
+                    "num_turbines": 2,
+                    "turbine_labels": ["T00", "T01"],
+                    "turbine_powers": [1000.0, 800.0],
+                    "turbine_power_setpoints": [None, 500.0],
+                }
+            }
+        },
+        "py_sims": {"inputs": {"available_power": 0}},
+    }
+
+
+def test_StateStore_from_dict():
+    main_dict = StateStore.from_dict(make_main_dict())
+    farm = main_dict["hercules_comms"]["amr_wind"]["wind_farm_0"]
+
+    # Same contents and key order as the original dictionary
+    assert isinstance(farm, StateDict)
+    assert main_dict.to_dict() == make_main_dict()
+    assert list(farm.keys()) == list(make_main_dict()["hercules_comms"]["amr_wind"]["wind_farm_0"])
+
+    # Floats are held in the buffer; ints, strings and lists with None are not
+    assert main_dict.field("time") is not None
+    assert farm.field("turbine_powers")[1:] == (2, True)
+    assert main_dict.field("dt") is None and main_dict["dt"] == 1
+    assert farm.field("turbine_labels") is None
+    assert farm.field("turbine_power_setpoints") is None
+
+    # Vectors are read as copies, of the type they were assigned with
+    powers = farm["turbine_powers"]
+    assert powers == [1000.0, 800.0]
+    farm["turbine_powers"] = [900.0, 700.0]
+    assert powers == [1000.0, 800.0]
+    assert farm["turbine_powers"] + [1.0] == [900.0, 700.0, 1.0]
+    farm["turbine_powers"] = np.array([1000.0, 800.0])
+    assert isinstance(farm["turbine_powers"], np.ndarray)
+    farm["turbine_powers"][1] = 0.0
+    assert farm["turbine_powers"].tolist() == [1000.0, 800.0]
+
+    # Views give in-place access to the buffer
+    farm.view("turbine_powers")[1] = 900.0
+    assert farm["turbine_powers"].tolist() == [1000.0, 900.0]
+    assert main_dict.view("time").tolist() == [0.0]
+    with pytest.raises(TypeError):
+        main_dict.view("dt")
+
+
+def test_StateDict_layout_version():
+    main_dict = StateStore.from_dict(make_main_dict())
+    store = main_dict.store
+    farm = main_dict["hercules_comms"]["amr_wind"]["wind_farm_0"]
+    version = store.version
+
+    # Writing values of the same shape does not change the layout
+    main_dict["time"] = 1.0
+    farm["turbine_powers"] = np.array([1.0, 2.0])
+    farm["turbine_power_setpoints"] = [None, 400.0]
+    main_dict["py_sims"] = {"inputs": {"available_power": 0}}
+    assert store.version == version
+    assert main_dict["py_sims"]["inputs"]["available_power"] == 0
+
+    # Changing the layout does
+    farm["turbine_powers"] = [1.0, 2.0, 3.0]
+    assert store.version > version
+    version = store.version
+    main_dict["external_signals"] = {"power_reference": 10.0}
+    assert store.version > version
+    version = store.version
+    del main_dict["external_signals"]
+    assert store.version > version
+    assert "external_signals" not in main_dict
+
+    # The buffer can grow without losing values
+    for i in range(100):
+        main_dict["signal_%d" % i] = float(i)
+    assert main_dict["signal_42"] == 42.0
+    assert farm["turbine_powers"] == [1.0, 2.0, 3.0]
+
+    # Stores can be pickled, e.g. for checkpoints
+    restored = pickle.loads(pickle.dumps(main_dict))
+    assert restored.to_dict() == main_dict.to_dict()
+
+
+def test_StateStore_reuses_slots():
+    main_dict = StateStore.from_dict(make_main_dict())
+    store = main_dict.store
+    farm = main_dict["hercules_comms"]["amr_wind"]["wind_farm_0"]
+    size = store.size
+
+    # Resizing a field back and forth does not grow the buffer
+    for n in [3, 2, 3, 2]:
+        farm["turbine_powers"] = [1.0] * n
+    assert store.size <= size + 3
+    size = store.size
+    for i in range(10):
+        main_dict["signal"] = {"values": [float(i)] * 4}
+        del main_dict["signal"]
+    assert store.size == size
+
+    # Slots of fields turned into plain values are reused
+    main_dict["time"] = "now"
+    main_dict["wind_speed"] = 8.0
+    assert store.size == size
+    assert main_dict["wind_speed"] == 8.0
+
+    # A removed StateDict keeps its values
+    removed = main_dict["hercules_comms"]["amr_wind"]
+    del main_dict["hercules_comms"]
+    main_dict["external_signals"] = {"power_reference": [10.0, 20.0, 30.0, 40.0]}
+    assert removed["wind_farm_0"]["turbine_powers"] == [1.0, 1.0]
+    assert removed.store is not store
+    assert main_dict["external_signals"]["power_reference"] == [10.0, 20.0, 30.0, 40.0]
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hercules.local_coupling import StatusReplay
+from hercules.status_recording import (
+    recording_from_log_files,
+    StatusRecorder,
+    StatusRecording,
+)
+
+
+def status(time, n_turbines):
+    return [time, 8.0, 270.0] + [1000.0 * (i + 1) for i in range(n_turbines)] + [270.0] * n_turbines
+
+
+def test_StatusRecorder_round_trip(tmp_path):
+    path = tmp_path / "status.rec"
+    recorder = StatusRecorder(path, {"farm_a": 2, "farm_b": 3}, dt=0.5)
+    recorder.record(0.0, {"farm_a": status(0.0, 2), "farm_b": None})
+    recorder.record(0.5, {"farm_a": status(0.5, 2), "farm_b": status(0.5, 3)})
+    with pytest.raises(ValueError):
+        recorder.record(1.0, {"farm_a": status(1.0, 3), "farm_b": None})
+    recorder.close()
+
+    recording = StatusRecording(path)
+    assert recording.farms == {"farm_a": 2, "farm_b": 3}
+    assert recording.dt == 0.5
+    assert len(recording) == 2
+    assert list(recording.times) == [0.0, 0.5]
+    assert recording.status_message(0, "farm_a") == status(0.0, 2)
+    assert recording.status_message(0, "farm_b") is None
+    assert recording.status_message(1, "farm_b") == status(0.5, 3)
+
+    assert recording.find(0.5 + 1e-9) == 1
+    assert recording.find(0.25) is None
+    assert recording.find(-1.0) is None
+
+
+def test_StatusRecording_partial_record(tmp_path):
+    # A record cut short by an interrupted run is ignored
+    path = tmp_path / "status.rec"
+    recorder = StatusRecorder(path, {"farm": 1})
+    for time in [0.0, 1.0, 2.0]:
+        recorder.record(time, {"farm": status(time, 1)})
+    recorder.close()
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - 8)
+    assert len(StatusRecording(path)) == 2
+
+    with open(tmp_path / "other.rec", "wb") as f:
+        f.write(b"time,amr_wind_speed\n0.0,8.0\n")
+    with pytest.raises(ValueError):
+        StatusRecording(tmp_path / "other.rec")
+
+
+def test_recording_from_log_files(tmp_path):
+    log = pd.DataFrame(
+        {
+            "helics_time": [0.0, 1.0],
+            "AMRwind_time": [0.0, 1.0],
+            "AMRWind_speed": [8.0, 9.0],
+            "AMRWind_direction": [270.0, 271.0],
+            "power_0": [1000.0, 1100.0],
+            "power_1": [2000.0, 2100.0],
+            "turbine_wd_direction_0": [270.0, 271.0],
+            "turbine_wd_direction_1": [270.0, 271.0],
+        }
+    )
+    log.to_csv(tmp_path / "log.csv", index=False)
+
+    recording = recording_from_log_files(tmp_path / "status.rec", {"farm": tmp_path / "log.csv"})
+    assert recording.farms == {"farm": 2}
+    assert recording.status_message(1, "farm") == [1.0, 9.0, 271.0, 1100.0, 2100.0, 271.0, 271.0]
+
+
+def test_StatusReplay(tmp_path):
+    path = tmp_path / "status.rec"
+    recorder = StatusRecorder(path, {"farm_a": 2, "farm_b": 1})
+    for time in np.arange(5) * 0.5:
+        recorder.record(time, {"farm_a": status(time, 2), "farm_b": status(time, 1)})
+    recorder.close()
+
+    replay = StatusReplay(path, {"farm_a": 2, "farm_b": 1})
+    assert replay.get_status("farm_a") is None
+    replay.publish_control("farm_a", [-1, -1, -1])
+    replay.step(1.0)
+    assert replay.get_status("farm_a") == status(1.0, 2)
+    assert replay.get_status("farm_b") == status(1.0, 1)
+
+    state = replay.get_state()
+    replay.step(2.0)
+    replay.set_state(state)
+    assert replay.get_status("farm_a")[0] == 1.0
+
+    replay.step(2.5)
+    with pytest.raises(ValueError):
+        replay.get_status("farm_a")
+
+    # The farms must match the recording
+    with pytest.raises(ValueError):
+        StatusReplay(path, {"farm_a": 3})
+    with pytest.raises(ValueError):
+        StatusReplay(path, {"farm_c": 2})
+
+
+def test_StatusRecorder_resume(tmp_path):
+    # A restart keeps the records up to the checkpoint and appends after them
+    path = tmp_path / "status.rec"
+    recorder = StatusRecorder(path, {"farm": 1}, dt=1.0)
+    for time in [0.0, 1.0, 2.0, 3.0]:
+        recorder.record(time, {"farm": status(time, 1)})
+    recorder.close()
+
+    recorder = StatusRecorder(path, {"farm": 1}, dt=1.0, resume_records=2)
+    assert recorder.n_records == 2
+    recorder.record(2.0, {"farm": status(2.5, 1)})
+    recorder.close()
+    recording = StatusRecording(path)
+    assert list(recording.times) == [0.0, 1.0, 2.0]
+    assert recording.status_message(2, "farm") == status(2.5, 1)
+
+    with pytest.raises(ValueError):
+        StatusRecorder(path, {"farm": 2}, dt=1.0, resume_records=2)
+    with pytest.raises(ValueError):
+        StatusRecorder(path, {"farm": 1}, dt=1.0, resume_records=4)
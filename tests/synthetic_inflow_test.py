@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from hercules.standin_data import StandinDataBundle
+from hercules.tools.synthetic_inflow import SyntheticInflow
+
+
+def test_SyntheticInflow_reproducible_and_chunk_independent():
+    inputs = {"n_turbines": 4, "dt": 1.0, "gust_rate": 60.0, "seed": 5}
+    whole = SyntheticInflow(**inputs).generate(3000)
+
+    inflow = SyntheticInflow(**inputs)
+    chunks = [inflow.generate(n) for n in [1, 999, 1500, 500]]
+    for key in whole:
+        np.testing.assert_allclose(np.concatenate([c[key] for c in chunks]), whole[key])
+
+    other = SyntheticInflow(**{**inputs, "seed": 6}).generate(3000)
+    assert not np.allclose(other["turbine_wind_speeds"], whole["turbine_wind_speeds"])
+
+    # Gusts draw from their own random numbers, so do not change the direction
+    no_gusts = SyntheticInflow(**{**inputs, "gust_rate": 0.0}).generate(3000)
+    np.testing.assert_allclose(no_gusts["amr_wind_direction"], whole["amr_wind_direction"])
+
+
+@pytest.mark.parametrize("spectrum", ["kaimal", "von_karman"])
+def test_SyntheticInflow_statistics(spectrum):
+    inflow = SyntheticInflow(
+        n_turbines=20,
+        dt=1.0,
+        mean_wind_speed=10.0,
+        turbulence_intensity=0.12,
+        spectrum=spectrum,
+        turbine_coherence=0.0,
+        direction_std=4.0,
+        direction_time_scale=60.0,
+        seed=1,
+    )
+    series = inflow.generate(50000)
+
+    wind_speeds = series["turbine_wind_speeds"]
+    assert wind_speeds.shape == (50000, 20)
+    assert np.mean(wind_speeds) == pytest.approx(10.0, abs=0.2)
+    assert np.std(wind_speeds) / 10.0 == pytest.approx(0.12, rel=0.1)
+    # Without coherence, the turbines are uncorrelated
+    assert abs(np.corrcoef(wind_speeds[:, 0], wind_speeds[:, 1])[0, 1]) < 0.1
+
+    direction = series["amr_wind_direction"] - 270.0
+    assert np.std(direction) == pytest.approx(4.0, rel=0.1)
+    # Correlation of the direction after one time scale is about exp(-1)
+    lag = 60
+    assert np.corrcoef(direction[:-lag], direction[lag:])[0, 1] == pytest.approx(
+        np.exp(-1), abs=0.1
+    )
+
+    powers = series["turbine_powers"]
+    assert np.all(powers >= 0) and np.all(powers <= inflow.turbine_rating)
+
+
+def test_SyntheticInflow_gusts():
+    inputs = {"n_turbines": 2, "dt": 0.5, "turbulence_intensity": 0.0, "direction_std": 0.0}
+    inflow = SyntheticInflow(**inputs, gust_rate=30.0, gust_amplitude=4.0, seed=2)
+    wind_speed = inflow.generate(int(20 * 3600 / 0.5))["amr_wind_speed"] - inflow.mean_wind_speed
+
+    # Gusts are the only variation: count their starts
+    n_gusts = np.sum((wind_speed[1:] > 0) & (wind_speed[:-1] == 0))
+    assert n_gusts == pytest.approx(30 * 20, rel=0.2)
+    assert np.all(wind_speed >= 0)
+    assert np.median(wind_speed[wind_speed > 0]) == pytest.approx(4.0 / 2, rel=0.3)
+
+
+def test_SyntheticInflow_power_curve():
+    inflow = SyntheticInflow(n_turbines=1, dt=1.0, turbine_rating=5000.0)
+    powers = inflow.turbine_powers(np.array([0.0, 3.0, 7.0, 11.4, 20.0, 26.0]))
+    assert powers[0] == powers[1] == 0.0
+    assert 0 < powers[2] < 5000.0
+    assert powers[3] == powers[4] == 5000.0
+    assert powers[5] == 0.0
+
+
+def test_SyntheticInflow_write_bundle(tmp_path):
+    inputs = {"n_turbines": 3, "dt": 0.5, "start_time": 10.0, "seed": 3}
+    whole = SyntheticInflow(**inputs).generate(1000)
+
+    SyntheticInflow(**inputs).write_bundle(tmp_path / "bundle", 1000, chunk_size=300)
+    bundle = StandinDataBundle(tmp_path / "bundle")
+    np.testing.assert_allclose(bundle.times, whole["time"])
+    assert bundle.times[0] == 10.0
+    np.testing.assert_allclose(bundle["amr_wind_speed"], whole["amr_wind_speed"])
+    np.testing.assert_allclose(bundle["amr_wind_direction"], whole["amr_wind_direction"])
+    np.testing.assert_allclose(bundle.turbine_powers, whole["turbine_powers"])
+
+
+def test_SyntheticInflow_invalid_inputs():
+    with pytest.raises(ValueError):
+        SyntheticInflow(n_turbines=1, dt=1.0, spectrum="mann")
+    with pytest.raises(ValueError):
+        SyntheticInflow(n_turbines=1, dt=1.0, turbine_coherence=1.5)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hercules.time_series import TimeSeriesCursor
+
+
+def test_TimeSeriesCursor():
+    times = np.array([0.0, 1.0, 2.0, 2.0, 4.0, 10.0])
+    values = np.column_stack([np.arange(6.0), [5.0, 3.0, 1.0, 2.0, 8.0, 0.0]])
+    cursor = TimeSeriesCursor(times, values)
+
+    # Matches np.interp for each channel, moving forward, jumping and going back
+    for t in [-1.0, 0.0, 0.3, 1.0, 1.5, 2.0, 3.0, 4.0, 9.9, 10.0, 12.0, 0.5, 2.5, 0.5, 5.0]:
+        expected = [np.interp(t, times, values[:, c]) for c in range(2)]
+        np.testing.assert_allclose(cursor.interpolate(t), expected, rtol=0, atol=1e-12)
+
+    # Long series, advancing by steps smaller and larger than the sample spacing
+    times = np.linspace(0.0, 100.0, 1001)
+    cursor = TimeSeriesCursor(times, np.sin(times))
+    for t in np.concatenate([np.arange(0.0, 10.0, 0.03), np.arange(10.0, 100.0, 1.7)]):
+        np.testing.assert_allclose(cursor.interpolate(t), [np.interp(t, times, np.sin(times))])
+
+    with pytest.raises(ValueError):
+        TimeSeriesCursor([1.0, 0.0], [1.0, 2.0])
+    with pytest.raises(ValueError):
+        TimeSeriesCursor([0.0, 1.0], [1.0])
+
+
+def test_TimeSeriesCursor_from_dataframe():
+    df = pd.DataFrame(
+        {"time": [0.0, 2.0], "amr_wind_speed": [8.0, 10.0], "amr_wind_direction": [270.0, 280.0]}
+    )
+    cursor = TimeSeriesCursor.from_dataframe(df, ["amr_wind_speed", "amr_wind_direction"])
+    assert cursor.values.flags["C_CONTIGUOUS"]
+    assert cursor.channel_index("amr_wind_direction") == 1
+    np.testing.assert_array_equal(cursor.interpolate(1.0), [9.0, 275.0])
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+from hercules.timing import PhaseHistogram, StepTimer
+
+
+def test_PhaseHistogram():
+    h = PhaseHistogram()
+    for duration_ns in [1_000] * 90 + [1_000_000] * 10:
+        h.add(duration_ns)
+
+    assert h.count == 100
+    assert h.max_ns == 1_000_000
+    assert h.total_ns == 90 * 1_000 + 10 * 1_000_000
+
+    # Percentiles are resolved to within a bin (8 per octave)
+    assert 1_000 <= h.percentile(0.5) < 1_000 * 2 ** (1 / 8)
+    assert 1_000_000 / 2 ** (1 / 8) < h.percentile(0.95) <= 1_000_000
+
+    assert h.pop_window_mean() == h.total_ns / 100
+    assert np.isnan(h.pop_window_mean())
+    assert np.isnan(PhaseHistogram().percentile(0.5))
+
+
+def test_StepTimer():
+    timer = StepTimer(phases=["a", "b"])
+    for _ in range(3):
+        with timer.phase("a"):
+            time.sleep(0.001)
+    with timer.phase("c"):
+        pass
+
+    summary = timer.summary()
+    assert list(summary.keys()) == ["a", "b", "c"]
+    assert summary["a"]["count"] == 3
+    assert summary["a"]["p50_ms"] >= 1.0
+    assert summary["a"]["max_ms"] >= summary["a"]["p95_ms"] >= summary["a"]["p50_ms"]
+    assert summary["b"]["count"] == 0
+    assert "a" in timer.format_summary()
+
+    means = timer.pop_window_means()
+    assert means["a"] >= 1.0
+    assert np.isnan(means["b"])
+
+
+def test_StepTimer_disabled():
+    timer = StepTimer(enabled=False, phases=["a"])
+    with timer.phase("a"):
+        pass
+    with timer.phase("b"):
+        pass
+    assert timer.summary()["a"]["count"] == 0
+    assert "b" not in timer.histograms